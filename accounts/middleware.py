@@ -18,18 +18,21 @@ class CustomSessionMiddleware:
         response = self.get_response(request)
         return response
     
+def awaiting_approval(user):
+    """True for a logged-in teacher an admin has not approved yet (superusers and staff never wait)."""
+    if not user.is_authenticated or user.is_superuser or user.is_staff:
+        return False
+    profile = getattr(user, "profile", None)
+    return bool(profile and profile.role == "teacher" and not profile.approved)
+
+
 class TeacherApprovalMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.user.is_authenticated:
-            # 🚫 Skip superusers and staff
-            if request.user.is_superuser or request.user.is_staff:
-                return self.get_response(request)
-            profile = getattr(request.user, "profile", None)
-            if profile and profile.role == "teacher" and not profile.approved:
-                logout(request)
-                return redirect("pending_approval")
+        if awaiting_approval(request.user):
+            logout(request)
+            return redirect("pending_approval")
 
         return self.get_response(request)
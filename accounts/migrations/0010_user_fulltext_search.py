@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 08:30
+
+from django.conf import settings
+from django.db import migrations
+
+from lrhub import search
+
+
+def install(apps, schema_editor):
+    search.install_index(schema_editor, 'user', apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall_index(schema_editor, 'user', apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_alter_profile_avatar'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
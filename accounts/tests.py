@@ -1,3 +1,243 @@
-from django.test import TestCase
+import json
+import tempfile
+from unittest import mock
+
+import cloudinary
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from lrhub import cpu_pool
+from lrhub.cpu_pool import CPUTimeout
+from resources import content_index
+from resources.models import ExtractedText, Note, ProcessingJob, StudentResource, Rating
+from resources.relevance import score_batch
+from resources.utils import document_file, relevance_score, store_extracted_text
+
+
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+@override_settings(CACHES=NO_CACHE)
+class DashboardQueryCountTests(TestCase):
+    """my_rating / average rating must not cost one query per listed item."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        cls.teacher = User.objects.create_user("teacher", password="pw")
+        cls.teacher.profile.role = "teacher"
+        cls.teacher.profile.approved = True
+        cls.teacher.profile.save()
+        cls.student = User.objects.create_user("student", password="pw")
+
+    def add_documents(self, count):
+        for i in range(count):
+            note = Note.objects.create(
+                title=f"Algebra {i}", topic="algebra", uploaded_by=self.teacher,
+                file=f"raw/upload/v1/algebra{i}.pdf",
+            )
+            resource = StudentResource.objects.create(
+                title=f"Algebra sheet {i}", description="algebra", uploaded_by=self.student,
+                file=f"raw/upload/v1/sheet{i}.pdf",
+            )
+            Rating.objects.create(user=self.student, note=note, value=4)
+            Rating.objects.create(user=self.teacher, resource=resource, value=5)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_student_dashboard_query_count_is_fixed(self):
+        self.client.force_login(self.student)
+        notes_url = reverse("student_dashboard") + "?tab=notes&q=algebra"
+        resources_url = reverse("student_dashboard") + "?tab=resources&q=algebra"
+
+        self.add_documents(2)
+        few_notes = self.count_queries(notes_url)
+        few_resources = self.count_queries(resources_url)
+
+        self.add_documents(20)
+        with self.assertNumQueries(few_notes):
+            response = self.client.get(notes_url)
+        with self.assertNumQueries(few_resources):
+            self.client.get(resources_url)
+
+        results = list(response.context["note_results"])
+        self.assertEqual(len(results), 22)
+        self.assertTrue(all(n.my_rating == 4 and n.average_rating() == 4 for n in results))
+
+    def test_teacher_dashboard_query_count_is_fixed(self):
+        self.client.force_login(self.teacher)
+        url = reverse("teacher_dashboard") + "?tab=notes"
+
+        self.add_documents(2)
+        few = self.count_queries(url)
+
+        self.add_documents(20)
+        with self.assertNumQueries(few):
+            response = self.client.get(url)
+
+        notes = response.context["notes"]
+        self.assertEqual(len(notes), 22)
+        self.assertTrue(all(n.my_rating is None and n.rating_count == 1 for n in notes))
+
+
+@override_settings(CPU_POOL_WORKERS=0)  # search-index patches run inline, against the test database
+class DashboardCacheTests(TestCase):
+    """Cached dashboard lists must be refreshed by the model signals."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        cls.teacher = User.objects.create_user("teacher", password="pw")
+        cls.student = User.objects.create_user("student", password="pw")
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(SEARCH_INDEX_PATH=f"{directory.name}/search_index.joblib"))
+        self.client.force_login(self.student)
+        self.url = reverse("student_dashboard") + "?tab=notes&q=algebra"
+
+    def add_note(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Note.objects.create(
+                title=title, topic="algebra", uploaded_by=self.teacher,
+                file=f"raw/upload/v1/{title}.pdf",
+            )
+
+    def test_second_request_is_served_from_cache(self):
+        self.add_note("first")
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertFalse(any("resources_note" in q["sql"] for q in ctx.captured_queries))
+
+    def test_write_invalidates_cached_lists(self):
+        self.add_note("first")
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context["note_results"]), 1)
+
+        note = self.add_note("second")
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context["note_results"]), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(user=self.student, note=note, value=3)
+        response = self.client.get(self.url)
+        rated = [n for n in response.context["note_results"] if n.pk == note.pk]
+        self.assertEqual(rated[0].my_rating, 3)
+
+
+class BatchRelevanceTests(TestCase):
+    """The batch endpoint is for teachers and rejects malformed bodies with 400."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        cls.teacher = User.objects.create_user("teacher", password="pw")
+        cls.teacher.profile.role = "teacher"
+        cls.teacher.profile.approved = True
+        cls.teacher.profile.save()
+        cls.note = Note.objects.create(title="Plants", topic="biology", uploaded_by=cls.teacher,
+                                       file="raw/upload/v1/plants.pdf")
+        pages = ["Photosynthesis turns light into sugar. Roots take up water."]
+        entry = ExtractedText.objects.create(public_id="plants", content_hash="plants", pages=pages)
+        content_index.store_shard(cls.note, entry, content_index.build_postings(pages))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(RELEVANCE_MODEL_PATH=f"{directory.name}/relevance.joblib"))
+        # stands in for the CPU pool, whose processes would not see the test database
+        self.offload = self.enterContext(
+            mock.patch("accounts.views.score_batch_async", side_effect=sync_to_async(score_batch))
+        )
+        self.url = reverse("batch_relevance")
+
+    def post(self, body):
+        return self.client.post(self.url, json.dumps(body), content_type="application/json")
+
+    def test_teacher_gets_scores(self):
+        self.client.force_login(self.teacher)
+        response = self.post({"queries": ["light and sugar"], "note_ids": [self.note.pk]})
+        self.assertEqual(response.status_code, 200)
+        documents = response.json()["results"][0]["documents"]
+        self.assertEqual(documents[0]["id"], self.note.pk)
+        self.assertEqual(documents[0]["best_match"], "Photosynthesis turns light into sugar.")
+        self.assertEqual(self.offload.call_args.args, (["light and sugar"], [self.note]))
+
+        self.offload.side_effect = CPUTimeout
+        self.assertEqual(self.post({"queries": ["light"]}).status_code, 504)
+
+    def test_malformed_requests_are_rejected(self):
+        self.client.force_login(self.teacher)
+        for body in (["light"], {"queries": "light"}, {"queries": ["light"], "note_ids": ["1"]},
+                     {"queries": ["light"], "note_ids": 1}, {"queries": []}):
+            self.assertEqual(self.post(body).status_code, 400, body)
+
+        student = User.objects.create_user("student")
+        self.client.force_login(student)
+        self.assertEqual(self.post({"queries": ["light"]}).status_code, 403)
+        student.profile.delete()
+        self.assertEqual(self.post({"queries": ["light"]}).status_code, 400)
+
+
+class AnalyzeViewTests(TestCase):
+    """The async analysis views score stored text in the CPU pool and scan unextracted files."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        cls.student = User.objects.create_user("student", password="pw")
+        cls.note = Note.objects.create(title="Plants", topic="biology", uploaded_by=cls.student,
+                                       file="raw/upload/v1/plants.pdf")
+        store_extracted_text(document_file(cls.note), "plants",
+                             ["Photosynthesis turns light into sugar. Roots take up water."])
+        cls.resource = StudentResource.objects.create(title="Atlas", uploaded_by=cls.student,
+                                                      file="raw/upload/v1/atlas.pdf")
+
+    def setUp(self):
+        self.pool = self.enterContext(mock.patch.object(cpu_pool, "run_async", side_effect=self.run_inline))
+        self.scan = self.enterContext(mock.patch(
+            "accounts.views.scan_pdf_for_relevance_async",
+            return_value={"score": 75.0, "match": "Atlas of rivers", "page": 1, "pages_scanned": 1, "complete": False},
+        ))
+
+    async def run_inline(self, func, *args):
+        return func(*args)
+
+    async def test_stored_text_is_scored_in_the_pool(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(reverse("analyze_note", args=[self.note.pk]), {"query": "light sugar"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["best_match"], "Photosynthesis turns light into sugar.")
+        self.assertTrue(response.json()["complete"])
+        self.assertEqual(self.pool.call_args.args[0], relevance_score)
+        self.scan.assert_not_called()
+
+    async def test_unextracted_file_is_scanned_and_queued(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(reverse("analyze_resource", args=[self.resource.pk]), {"query": "rivers"})
+        self.assertEqual((response.status_code, response.json()["complete"]), (200, False))
+        self.assertEqual(self.scan.call_args.args, (document_file(self.resource).url, "rivers"))
+        self.assertTrue(await ProcessingJob.objects.filter(resource=self.resource, kind="extract").aexists())
+
+    async def test_errors(self):
+        url = reverse("analyze_note", args=[self.note.pk])
+        self.assertEqual((await self.async_client.get(url, {"query": "light"})).status_code, 302)  # login first
+        await self.async_client.aforce_login(self.student)
+        self.assertEqual((await self.async_client.get(url)).status_code, 400)
+        missing = reverse("analyze_note", args=[self.note.pk + 100])
+        self.assertEqual((await self.async_client.get(missing, {"query": "light"})).status_code, 404)
+        self.pool.side_effect = CPUTimeout
+        self.assertEqual((await self.async_client.get(url, {"query": "light"})).status_code, 504)
 
-# Create your tests here.
@@ -18,6 +18,7 @@ urlpatterns = [
     path("download/resource/<int:resource_id>/", views.download_student_resource, name="download_student_resource"),
     path("analyze/note/<int:note_id>/", views.analyze_note, name="analyze_note"),
     path("analyze/resource/<int:resource_id>/", views.analyze_resource, name="analyze_resource"),
+    path("analyze/batch/", views.batch_relevance, name="batch_relevance"),
     path("analysis/note/<int:note_id>/", views.analysis_page_note, name="analysis_page_note"),
     path("analysis/resource/<int:resource_id>/", views.analysis_page_resource, name="analysis_page_resource"),
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
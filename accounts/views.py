@@ -1,18 +1,26 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Q, Avg
 from .models import Profile
 from .forms import SignupForm, LoginForm, ProfileForm, UserEditForm, ProfileEditForm
 from resources.models import Note, StudentResource, Rating, Recommendation
 from resources.forms import NoteForm, StudentResourceForm, RatingForm, RecommendationForm
 from django.http import FileResponse, JsonResponse
-from analytics.models import ActivityLog
-from .utils import extract_pdf_text_from_url, relevance_score
+from analytics.buffer import log_activity
+from asgiref.sync import sync_to_async
+from .utils import relevance_score_async
+from resources.utils import document_file, find_extracted_text, scan_pdf_for_relevance_async
+from resources import jobs
+from resources.counters import increment_downloads
+from resources.relevance import score_batch_async
+from lrhub.cache import cached_queryset, invalidate
+from lrhub.search import search
+from lrhub.cpu_pool import CPUTimeout
 from django.contrib.auth.decorators import user_passes_test
 import pandas as pd
+import json
 # --- Auth Page (combined login/signup tabs) ---
 def auth_page(request):
     signup_form = SignupForm()
@@ -130,11 +138,6 @@ def teacher_dashboard(request):
             messages.success(request, "Note uploaded successfully!")
             return redirect('teacher_dashboard')
 
-    # Teacher’s own notes
-    notes = list(Note.objects.filter(uploaded_by=request.user))
-    for n in notes:
-        n.my_rating = Rating.objects.filter(user=request.user, note=n).first()
-
     # Delete educator note (Notes tab, only if uploaded_by is teacher)
     if request.method == 'POST' and 'delete_note' in request.POST:
         note_id = request.POST.get('note_id')
@@ -147,9 +150,6 @@ def teacher_dashboard(request):
         return redirect(f"{request.path}?tab=notes")
 
 
-    # Recommendations (fetch ALL so updates show immediately)
-    note_recommendations = Recommendation.objects.filter(note__isnull=False)
-
     # Ratings for notes
     if request.method == 'POST' and 'rate_note' in request.POST:
         note_id = request.POST.get('note_id')
@@ -189,19 +189,35 @@ def teacher_dashboard(request):
     resource_results = None
     active_tab = request.GET.get('tab', 'profile')
 
-    if query:
-        resource_results = list(StudentResource.objects.filter(
-            Q(title__icontains=query) | Q(description__icontains=query)
-        ))
-        active_tab = 'search'
-
     # Handle verification
     if request.method == 'POST' and 'verify_resource' in request.POST:
         res_id = request.POST.get('resource_id')
         StudentResource.objects.filter(id=res_id).update(verified=True)
+        invalidate("documents")  # .update() sends no signal
         messages.success(request, "Resource verified successfully!")
         return redirect(f"{request.path}?tab=search")
 
+    if query:
+        resource_results = cached_queryset(
+            ("documents",), ("teacher_resource_results", query),
+            search(query, kinds=("resource",))["resource"],
+        )
+        active_tab = 'search'
+
+    # Teacher’s own notes
+    notes = cached_queryset(
+        ("documents", "ratings"), ("teacher_notes", request.user.pk),
+        Note.objects.filter(uploaded_by=request.user)
+        .select_related('uploaded_by')
+        .with_user_rating(request.user),
+    )
+
+    # Recommendations (cache is invalidated on every change, so updates show immediately)
+    note_recommendations = cached_queryset(
+        ("recommendations",), ("note_recommendations",),
+        Recommendation.objects.filter(note__isnull=False).select_related('user'),
+    )
+
     return render(request, 'accounts/teacher_dashboard.html', {
         'profile': profile,
         'form': form,
@@ -251,8 +267,6 @@ def student_dashboard(request):
             messages.success(request, "Your resource was shared successfully!")
             return redirect(f"{request.path}?tab=my_resources")
 
-    # My uploads
-    my_resources = StudentResource.objects.filter(uploaded_by=request.user)
     # Delete student resource (My Resources tab)
     if request.method == 'POST' and 'delete_resource' in request.POST:
         res_id = request.POST.get('resource_id')
@@ -264,22 +278,6 @@ def student_dashboard(request):
             messages.error(request, "You can only delete your own resources.")
         return redirect(f"{request.path}?tab=my_resources")
 
-    # Default: top 2 highly rated notes/resources
-    top_notes = Note.objects.annotate(avg=Avg('ratings__value')).order_by('-avg', '-uploaded_at')[:2]
-    top_resources = StudentResource.objects.annotate(avg=Avg('ratings__value')).order_by('-verified', '-avg', '-uploaded_at')[:2]
-
-    # Attach my_rating
-    for n in top_notes:
-        n.my_rating = Rating.objects.filter(user=request.user, note=n).first()
-    for r in top_resources:
-        r.my_rating = Rating.objects.filter(user=request.user, resource=r).first()
-    for r in my_resources:
-        r.my_rating = Rating.objects.filter(user=request.user, resource=r).first()
-
-    # Recommendations (fetch ALL so updates show immediately)
-    note_recommendations = Recommendation.objects.filter(note__isnull=False)
-    res_recommendations = Recommendation.objects.filter(resource__isnull=False)
-
     # Ratings
     if request.method == 'POST' and 'rate_note' in request.POST:
         note_id = request.POST.get('note_id')
@@ -352,14 +350,42 @@ def student_dashboard(request):
     active_tab = request.GET.get('tab', 'profile')
 
     if query and active_tab == 'notes':
-        note_results = Note.objects.filter(Q(title__icontains=query) | Q(topic__icontains=query))
-        for n in note_results:
-            n.my_rating = Rating.objects.filter(user=request.user, note=n).first()
+        note_results = cached_queryset(
+            ("documents", "ratings"), ("student_note_results", request.user.pk, query),
+            search(query, kinds=("note",))["note"].with_user_rating(request.user),
+        )
 
     if query and active_tab == 'resources':
-        resource_results = StudentResource.objects.filter(Q(title__icontains=query) | Q(description__icontains=query))
-        for r in resource_results:
-            r.my_rating = Rating.objects.filter(user=request.user, resource=r).first()
+        resource_results = cached_queryset(
+            ("documents", "ratings"), ("student_resource_results", request.user.pk, query),
+            search(query, kinds=("resource",))["resource"].with_user_rating(request.user),
+        )
+
+    # My uploads
+    my_resources = cached_queryset(
+        ("documents", "ratings"), ("my_resources", request.user.pk),
+        StudentResource.objects.filter(uploaded_by=request.user).with_user_rating(request.user),
+    )
+
+    # Default: top 2 highly rated notes/resources (index scans on the stored rating_avg)
+    top_notes = cached_queryset(
+        ("documents", "ratings"), ("top_notes", request.user.pk),
+        Note.objects.with_user_rating(request.user).order_by('-rating_avg', '-uploaded_at')[:2],
+    )
+    top_resources = cached_queryset(
+        ("documents", "ratings"), ("top_resources", request.user.pk),
+        StudentResource.objects.with_user_rating(request.user).order_by('-verified', '-rating_avg', '-uploaded_at')[:2],
+    )
+
+    # Recommendations (cache is invalidated on every change, so updates show immediately)
+    note_recommendations = cached_queryset(
+        ("recommendations",), ("note_recommendations",),
+        Recommendation.objects.filter(note__isnull=False).select_related('user'),
+    )
+    res_recommendations = cached_queryset(
+        ("recommendations",), ("res_recommendations",),
+        Recommendation.objects.filter(resource__isnull=False).select_related('user'),
+    )
 
     return render(request, 'accounts/student_dashboard.html', {
         'profile': profile,
@@ -396,12 +422,11 @@ class CustomPasswordResetView(PasswordResetView):
 def download_note(request, note_id):
     note = get_object_or_404(Note, id=note_id)
 
-    # ✅ increment counter
-    note.downloads += 1
-    note.save()
+    # ✅ increment counter (atomic UPDATE, optionally buffered)
+    increment_downloads(note)
 
-    # ✅ log in analytics
-    ActivityLog.objects.create(
+    # ✅ log in analytics (buffered, written in batches)
+    log_activity(
         user=request.user,
         action="note_download",
         description=f"Downloaded note: {note.title}"
@@ -412,31 +437,42 @@ def download_note(request, note_id):
 def download_student_resource(request, resource_id):
     resource = get_object_or_404(StudentResource, id=resource_id)
 
-    # ✅ increment counter
-    resource.downloads += 1
-    resource.save()
+    # ✅ increment counter (atomic UPDATE, optionally buffered)
+    increment_downloads(resource)
 
-    # ✅ log in analytics
-    ActivityLog.objects.create(
+    # ✅ log in analytics (buffered, written in batches)
+    log_activity(
         user=request.user,
         action="resource_download",
         description=f"Downloaded resource: {resource.title}"
     )
     return redirect(resource.file.url)
 
-# ✅ Analysis views 
+# ✅ Analysis views (async: the PDF fetch is awaited, parsing and scoring run in lrhub.cpu_pool)
+
+async def _document_relevance(obj, query):
+    """Score against the stored extraction. A file that was never extracted is scanned page by
+    page with early exit (page/time budget) and its full extraction is queued for next time.
+    Raises CPUTimeout if the scoring overruns CPU_POOL_TIMEOUT."""
+    if not obj.file:
+        return await relevance_score_async("", query)
+    file = document_file(obj)
+    entry = await sync_to_async(find_extracted_text)(file)
+    if entry is not None:
+        return await relevance_score_async(entry.text, query)
+    await sync_to_async(jobs.enqueue)(obj, "extract")
+    return await scan_pdf_for_relevance_async(file.url, query)
 
 @login_required
-def analyze_note(request, note_id):
-    note = get_object_or_404(Note, id=note_id)
+async def analyze_note(request, note_id):
+    note = await aget_object_or_404(Note, id=note_id)
     query = request.GET.get("query", "").strip()
 
     if not query:
         return JsonResponse({"error": "Query parameter is required"}, status=400)
 
     try:
-        text = extract_pdf_text_from_url(note.file.url)
-        relevance = relevance_score(text, query)  # dict with score + match
+        relevance = await _document_relevance(note, query)  # dict with score + match
         suggestion = "related" if relevance["score"] >= 20 else "not related"
 
         return JsonResponse({
@@ -445,22 +481,24 @@ def analyze_note(request, note_id):
             "title": note.title,
             "relevance_score": relevance["score"],
             "best_match": relevance["match"],
-            "suggestion": suggestion
+            "suggestion": suggestion,
+            "complete": relevance.get("complete", True),  # False if an early-exit scan stopped
         })
+    except CPUTimeout:
+        return JsonResponse({"error": "Analysis took too long, please try again later"}, status=504)
     except Exception as e:
         return JsonResponse({"error": f"Analysis failed: {str(e)}"}, status=500)
 
 @login_required
-def analyze_resource(request, resource_id):
-    resource = get_object_or_404(StudentResource, id=resource_id)
+async def analyze_resource(request, resource_id):
+    resource = await aget_object_or_404(StudentResource, id=resource_id)
     query = request.GET.get("query", "").strip()
 
     if not query:
         return JsonResponse({"error": "Query parameter is required"}, status=400)
 
     try:
-        text = extract_pdf_text_from_url(resource.file.url)
-        relevance = relevance_score(text, query)  # dict with score + match
+        relevance = await _document_relevance(resource, query)  # dict with score + match
         suggestion = "related" if relevance["score"] >= 20 else "not related"
 
         return JsonResponse({
@@ -469,11 +507,72 @@ def analyze_resource(request, resource_id):
             "title": resource.title,
             "relevance_score": relevance["score"],
             "best_match": relevance["match"],
-            "suggestion": suggestion
+            "suggestion": suggestion,
+            "complete": relevance.get("complete", True),  # False if an early-exit scan stopped
         })
+    except CPUTimeout:
+        return JsonResponse({"error": "Analysis took too long, please try again later"}, status=504)
     except Exception as e:
         return JsonResponse({"error": f"Analysis failed: {str(e)}"}, status=500)
 
+# ✅ Batch relevance: a list of questions against all of a teacher's notes in one call
+MAX_BATCH_QUERIES = 200
+
+@login_required
+async def batch_relevance(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "POST a JSON body with a 'queries' list"}, status=405)
+    user = await request.auser()
+    profile = await Profile.objects.filter(user=user).afirst()
+    if profile is None:
+        return JsonResponse({"error": "Your account has no profile"}, status=400)
+    if profile.role != "teacher":
+        return JsonResponse({"error": "Only teachers can run batch analysis"}, status=403)
+
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"error": "The JSON body must be an object"}, status=400)
+    queries = payload.get("queries", [])
+    if not isinstance(queries, list):
+        return JsonResponse({"error": "'queries' must be a list of strings"}, status=400)
+    queries = [q.strip() for q in queries if isinstance(q, str) and q.strip()]
+    if not queries:
+        return JsonResponse({"error": "At least one query is required"}, status=400)
+    if len(queries) > MAX_BATCH_QUERIES:
+        return JsonResponse({"error": f"At most {MAX_BATCH_QUERIES} queries per call"}, status=400)
+    note_ids = payload.get("note_ids")
+    if note_ids is not None and not (
+        isinstance(note_ids, list) and all(type(i) is int for i in note_ids)
+    ):
+        return JsonResponse({"error": "'note_ids' must be a list of integers"}, status=400)
+
+    notes = Note.objects.filter(uploaded_by=user)
+    if note_ids:
+        notes = notes.filter(id__in=note_ids)
+
+    try:
+        # the shared vocabulary (fitted on first use) and the sparse product run in lrhub.cpu_pool
+        batch = await score_batch_async(queries, [note async for note in notes])
+    except CPUTimeout:
+        return JsonResponse({"error": "Analysis took too long, please try again later"}, status=504)
+    results = []
+    for query, scored in zip(queries, batch):
+        results.append({
+            "query": query,
+            "documents": [{
+                "type": "Note",
+                "id": item["document"].id,
+                "title": item["document"].title,
+                "relevance_score": item["score"],
+                "best_match": item["match"],
+                "suggestion": "related" if item["score"] >= 20 else "not related",
+            } for item in scored],
+        })
+    return JsonResponse({"results": results})
+
 from rest_framework import generics
 from .serializers import SignupSerializer
 
@@ -489,7 +588,7 @@ def admin_dashboard(request):
     query = request.GET.get("q")
     users = None
     if query:
-        users = User.objects.filter(username__icontains=query).select_related("profile")
+        users = search(query, kinds=("user",))["user"].select_related("profile")
     return render(request, "accounts/admin_dashboard.html", {"users": users, "query": query})
 @user_passes_test(lambda u: u.is_superuser)
 def add_user(request):
@@ -0,0 +1,49 @@
+"""
+Buffered ActivityLog writer.
+
+Signals and views call ``log_activity`` instead of ``ActivityLog.objects.create``.
+With ACTIVITY_LOG_BUFFERED=True (set it in the environment of busy deployments)
+entries are collected per worker by an lrhub.buffered.BufferedWriter and written
+with one ``bulk_create``. That happens when the buffer reaches
+ACTIVITY_LOG_FLUSH_SIZE, when ACTIVITY_LOG_FLUSH_INTERVAL has passed (checked at
+request end by ActivityLogFlushMiddleware and by a timer for idle workers), and
+at interpreter exit.
+"""
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from analytics.models import ActivityLog
+from lrhub.buffered import BufferedWriter
+
+
+def _write(batch):
+    try:
+        ActivityLog.objects.bulk_create(batch, batch_size=500)
+        batch.clear()
+    except IntegrityError:
+        # e.g. a user deleted while their entries were buffered; keep the rest
+        for entry in list(batch):
+            entry.pk = None
+            try:
+                entry.save()
+            except IntegrityError:
+                pass
+            batch.remove(entry)
+    finally:
+        for entry in batch:
+            entry.pk = None  # ids handed out by a rolled-back insert
+
+
+_writer = BufferedWriter("activity log entries", _write, "ACTIVITY_LOG", size=100, interval=5)
+flush = _writer.flush
+flush_if_due = _writer.flush_if_due
+
+
+def log_activity(user, action, description=""):
+    """Record an activity; written immediately unless ACTIVITY_LOG_BUFFERED is on."""
+    entry = ActivityLog(user=user, action=action, description=description, timestamp=timezone.now())
+    if not getattr(settings, "ACTIVITY_LOG_BUFFERED", False):
+        entry.save()
+        return
+    _writer.add(entry)
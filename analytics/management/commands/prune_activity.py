@@ -0,0 +1,71 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from analytics.models import ActivityLog, ActivityRollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll ActivityLog rows older than the retention period into daily "
+        "ActivityRollup counts and delete them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=getattr(settings, "ACTIVITY_LOG_RETENTION_DAYS", 90),
+                            help="Keep this many days of raw activity (default: ACTIVITY_LOG_RETENTION_DAYS).")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Report what would be pruned without changing anything.")
+
+    def handle(self, *args, **options):
+        # Cut at midnight so every day is rolled up exactly once, in full.
+        cutoff_day = timezone.localdate() - timedelta(days=options["days"])
+        cutoff = timezone.make_aware(datetime.combine(cutoff_day, time.min))
+
+        old = ActivityLog.objects.filter(timestamp__lt=cutoff)
+        if options["dry_run"]:
+            self.stdout.write(f"Would prune {old.count()} activity rows older than {cutoff_day}")
+            return
+
+        pruned = 0
+        while True:
+            first = old.order_by("timestamp").values_list("timestamp", flat=True).first()
+            if first is None:
+                break
+            day = timezone.localtime(first).date()
+            day_start = timezone.make_aware(datetime.combine(day, time.min))
+            pruned += self.roll_up_day(day, day_start, min(day_start + timedelta(days=1), cutoff))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {pruned} activity rows older than {cutoff_day}"
+        ))
+
+    @transaction.atomic
+    def roll_up_day(self, day, start, end):
+        rows = ActivityLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        counts = {
+            (c["user"], c["action"]): c["n"]
+            for c in rows.order_by().values("user", "action").annotate(n=Count("id"))
+        }
+        existing = {
+            (r.user_id, r.action): r
+            for r in ActivityRollup.objects.select_for_update().filter(day=day)
+        }
+
+        updated, created = [], []
+        for (user_id, action), n in counts.items():
+            rollup = existing.get((user_id, action))
+            if rollup:
+                rollup.count += n
+                updated.append(rollup)
+            else:
+                created.append(ActivityRollup(day=day, user_id=user_id, action=action, count=n))
+        ActivityRollup.objects.bulk_create(created)
+        ActivityRollup.objects.bulk_update(updated, ["count"])
+
+        deleted, _ = rows.delete()
+        return deleted
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = "Recompute today's global analytics snapshot from the source tables (run on a schedule)."
+
+    def handle(self, *args, **options):
+        snapshot = refresh_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {snapshot}: {snapshot.student_count} students, "
+            f"{snapshot.teacher_count} teachers, {snapshot.group_count} groups"
+        ))
@@ -0,0 +1,28 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from analytics.buffer import flush_if_due
+
+
+class ActivityLogFlushMiddleware:
+    """Write buffered ActivityLog entries at request end once a batch is due."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)  # served under ASGI without a sync/async switch
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        flush_if_due()
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        await sync_to_async(flush_if_due)()
+        return response
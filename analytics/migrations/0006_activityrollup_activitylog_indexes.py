@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-18 07:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_alter_activitylog_timestamp'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('action', models.CharField(choices=[('search', 'Search'), ('note_download', 'Note Downloaded'), ('resource_download', 'Resource Downloaded'), ('rating', 'Rating Given'), ('recommendation', 'Recommendation Made'), ('group_create', 'Group Created'), ('group_post', 'Group Post'), ('comment', 'Comment Added'), ('message', 'Message Sent'), ('login', 'User Logged In'), ('logout', 'User Logged Out')], max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['user', 'action', '-timestamp'], name='activity_user_action_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['timestamp'], name='activity_timestamp_idx'),
+        ),
+        migrations.AddField(
+            model_name='activityrollup',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='activityrollup',
+            index=models.Index(fields=['user', 'action', '-day'], name='rollup_user_action_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='activityrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'user', 'action'), name='unique_activity_rollup'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_activityrollup_activitylog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('student_count', models.PositiveIntegerField(default=0)),
+                ('teacher_count', models.PositiveIntegerField(default=0)),
+                ('group_count', models.PositiveIntegerField(default=0)),
+                ('most_downloaded_notes', models.JSONField(default=list)),
+                ('most_downloaded_resources', models.JSONField(default=list)),
+                ('top_notes', models.JSONField(default=list)),
+                ('top_resources', models.JSONField(default=list)),
+                ('lists_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+    ]
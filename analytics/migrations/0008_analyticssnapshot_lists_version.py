@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0007_analyticssnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyticssnapshot',
+            name='lists_version',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class ActivityLog(models.Model):
     ACTION_CHOICES = [
@@ -19,10 +20,59 @@ class ActivityLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     action = models.CharField(max_length=50, choices=ACTION_CHOICES)
     description = models.TextField(blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # set when the event happens, not when a buffered batch is written
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # "my recent activity" lookups: user + action__in, newest first
+            models.Index(fields=['user', 'action', '-timestamp'], name='activity_user_action_ts_idx'),
+            # retention pruning by age
+            models.Index(fields=['timestamp'], name='activity_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.action} ({self.timestamp:%Y-%m-%d %H:%M})"
+
+
+class ActivityRollup(models.Model):
+    """Daily per-user action counts that pruned ActivityLog rows are rolled into."""
+    day = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    action = models.CharField(max_length=50, choices=ActivityLog.ACTION_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'user', 'action'], name='unique_activity_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'action', '-day'], name='rollup_user_action_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.action} x{self.count} ({self.day})"
+
+
+class AnalyticsSnapshot(models.Model):
+    """Platform-wide totals for one day, read by global_analytics instead of scanning the source tables."""
+    day = models.DateField(unique=True)
+    student_count = models.PositiveIntegerField(default=0)
+    teacher_count = models.PositiveIntegerField(default=0)
+    group_count = models.PositiveIntegerField(default=0)
+    # top-2 lists: [{"id", "title", "downloads", "average_rating"}, ...]
+    most_downloaded_notes = models.JSONField(default=list)
+    most_downloaded_resources = models.JSONField(default=list)
+    top_notes = models.JSONField(default=list)
+    top_resources = models.JSONField(default=list)
+    lists_updated_at = models.DateTimeField(null=True, blank=True)
+    lists_version = models.CharField(max_length=100, blank=True)  # lrhub.cache versions the lists were read under
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"Analytics snapshot {self.day}"
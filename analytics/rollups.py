@@ -0,0 +1,77 @@
+"""
+Pre-aggregated numbers for ``global_analytics``.
+
+Today's AnalyticsSnapshot row is created from a full count once per day (or by
+``manage.py refresh_analytics``). After that, profile and group signals shift
+the role/group counters with F() updates. The top-2 download/rating lists are
+stored with the "documents"/"ratings" cache namespace versions they were read
+under (lrhub.cache). Every write to a document, rating or download count bumps
+one of those, so the next read re-reads the lists from their indexes (two rows
+each), and only then.
+"""
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import Profile
+from analytics.models import AnalyticsSnapshot
+from collaboration.models import Group
+from lrhub.cache import namespace_versions
+from resources.models import Note, StudentResource
+
+LIST_NAMESPACES = ("documents", "ratings")
+
+
+def _document_list(queryset):
+    return [
+        {
+            "id": obj.id,
+            "title": obj.title,
+            "downloads": obj.downloads,
+            "average_rating": obj.average_rating(),
+        }
+        for obj in queryset.only("id", "title", "downloads", "rating_count", "rating_avg")[:2]
+    ]
+
+
+def _list_fields():
+    return {
+        "most_downloaded_notes": _document_list(Note.objects.order_by("-downloads")),
+        "most_downloaded_resources": _document_list(StudentResource.objects.order_by("-downloads")),
+        "top_notes": _document_list(Note.objects.order_by("-rating_avg", "-uploaded_at")),
+        "top_resources": _document_list(StudentResource.objects.order_by("-rating_avg", "-uploaded_at")),
+        "lists_updated_at": timezone.now(),
+        "lists_version": namespace_versions(LIST_NAMESPACES),
+    }
+
+
+def refresh_snapshot(day=None):
+    """Recompute a day's snapshot from the source tables."""
+    day = day or timezone.localdate()
+    snapshot, _ = AnalyticsSnapshot.objects.update_or_create(day=day, defaults={
+        "student_count": Profile.objects.filter(role="student").count(),
+        "teacher_count": Profile.objects.filter(role="teacher").count(),
+        "group_count": Group.objects.count(),
+        **_list_fields(),
+    })
+    return snapshot
+
+
+def current_snapshot():
+    """Today's snapshot, created on first use, with lists re-read after any document/rating write."""
+    snapshot = AnalyticsSnapshot.objects.filter(day=timezone.localdate()).first()
+    if snapshot is None:
+        return refresh_snapshot()
+
+    if snapshot.lists_version != namespace_versions(LIST_NAMESPACES):
+        fields = _list_fields()
+        AnalyticsSnapshot.objects.filter(pk=snapshot.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(snapshot, name, value)
+    return snapshot
+
+
+def apply_delta(**deltas):
+    """Shift today's counters, e.g. apply_delta(student_count=1). No-op until the row exists."""
+    AnalyticsSnapshot.objects.filter(day=timezone.localdate()).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
@@ -1,15 +1,19 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete
 from collaboration.models import Group, Post, Comment, Message
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.dispatch import receiver
-from analytics.models import ActivityLog
+from analytics.buffer import log_activity
+from analytics import rollups
+from lrhub.cache import invalidate
+from django.db import transaction
+from accounts.models import Profile
 from resources.models import Rating, Recommendation
 
 # --- Group Creation ---
 @receiver(post_save, sender=Group)
 def log_group_creation(sender, instance, created, **kwargs):
     if created:
-        ActivityLog.objects.create(
+        log_activity(
             user=instance.created_by,
             action="group_create",   # ✅ distinct action
             description=f"Created group: {instance.name}"
@@ -19,7 +23,7 @@ def log_group_creation(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Post)
 def log_post(sender, instance, created, **kwargs):
     if created:
-        ActivityLog.objects.create(
+        log_activity(
             user=instance.author,
             action="group_post",
             description=f"Posted in group {instance.group.name}: {instance.title}"
@@ -29,7 +33,7 @@ def log_post(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Comment)
 def log_comment(sender, instance, created, **kwargs):
     if created:
-        ActivityLog.objects.create(
+        log_activity(
             user=instance.author,
             action="comment",
             description=f"Commented on post '{instance.post.title}': {instance.content[:50]}..."
@@ -39,14 +43,14 @@ def log_comment(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Message)
 def log_message(sender, instance, created, **kwargs):
     if created:
-        ActivityLog.objects.create(
+        log_activity(
             user=instance.author,
             action="message",
             description=f"Message in group {instance.group.name}: {instance.content[:50]}..."
         )
 @receiver(user_logged_in)
 def log_login(sender, request, user, **kwargs):
-    ActivityLog.objects.create(
+    log_activity(
         user=user,
         action="login",
         description="User logged in"
@@ -54,7 +58,7 @@ def log_login(sender, request, user, **kwargs):
 
 @receiver(user_logged_out)
 def log_logout(sender, request, user, **kwargs):
-    ActivityLog.objects.create(
+    log_activity(
         user=user,
         action="logout",
         description="User logged out"
@@ -66,7 +70,7 @@ from resources.models import Rating, Recommendation
 def log_rating(sender, instance, created, **kwargs):
     if created:
         target = instance.note if instance.note else instance.resource
-        ActivityLog.objects.create(
+        log_activity(
             user=instance.user,
             action="rating",
             description=f"Rated {target} {instance.value}★"
@@ -76,8 +80,44 @@ def log_rating(sender, instance, created, **kwargs):
 def log_recommendation(sender, instance, created, **kwargs):
     if created:
         target = instance.note if instance.note else instance.resource
-        ActivityLog.objects.create(
+        log_activity(
             user=instance.user,
             action="recommendation",
             description=f"Recommended {target} — \"{instance.comment[:50]}...\""
         )
+
+# --- Global analytics rollup counters ---
+ROLE_COUNTERS = {"student": "student_count", "teacher": "teacher_count"}
+
+@receiver(post_init, sender=Profile)
+def remember_profile_role(sender, instance, **kwargs):
+    instance._stored_role = instance.__dict__.get("role") if instance.pk else None
+
+@receiver(post_save, sender=Profile)
+def count_profile_role(sender, instance, created, **kwargs):
+    old_role = None if created else instance._stored_role
+    if old_role != instance.role:
+        deltas = {}
+        if old_role in ROLE_COUNTERS:
+            deltas[ROLE_COUNTERS[old_role]] = -1
+        if instance.role in ROLE_COUNTERS:
+            deltas[ROLE_COUNTERS[instance.role]] = 1
+        if deltas:
+            rollups.apply_delta(**deltas)
+    instance._stored_role = instance.role
+    transaction.on_commit(lambda: invalidate("profiles"))
+
+@receiver(post_delete, sender=Profile)
+def uncount_profile_role(sender, instance, **kwargs):
+    if instance.role in ROLE_COUNTERS:
+        rollups.apply_delta(**{ROLE_COUNTERS[instance.role]: -1})
+    transaction.on_commit(lambda: invalidate("profiles"))
+
+@receiver(post_save, sender=Group)
+def count_group(sender, instance, created, **kwargs):
+    if created:
+        rollups.apply_delta(group_count=1)
+
+@receiver(post_delete, sender=Group)
+def uncount_group(sender, instance, **kwargs):
+    rollups.apply_delta(group_count=-1)
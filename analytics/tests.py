@@ -1,3 +1,230 @@
-from django.test import TestCase
+import tempfile
+from datetime import datetime, time, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import cloudinary
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from analytics import buffer, rollups
+from analytics.middleware import ActivityLogFlushMiddleware
+from analytics.models import ActivityLog, ActivityRollup
+from collaboration.models import Group
+from lrhub.buffered import BufferedWriter
+from resources.models import Note, Rating
+
+
+@override_settings(TEST_FLUSH_SIZE=3, TEST_FLUSH_INTERVAL=60)
+class BufferedWriterTests(TestCase):
+    """Batches are written on size and on demand, kept on errors, and flushed at exit."""
+
+    def make_writer(self):
+        self.written, self.fail = [], False
+
+        def write(batch):
+            if self.fail:
+                raise OperationalError("database is gone")
+            self.written.append(list(batch))
+            batch.clear()
+
+        with mock.patch("atexit.register") as register:
+            writer = BufferedWriter("test items", write, "TEST")
+        self.at_exit = register.call_args.args[0]
+        self.addCleanup(writer.flush)  # stops the timer
+        return writer
+
+    def add(self, writer, *items):
+        with self.captureOnCommitCallbacks(execute=True):
+            for item in items:
+                writer.add(item)
+
+    def test_flushes_when_full_and_on_demand(self):
+        writer = self.make_writer()
+        self.add(writer, 1, 2)
+        self.assertEqual(self.written, [])
+        self.add(writer, 3)
+        self.assertEqual(self.written, [[1, 2, 3]])
+        self.add(writer, 4)
+        writer.flush()
+        self.assertEqual(self.written, [[1, 2, 3], [4]])
+
+    def test_failed_batch_is_kept_for_the_next_flush(self):
+        writer = self.make_writer()
+        self.add(writer, 1)
+        self.fail = True
+        with self.assertLogs("lrhub.buffered", "ERROR"):
+            writer.flush()
+        self.fail = False
+        self.add(writer, 2)
+        writer.flush()
+        self.assertEqual(self.written, [[1, 2]])
+
+    def test_rolled_back_items_are_dropped(self):
+        writer = self.make_writer()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                writer.add(1)
+                raise RuntimeError
+        writer.flush()
+        self.assertEqual(self.written, [])
+
+    def test_shutdown_flushes_and_never_raises(self):
+        writer = self.make_writer()
+        self.add(writer, 1)
+        self.at_exit()
+        self.assertEqual(self.written, [[1]])
+        self.add(writer, 2)
+        self.fail = True
+        with self.assertLogs("lrhub.buffered", "ERROR"):
+            self.at_exit()  # database already closed at exit: logged, not raised
+        self.fail = False
+
+
+@override_settings(ACTIVITY_LOG_BUFFERED=True)
+class ActivityLogBufferTests(TestCase):
+    def test_entries_are_written_in_one_batch(self):
+        user = User.objects.create_user("alice")
+        ActivityLog.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            buffer.log_activity(user, "login")
+            buffer.log_activity(user, "logout")
+        self.assertFalse(ActivityLog.objects.exists())
+        with self.assertNumQueries(1):
+            buffer.flush()
+        self.assertEqual(sorted(ActivityLog.objects.values_list("action", flat=True)), ["login", "logout"])
+
+
+class PruneActivityTests(TestCase):
+    """Rows past retention are rolled into daily per-user counts, then deleted."""
+
+    def setUp(self):
+        self.alice, self.bob = User.objects.create_user("alice"), User.objects.create_user("bob")
+        ActivityLog.objects.all().delete()
+        today = timezone.localdate()
+        self.day_a, self.day_b = today - timedelta(days=40), today - timedelta(days=39)
+
+        def log(user, action, day, hour=12):
+            stamp = timezone.make_aware(datetime.combine(day, time(hour)))
+            ActivityLog.objects.create(user=user, action=action, timestamp=stamp)
+
+        log(self.alice, "login", self.day_a, 1)
+        log(self.alice, "login", self.day_a, 23)
+        log(self.bob, "search", self.day_a)
+        log(self.alice, "login", self.day_b)
+        log(self.alice, "login", today)  # within retention
+        ActivityRollup.objects.create(day=self.day_a, user=self.alice, action="login", count=5)
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command("prune_activity", days=30, dry_run=True, stdout=out)
+        self.assertIn("Would prune 4 activity rows", out.getvalue())
+        self.assertEqual(ActivityLog.objects.count(), 5)
+
+    def test_old_rows_are_rolled_up_and_deleted(self):
+        out = StringIO()
+        call_command("prune_activity", days=30, stdout=out)
+        self.assertIn("Pruned 4 activity rows", out.getvalue())
+        self.assertEqual(timezone.localtime(ActivityLog.objects.get().timestamp).date(), timezone.localdate())
+        rollups = {(r.day, r.user.username, r.action): r.count for r in ActivityRollup.objects.select_related("user")}
+        self.assertEqual(rollups, {
+            (self.day_a, "alice", "login"): 7,  # added to the existing rollup
+            (self.day_a, "bob", "search"): 1,
+            (self.day_b, "alice", "login"): 1,
+        })
+
+        call_command("prune_activity", days=30, stdout=StringIO())  # nothing left to prune
+        self.assertEqual(ActivityRollup.objects.get(day=self.day_a, user=self.alice).count, 7)
+
+
+class ActivityLogFlushMiddlewareTests(SimpleTestCase):
+    """The flush middleware runs in whichever mode the handler chain is in."""
+
+    def test_sync_and_async_chains(self):
+        response = HttpResponse()
+
+        def get_response(request):
+            return response
+
+        async def aget_response(request):
+            return response
+
+        with mock.patch("analytics.middleware.flush_if_due") as flush_if_due:
+            middleware = ActivityLogFlushMiddleware(get_response)
+            self.assertFalse(iscoroutinefunction(middleware))
+            self.assertIs(middleware(RequestFactory().get("/")), response)
+
+            middleware = ActivityLogFlushMiddleware(aget_response)
+            self.assertTrue(iscoroutinefunction(middleware))
+            self.assertIs(async_to_sync(middleware)(RequestFactory().get("/")), response)
+        self.assertEqual(flush_if_due.call_count, 2)
+
+
+@override_settings(CPU_POOL_WORKERS=0)  # search-index patches run inline, against the test database
+class GlobalAnalyticsTests(TestCase):
+    """The snapshot's top lists are re-read after a document or rating write, not on a timer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        cls.teacher = User.objects.create_user("teacher")
+        cls.student = User.objects.create_user("student")
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(SEARCH_INDEX_PATH=f"{directory.name}/search_index.joblib"))
+
+    def top_notes(self):
+        return [n["title"] for n in self.client.get(reverse("global_analytics")).context["top_notes"]]
+
+    def test_new_rated_note_shows_up_at_once(self):
+        self.assertEqual(self.top_notes(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            note = Note.objects.create(title="Algebra", topic="algebra", uploaded_by=self.teacher,
+                                       file="raw/upload/v1/algebra.pdf")
+            Rating.objects.create(user=self.student, note=note, value=5)
+        self.assertEqual(self.top_notes(), ["Algebra"])
+
+        with self.assertNumQueries(0):  # unchanged since: served from the cache
+            self.top_notes()
+
+
+class SnapshotDeltaTests(TestCase):
+    """Profile and group signals keep today's counters equal to a full recount."""
+
+    def counters(self):
+        snapshot = rollups.current_snapshot()
+        return snapshot.student_count, snapshot.teacher_count, snapshot.group_count
+
+    def recount(self):
+        snapshot = rollups.refresh_snapshot()
+        return snapshot.student_count, snapshot.teacher_count, snapshot.group_count
+
+    def test_counters_follow_profiles_and_groups(self):
+        rollups.refresh_snapshot()
+        alice = User.objects.create_user("alice")
+        bob = User.objects.create_user("bob")
+        self.assertEqual(self.counters(), (2, 0, 0))
+
+        bob.profile.role = "teacher"
+        bob.profile.save()
+        bob.profile.save()  # unchanged role: no second shift
+        self.assertEqual(self.counters(), (1, 1, 0))
+
+        group = Group.objects.create(name="Algebra", created_by=bob)
+        Group.objects.create(name="Biology", created_by=alice)
+        self.assertEqual(self.counters(), (1, 1, 2))
+
+        group.delete()
+        alice.delete()  # takes her profile and her group along
+        self.assertEqual(self.counters(), (0, 1, 0))
+        self.assertEqual(self.counters(), self.recount())
@@ -1,44 +1,35 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from accounts.models import Profile
 from resources.models import Note, StudentResource, Rating, Recommendation
-from collaboration.models import Group
 from analytics.models import ActivityLog
-from django.db.models import Count, Avg, Q
+from analytics import rollups
+from lrhub.cache import cached
+from django.db.models import Q
 
 def analytics_home(request):
     return render(request, "analytics/home.html")
 
 def global_analytics(request):
-    student_count = Profile.objects.filter(role="student").count()
-    teacher_count = Profile.objects.filter(role="teacher").count()
-
-    # ✅ Most downloaded notes/resources (top 2)
-    most_downloaded_notes = Note.objects.order_by("-downloads")[:2]
-    most_downloaded_resources = StudentResource.objects.order_by("-downloads")[:2]
-
-    # ✅ Highest rated notes/resources (top 2)
-    top_notes = Note.objects.annotate(avg_rating=Avg("ratings__value")).order_by("-avg_rating")[:2]
-    top_resources = StudentResource.objects.annotate(avg_rating=Avg("ratings__value")).order_by("-avg_rating")[:2]
-
-    group_count = Group.objects.count()
+    # ✅ One pre-aggregated row instead of scanning Profile, Note, StudentResource and Group
+    snapshot = cached(
+        ("documents", "ratings", "groups", "profiles"), ("global_analytics",),
+        rollups.current_snapshot,
+    )
 
     return render(request, "analytics/global_analytics.html", {
-        "student_count": student_count,
-        "teacher_count": teacher_count,
-        "most_downloaded_notes": most_downloaded_notes,
-        "most_downloaded_resources": most_downloaded_resources,
-        "top_notes": top_notes,
-        "top_resources": top_resources,
-        "group_count": group_count,
+        "student_count": snapshot.student_count,
+        "teacher_count": snapshot.teacher_count,
+        "most_downloaded_notes": snapshot.most_downloaded_notes,
+        "most_downloaded_resources": snapshot.most_downloaded_resources,
+        "top_notes": snapshot.top_notes,
+        "top_resources": snapshot.top_resources,
+        "group_count": snapshot.group_count,
     })
 
 @login_required
 def student_analytics(request):
     # ✅ Student’s own uploaded resources with average rating
-    my_resources = StudentResource.objects.filter(uploaded_by=request.user).annotate(
-        avg_rating=Avg("ratings__value")
-    )
+    my_resources = StudentResource.objects.filter(uploaded_by=request.user)
 
     # ✅ Recommendations given to the student’s resources
     my_resource_recommendations = Recommendation.objects.filter(resource__in=my_resources)
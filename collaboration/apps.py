@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CollaborationConfig(AppConfig):
     name = 'collaboration'
+
+    def ready(self):
+        import collaboration.signals
@@ -0,0 +1,73 @@
+"""
+Per-group change counters for clients that can't keep a WebSocket open.
+
+After commit, signals bump one counter per (group, kind) in the cache; kind is
+"messages", "posts" or "comments". The updates endpoint (views.group_updates)
+compares the client's counters with the current ones. It holds the request,
+re-reading only the counters (one cache get_many) every
+COLLAB_UPDATES_INTERVAL seconds, until one of them moves. The message, post and
+comment tables are only queried after the client learns that something
+changed.
+
+With several workers the counters need a shared cache (REDIS_URL or
+CACHE_DIR), as lrhub.cache does.
+"""
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+KINDS = ("messages", "posts", "comments")
+
+
+def _key(group_id, kind):
+    return f"collab:changes:{group_id}:{kind}"
+
+
+def bump(group_id, kind):
+    key = _key(group_id, kind)
+    try:
+        cache.incr(key)
+    except ValueError:  # first change (or evicted): any value the client doesn't hold counts as a change
+        cache.set(key, 1, timeout=None)
+
+
+def versions(group_id):
+    values = cache.get_many([_key(group_id, kind) for kind in KINDS])
+    return {kind: values.get(_key(group_id, kind), 0) for kind in KINDS}
+
+
+async def aversions(group_id):
+    values = await cache.aget_many([_key(group_id, kind) for kind in KINDS])
+    return {kind: values.get(_key(group_id, kind), 0) for kind in KINDS}
+
+
+def changed_kinds(current, since):
+    return [kind for kind in KINDS if current[kind] != since.get(kind)]
+
+
+def parse_versions(raw):
+    """``"3.1.0"`` (messages.posts.comments, the SSE event id) -> dict, or None."""
+    try:
+        return dict(zip(KINDS, (int(part) for part in raw.split(".")), strict=True))
+    except (AttributeError, ValueError):
+        return None
+
+
+def format_versions(current):
+    return ".".join(str(current[kind]) for kind in KINDS)
+
+
+async def wait_for_change(group_id, since, timeout=None):
+    """Return ``(current versions, changed kinds)`` once a counter differs from ``since``,
+    or with no kinds once ``timeout`` seconds (COLLAB_UPDATES_TIMEOUT) have passed."""
+    timeout = timeout if timeout is not None else getattr(settings, "COLLAB_UPDATES_TIMEOUT", 25)
+    interval = getattr(settings, "COLLAB_UPDATES_INTERVAL", 1.0)
+    deadline = time.monotonic() + timeout
+    while True:
+        current = await aversions(group_id)
+        changed = changed_kinds(current, since)
+        if changed or time.monotonic() >= deadline:
+            return current, changed
+        await asyncio.sleep(min(interval, max(deadline - time.monotonic(), 0)))
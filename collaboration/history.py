@@ -0,0 +1,68 @@
+"""
+Keyset pagination over a group's chat messages.
+
+Messages are ordered by ``(created_at, id)`` and a cursor holds that pair for
+the edge row of a page. Older history is ``WHERE (created_at, id) < cursor``
+newest first, newer messages ``> cursor`` oldest first, each ``LIMIT size + 1``.
+With the (group, created_at, id) index a page costs one index range scan
+however long the history is. A user who cleared the chat (ChatClear) never
+gets messages from before their ``cleared_at``.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from lrhub import cursors
+
+from .models import ChatClear
+
+
+def page_size():
+    return getattr(settings, "CHAT_PAGE_SIZE", 50)
+
+
+def encode_cursor(message):
+    return cursors.encode_cursor(message.created_at, message.pk)
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, id)`` or None for a missing/garbled cursor."""
+    return cursors.decode_cursor(cursor, cursors.parse_stamp, int)
+
+
+def visible_messages(user, group):
+    """The group's messages this user has not cleared, with what the bubbles render."""
+    messages = group.messages.select_related("author__profile")
+    cleared_at = ChatClear.objects.filter(user=user, group=group).values_list("cleared_at", flat=True).first()
+    if cleared_at:
+        messages = messages.filter(created_at__gt=cleared_at)
+    return messages
+
+
+def history_page(user, group, before=None, after=None, size=None):
+    """
+    One page of chat, always returned oldest first.
+
+    Without cursors it is the latest ``size`` messages. ``before`` pages back
+    into older history, ``after`` catches up on newer messages. Returns
+    ``(messages, older_cursor, newer_cursor)``; a cursor is None when there is
+    nothing more in that direction.
+    """
+    size = size or page_size()
+    messages = visible_messages(user, group)
+    position = decode_cursor(after)
+    if position:
+        stamp, pk = position
+        rows = list(
+            messages.filter(Q(created_at__gt=stamp) | Q(created_at=stamp, id__gt=pk))
+            .order_by("created_at", "id")[:size + 1]
+        )
+        page = rows[:size]
+        return page, None, encode_cursor(page[-1]) if len(rows) > size else None
+
+    position = decode_cursor(before)
+    if position:
+        stamp, pk = position
+        messages = messages.filter(Q(created_at__lt=stamp) | Q(created_at=stamp, id__lt=pk))
+    rows = list(messages.order_by("-created_at", "-id")[:size + 1])
+    page = rows[:size][::-1]
+    return page, encode_cursor(page[0]) if len(rows) > size else None, None
@@ -0,0 +1,77 @@
+"""
+Keyset pagination for the collaboration listings: the group list on
+collaboration_home, a group's posts and a post's comments.
+
+Each listing is read newest first, ordered by ``(<stamp field>, id)``
+descending: ``last_activity_at`` for groups and ``created_at`` for posts
+and comments. The cursor holds that pair for the last row of a page. The
+next page is ``WHERE (stamp, id) < cursor LIMIT size + 1``, served by an
+index ending in ``(stamp, id)``, so a page costs one index range scan no
+matter how deep the reader has paged or how busy the group is.
+
+Per-row data comes with the same query. Groups carry stored counters plus
+the GroupQuerySet.with_unread annotations. Posts get their author and a
+``comment_count`` subquery, and comments get their author and profile.
+Page sizes are COLLAB_GROUPS_PAGE_SIZE, COLLAB_POSTS_PAGE_SIZE and
+COLLAB_COMMENTS_PAGE_SIZE.
+"""
+from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from lrhub import cursors
+
+from .models import Comment
+
+PAGE_SIZES = {
+    "groups": ("COLLAB_GROUPS_PAGE_SIZE", 12),
+    "posts": ("COLLAB_POSTS_PAGE_SIZE", 20),
+    "comments": ("COLLAB_COMMENTS_PAGE_SIZE", 50),
+}
+
+
+def page_size(listing):
+    name, default = PAGE_SIZES[listing]
+    return getattr(settings, name, default)
+
+
+def encode_cursor(obj, field):
+    return cursors.encode_cursor(getattr(obj, field), obj.pk)
+
+
+def decode_cursor(cursor):
+    """Return ``(stamp, id)`` or None for a missing/garbled cursor."""
+    return cursors.decode_cursor(cursor, cursors.parse_stamp, int)
+
+
+def keyset_page(queryset, field, cursor=None, size=None):
+    """One page of ``queryset`` newest first by ``(field, id)``. Returns ``(rows, next_cursor)``."""
+    position = decode_cursor(cursor)
+    if position:
+        stamp, pk = position
+        queryset = queryset.filter(Q(**{f"{field}__lt": stamp}) | Q(**{field: stamp, "id__lt": pk}))
+    rows = list(queryset.order_by(f"-{field}", "-id")[:size + 1])
+    page = rows[:size]
+    return page, encode_cursor(page[-1], field) if len(rows) > size else None
+
+
+def group_page(groups, cursor=None, size=None):
+    """Groups, most recently active first."""
+    return keyset_page(groups, "last_activity_at", cursor, size or page_size("groups"))
+
+
+def with_comment_count(posts):
+    comments = Comment.objects.filter(post=OuterRef("pk")).order_by().values("post").annotate(c=Count("pk")).values("c")
+    return posts.annotate(comment_count=Coalesce(Subquery(comments, output_field=IntegerField()), Value(0)))
+
+
+def post_page(group, cursor=None, size=None):
+    """The group's posts, newest first, with author and ``comment_count``."""
+    posts = with_comment_count(group.posts.select_related("author"))
+    return keyset_page(posts, "created_at", cursor, size or page_size("posts"))
+
+
+def comment_page(post, cursor=None, size=None):
+    """The post's comments, newest first, with author and profile (the role colours)."""
+    comments = post.comments.select_related("author__profile")
+    return keyset_page(comments, "created_at", cursor, size or page_size("comments"))
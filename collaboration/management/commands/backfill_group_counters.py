@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from collaboration.models import Group
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored member/post/message counts and last activity of every group."
+
+    def handle(self, *args, **options):
+        groups = Group.objects.all().refresh_counters()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed counters for {groups} groups"))
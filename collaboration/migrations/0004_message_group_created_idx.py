@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0003_alter_comment_options_alter_message_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['group', 'created_at', 'id'], name='message_group_created_idx'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 6.0 on 2026-10-18 15:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def backfill_group_counters(apps, schema_editor):
+    Group = apps.get_model('collaboration', 'Group')
+    Message = apps.get_model('collaboration', 'Message')
+    Post = apps.get_model('collaboration', 'Post')
+    Comment = apps.get_model('collaboration', 'Comment')
+
+    def count(queryset):
+        counted = queryset.order_by().values('group').annotate(c=Count('pk')).values('c')
+        return Coalesce(Subquery(counted, output_field=models.IntegerField()), Value(0))
+
+    def latest(queryset):
+        return Coalesce(Subquery(queryset.order_by('-created_at').values('created_at')[:1]), F('created_at'))
+
+    messages = Message.objects.filter(group=OuterRef('pk'))
+    posts = Post.objects.filter(group=OuterRef('pk'))
+    Group.objects.update(
+        member_count=count(Group.members.through.objects.filter(group=OuterRef('pk'))),
+        post_count=count(posts),
+        message_count=count(messages),
+        last_activity_at=Greatest(
+            F('created_at'),
+            latest(messages),
+            latest(posts),
+            latest(Comment.objects.filter(post__group=OuterRef('pk'))),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0004_message_group_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('messages_read_at', models.DateTimeField(blank=True, null=True)),
+                ('posts_read_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-last_activity_at', '-id'], name='group_activity_idx'),
+        ),
+        migrations.AddField(
+            model_name='groupreadcursor',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='collaboration.group'),
+        ),
+        migrations.AddField(
+            model_name='groupreadcursor',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_read_cursors', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='groupreadcursor',
+            constraint=models.UniqueConstraint(fields=('user', 'group'), name='unique_group_read_cursor'),
+        ),
+        migrations.RunPython(backfill_group_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 16:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collaboration', '0005_group_counters_read_cursors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'created_at', 'id'], name='post_group_created_idx'),
+        ),
+    ]
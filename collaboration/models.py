@@ -1,5 +1,75 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+
+def _count(queryset):
+    """Correlated COUNT(*) of ``queryset`` (rows of one group, filtered on OuterRef), 0 when empty."""
+    counted = queryset.order_by().values("group").annotate(c=Count("pk")).values("c")
+    return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+
+class GroupQuerySet(models.QuerySet):
+    def record_activity(self, at=None, **deltas):
+        """Shift stored counters in one UPDATE (e.g. ``message_count=1``) and move
+        ``last_activity_at`` forward to ``at``; concurrent writers never lose an increment."""
+        updates = {field: F(field) + delta for field, delta in deltas.items()}
+        if at is not None:
+            updates["last_activity_at"] = Greatest(F("last_activity_at"), Value(at))
+        return self.update(**updates)
+
+    def chat_for(self, user):
+        """Groups whose chat ``user`` may read and write: the ones they are a member of.
+        Shared by the chat pages and the chat socket (collaboration.realtime)."""
+        return self.filter(members=user)
+
+    def refresh_member_count(self):
+        members = Group.members.through.objects.filter(group=OuterRef("pk"))
+        return self.update(member_count=_count(members))
+
+    def refresh_counters(self):
+        """Recompute every stored counter from the related tables (backfill / repair)."""
+        def latest(queryset):
+            return Subquery(queryset.order_by("-created_at").values("created_at")[:1])
+
+        messages = Message.objects.filter(group=OuterRef("pk"))
+        posts = Post.objects.filter(group=OuterRef("pk"))
+        comments = Comment.objects.filter(post__group=OuterRef("pk"))
+        self.refresh_member_count()
+        return self.update(
+            post_count=_count(posts),
+            message_count=_count(messages),
+            last_activity_at=Greatest(
+                F("created_at"),
+                Coalesce(latest(messages), F("created_at")),
+                Coalesce(latest(posts), F("created_at")),
+                Coalesce(latest(comments), F("created_at")),
+            ),
+        )
+
+    def with_unread(self, user):
+        """
+        Annotate ``is_member`` and, since the user's GroupReadCursor, ``unread_messages`` /
+        ``unread_posts`` written by others, in the same query. Without a cursor everything
+        in the group counts as unread.
+        """
+        cursor = GroupReadCursor.objects.filter(user=user, group=OuterRef("pk"))
+        groups = self.annotate(
+            is_member=Exists(Group.members.through.objects.filter(group=OuterRef("pk"), user=user)),
+            messages_read_at=Coalesce(Subquery(cursor.values("messages_read_at")[:1]), F("created_at")),
+            posts_read_at=Coalesce(Subquery(cursor.values("posts_read_at")[:1]), F("created_at")),
+        )
+        return groups.annotate(
+            unread_messages=_count(Message.objects.filter(
+                group=OuterRef("pk"), created_at__gt=OuterRef("messages_read_at"),
+            ).exclude(author=user)),
+            unread_posts=_count(Post.objects.filter(
+                group=OuterRef("pk"), created_at__gt=OuterRef("posts_read_at"),
+            ).exclude(author=user)),
+        )
+
 
 class Group(models.Model):
     name = models.CharField(max_length=100)
@@ -8,6 +78,19 @@ class Group(models.Model):
     members = models.ManyToManyField(User, related_name="collaboration_groups")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # ✅ Stored counters, kept current by collaboration.signals (backfill: manage.py backfill_group_counters)
+    member_count = models.PositiveIntegerField(default=0)
+    post_count = models.PositiveIntegerField(default=0)
+    message_count = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+
+    objects = GroupQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-last_activity_at", "-id"], name="group_activity_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -23,6 +106,10 @@ class Post(models.Model):
         return self.title
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # keyset pages of a group's posts (collaboration.listing)
+            models.Index(fields=["group", "created_at", "id"], name="post_group_created_idx"),
+        ]
 
 
 
@@ -36,6 +123,10 @@ class Comment(models.Model):
         return f"Comment by {self.author.username}"
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # keyset pages of a post's comments (collaboration.listing)
+            models.Index(fields=["post", "created_at", "id"], name="comment_post_created_idx"),
+        ]
 
     
 class Message(models.Model):
@@ -48,6 +139,10 @@ class Message(models.Model):
         return f"{self.author.username}: {self.content[:30]}"
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # keyset pages of chat history (collaboration.history)
+            models.Index(fields=["group", "created_at", "id"], name="message_group_created_idx"),
+        ]
 
 class ChatClear(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -56,3 +151,21 @@ class ChatClear(models.Model):
 
     class Meta:
         unique_together = ("user", "group")
+
+
+class GroupReadCursor(models.Model):
+    """How far a user has read a group's chat and posts (unread counts on collaboration_home)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="group_read_cursors")
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="read_cursors")
+    messages_read_at = models.DateTimeField(null=True, blank=True)
+    posts_read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "group"], name="unique_group_read_cursor"),
+        ]
+
+    @classmethod
+    def mark_read(cls, user, group, field):
+        """Move the user's ``messages_read_at`` or ``posts_read_at`` for ``group`` to now."""
+        cls.objects.update_or_create(user=user, group=group, defaults={field: timezone.now()})
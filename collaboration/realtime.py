@@ -0,0 +1,233 @@
+"""
+Live group chat over WebSockets (served by lrhub.asgi).
+
+A member on the chat page connects to ``/ws/collaboration/group/<pk>/chat/``
+(anyone else, and teachers still awaiting approval, are refused with close
+code 4403: the same rule as the chat pages, since sockets skip the middleware).
+Message saves and deletes are published by collaboration.signals, and every
+open socket of that group receives the delta as one JSON object, so the page
+never reloads the history. Messages typed into the socket are saved through
+MessageForm exactly like the form POST.
+
+Fan-out goes through a broker named by the CHAT_BROKER setting:
+LocalBroker reaches the sockets of this process only, RedisBroker (Redis
+pub/sub on REDIS_URL) reaches every worker and host.
+"""
+import asyncio
+import json
+import re
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.http.cookie import parse_cookie
+from django.http.request import validate_host
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateformat import format as format_date
+from django.utils.module_loading import import_string
+
+from accounts.middleware import awaiting_approval
+from .forms import MessageForm
+from .history import encode_cursor
+from .models import Group
+
+CHAT_PATH = re.compile(r"^/ws/collaboration/group/(?P<pk>\d+)/chat/$")
+
+
+def channel_name(group_id):
+    return f"chat.group.{group_id}"
+
+
+# --- Brokers ---
+class Broker:
+    """Pub/sub between the code that saves messages and the open sockets.
+
+    ``publish`` is sync and may be called from any thread. ``subscribe`` is an
+    async context manager yielding an async iterator of published payloads.
+    """
+
+    def publish(self, channel, payload):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+
+class LocalBroker(Broker):
+    """In-process fan-out: one asyncio.Queue per open socket."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)  # channel -> {(event loop, queue)}
+
+    def publish(self, channel, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, payload)
+            except RuntimeError:  # loop already closed; its socket is gone
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[channel].add(entry)
+
+        async def payloads():
+            while True:
+                yield await entry[1].get()
+        try:
+            yield payloads()
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(entry)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class RedisBroker(Broker):
+    """Redis pub/sub, for several web workers or hosts (needs the ``redis`` package)."""
+
+    def __init__(self, url=None):
+        import redis
+
+        self.url = url or settings.REDIS_URL
+        self._client = redis.Redis.from_url(self.url)
+
+    def publish(self, channel, payload):
+        self._client.publish(channel, json.dumps(payload))
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+
+        async def payloads():
+            async for item in pubsub.listen():
+                if item["type"] == "message":
+                    yield json.loads(item["data"])
+        try:
+            yield payloads()
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, "CHAT_BROKER", "collaboration.realtime.LocalBroker"))()
+    return _broker
+
+
+# --- Payloads ---
+def message_payload(message, event="message"):
+    """JSON delta for a saved Message (``event`` is "message" or "message_edited")."""
+    profile = getattr(message.author, "profile", None)
+    return {
+        "event": event,
+        "id": message.pk,
+        "author": message.author.username,
+        "author_id": message.author_id,
+        "role": getattr(profile, "role", ""),
+        "content": message.content,
+        "created_at": message.created_at.isoformat(),
+        "cursor": encode_cursor(message),
+        "time": format_date(timezone.localtime(message.created_at), "M d, H:i"),
+        "edit_url": reverse("edit_message", args=[message.pk]),
+        "delete_url": reverse("delete_message", args=[message.pk]),
+    }
+
+
+def publish(group_id, payload):
+    get_broker().publish(channel_name(group_id), payload)
+
+
+# --- WebSocket application ---
+def _origin_allowed(scope):
+    """Refuse cross-site sockets: the Origin host must be one of ALLOWED_HOSTS."""
+    headers = dict(scope.get("headers", []))
+    origin = headers.get(b"origin")
+    if origin is None:
+        return True  # not a browser
+    host = urlsplit(origin.decode("latin1")).hostname or ""
+    allowed = settings.ALLOWED_HOSTS or (["localhost", "127.0.0.1", "[::1]"] if settings.DEBUG else [])
+    return validate_host(host, allowed)
+
+
+def _scope_user(scope):
+    """The logged-in user behind the session cookie of the handshake."""
+    headers = dict(scope.get("headers", []))
+    cookies = parse_cookie(headers.get(b"cookie", b"").decode("latin1"))
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    return get_user(SimpleNamespace(session=store(cookies.get(settings.SESSION_COOKIE_NAME))))
+
+
+def _save_message(user, group, content):
+    form = MessageForm({"content": content})
+    if not form.is_valid():
+        return form.errors.get_json_data()
+    message = form.save(commit=False)
+    message.group = group
+    message.author = user
+    message.save()  # collaboration.signals publishes it to every socket, this one included
+    return None
+
+
+async def _forward(payloads, send):
+    async for payload in payloads:
+        await send({"type": "websocket.send", "text": json.dumps(payload)})
+
+
+async def websocket_application(scope, receive, send):
+    event = await receive()
+    if event["type"] != "websocket.connect":
+        return
+    match = CHAT_PATH.match(scope["path"])
+    if match is None or not _origin_allowed(scope):
+        await send({"type": "websocket.close", "code": 4403})
+        return
+    user = await sync_to_async(_scope_user)(scope)
+    group = None
+    # TeacherApprovalMiddleware never sees the socket, so its check is repeated here
+    if user.is_authenticated and not await sync_to_async(awaiting_approval)(user):
+        group = await Group.objects.chat_for(user).filter(pk=match["pk"]).afirst()
+    if group is None:
+        await send({"type": "websocket.close", "code": 4403})
+        return
+
+    await send({"type": "websocket.accept"})
+    async with get_broker().subscribe(channel_name(group.pk)) as payloads:
+        forward = asyncio.create_task(_forward(payloads, send))
+        try:
+            while True:
+                event = await receive()
+                if event["type"] == "websocket.disconnect":
+                    break
+                if event["type"] != "websocket.receive":
+                    continue
+                try:
+                    content = json.loads(event.get("text") or "{}").get("content", "")
+                except (ValueError, AttributeError):
+                    content = ""
+                errors = await sync_to_async(_save_message)(user, group, content)
+                if errors:
+                    await send({"type": "websocket.send", "text": json.dumps({"event": "error", "errors": errors})})
+        finally:
+            forward.cancel()
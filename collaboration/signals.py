@@ -0,0 +1,143 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from lrhub.cache import invalidate
+from .models import Group, Message, Post, Comment
+from . import realtime, changes
+
+# --- Group and post deletion ---
+# A group's messages, posts and comments are deleted with it, and a post's
+# comments with the post, one post_delete each. Their receivers below skip the
+# counters, change bumps and live events for rows whose group or post is going
+# too. The marks are kept on the deletion's ``origin`` (the instance or
+# queryset .delete() was called on), so they never outlive that one deletion,
+# even when it is rolled back. Every pre_delete of a cascade is sent before
+# the first post_delete.
+def _mark_deleted(origin, name, pk):
+    if origin is None:
+        return
+    if not hasattr(origin, name):
+        setattr(origin, name, set())
+    getattr(origin, name).add(pk)
+
+
+@receiver(pre_delete, sender=Group)
+def mark_group_deletion(sender, instance, origin=None, **kwargs):
+    _mark_deleted(origin, "_deleted_group_ids", instance.pk)
+
+
+@receiver(pre_delete, sender=Post)
+def mark_post_deletion(sender, instance, origin=None, **kwargs):
+    _mark_deleted(origin, "_deleted_post_ids", instance.pk)
+
+
+def _group_deleted(origin, group_id):
+    return group_id in getattr(origin, "_deleted_group_ids", ())
+
+
+def _post_deleted(origin, post_id):
+    return post_id in getattr(origin, "_deleted_post_ids", ())
+
+
+# --- Cache invalidation (lrhub.cache) ---
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_groups_cache(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate("groups"))
+
+
+# --- Live chat deltas (collaboration.realtime) ---
+@receiver(post_save, sender=Message)
+def publish_message(sender, instance, created, **kwargs):
+    payload = realtime.message_payload(instance, "message" if created else "message_edited")
+    transaction.on_commit(lambda: realtime.publish(instance.group_id, payload))
+
+
+@receiver(post_delete, sender=Message)
+def publish_message_delete(sender, instance, origin=None, **kwargs):
+    if _group_deleted(origin, instance.group_id):
+        return
+    payload = {"event": "message_deleted", "id": instance.pk}
+    transaction.on_commit(lambda: realtime.publish(instance.group_id, payload))
+
+
+# --- Change counters for long-poll / SSE clients (collaboration.changes) ---
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def count_message_change(sender, instance, origin=None, **kwargs):
+    if _group_deleted(origin, instance.group_id):
+        return
+    transaction.on_commit(lambda: changes.bump(instance.group_id, "messages"))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def count_post_change(sender, instance, origin=None, **kwargs):
+    if _group_deleted(origin, instance.group_id):
+        return
+    transaction.on_commit(lambda: changes.bump(instance.group_id, "posts"))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def count_comment_change(sender, instance, origin=None, **kwargs):
+    if _post_deleted(origin, instance.post_id):
+        return  # the post's own post_delete bumps "posts"
+    group_id = instance.post.group_id
+    transaction.on_commit(lambda: changes.bump(group_id, "comments"))
+
+
+# --- Stored group counters (Group.member_count/post_count/message_count/last_activity_at) ---
+def _group(group_id):
+    return Group.objects.filter(pk=group_id)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_save, sender=Post)
+def count_group_item_on_save(sender, instance, created, **kwargs):
+    if created:
+        field = "message_count" if sender is Message else "post_count"
+        _group(instance.group_id).record_activity(at=instance.created_at, **{field: 1})
+
+
+@receiver(post_delete, sender=Message)
+@receiver(post_delete, sender=Post)
+def count_group_item_on_delete(sender, instance, origin=None, **kwargs):
+    if _group_deleted(origin, instance.group_id):
+        return
+    field = "message_count" if sender is Message else "post_count"
+    _group(instance.group_id).record_activity(**{field: -1})
+
+
+@receiver(post_save, sender=Comment)
+def record_comment_activity(sender, instance, created, **kwargs):
+    if created:
+        _group(instance.post.group_id).record_activity(at=instance.created_at)
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def count_members(sender, instance, action, reverse, pk_set, **kwargs):
+    # forward: group.members.add(user); reverse: user.collaboration_groups.add(group)
+    if action == "pre_clear" and reverse:
+        instance._cleared_group_ids = list(instance.collaboration_groups.values_list("pk", flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        groups = _group(instance.pk)
+    elif action == "post_clear":
+        groups = Group.objects.filter(pk__in=getattr(instance, "_cleared_group_ids", []))
+    else:
+        groups = Group.objects.filter(pk__in=pk_set)
+    groups.refresh_member_count()
+
+
+@receiver(pre_delete, sender=User)
+def remember_user_groups(sender, instance, **kwargs):
+    # memberships go with the user through a cascade that sends no m2m_changed
+    instance._member_group_ids = list(instance.collaboration_groups.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=User)
+def count_members_on_user_delete(sender, instance, **kwargs):
+    Group.objects.filter(pk__in=getattr(instance, "_member_group_ids", [])).refresh_member_count()
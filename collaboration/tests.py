@@ -1,3 +1,324 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Profile
+
+from . import changes
+from .models import ChatClear, Comment, Group, Message, Post
+from .realtime import RedisBroker, websocket_application
+
+
+class LiveChatTests(TestCase):
+    """Chat deltas reach the open sockets of the group without a page reload."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.carol = User.objects.create_user("carol", password="pw")
+        cls.group = Group.objects.create(name="Algebra", created_by=cls.alice)
+        cls.group.members.add(cls.alice, cls.bob)
+        cls.path = f"/ws/collaboration/group/{cls.group.pk}/chat/"
+
+    def session_cookie(self, user):
+        client = Client()
+        client.force_login(user)
+        return f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    async def connect(self, cookie=None):
+        inbound, outbound = asyncio.Queue(), asyncio.Queue()
+        scope = {"type": "websocket", "path": self.path, "headers": [(b"cookie", cookie.encode())] if cookie else []}
+        task = asyncio.create_task(websocket_application(scope, inbound.get, outbound.put))
+        await inbound.put({"type": "websocket.connect"})
+        return inbound, outbound, task
+
+    async def saved(self, content):
+        while not await Message.objects.filter(group=self.group, content=content).aexists():
+            await asyncio.sleep(0.01)
+
+    async def test_anonymous_socket_is_refused(self):
+        _, outbound, task = await self.connect()
+        self.assertEqual((await outbound.get())["type"], "websocket.close")
+        await task
+
+    async def test_non_member_socket_is_refused(self):
+        carol_cookie = await sync_to_async(self.session_cookie)(self.carol)
+        _, outbound, task = await self.connect(carol_cookie)
+        self.assertEqual(await outbound.get(), {"type": "websocket.close", "code": 4403})
+        await task
+
+    async def test_unapproved_teacher_socket_is_refused(self):
+        await Profile.objects.filter(user=self.bob).aupdate(role="teacher", approved=False)
+        bob_cookie = await sync_to_async(self.session_cookie)(self.bob)
+        _, outbound, task = await self.connect(bob_cookie)
+        self.assertEqual(await outbound.get(), {"type": "websocket.close", "code": 4403})
+        await task
+
+    def test_chat_pages_follow_the_socket_rule(self):
+        self.client.force_login(self.carol)
+        for name in ("chat_view", "chat_messages"):
+            self.assertEqual(self.client.get(reverse(name, args=[self.group.pk])).status_code, 404, name)
+        self.client.force_login(self.bob)
+        for name in ("chat_view", "chat_messages"):
+            self.assertEqual(self.client.get(reverse(name, args=[self.group.pk])).status_code, 200, name)
+
+    @override_settings(REDIS_URL="redis://localhost:6379/0")
+    def test_redis_broker_can_be_constructed(self):
+        broker = RedisBroker()  # connects lazily, on the first publish / subscribe
+        self.assertEqual(broker.url, "redis://localhost:6379/0")
+
+    async def test_message_is_fanned_out(self):
+        alice_cookie = await sync_to_async(self.session_cookie)(self.alice)
+        bob_cookie = await sync_to_async(self.session_cookie)(self.bob)
+        alice_in, alice_out, alice_task = await self.connect(alice_cookie)
+        _, bob_out, bob_task = await self.connect(bob_cookie)
+        self.assertEqual((await alice_out.get())["type"], "websocket.accept")
+        self.assertEqual((await bob_out.get())["type"], "websocket.accept")
+
+        # the socket saves on the main thread's connection; run its on_commit publish there too
+        capture = self.captureOnCommitCallbacks(execute=True)
+        await sync_to_async(capture.__enter__)()
+        await alice_in.put({"type": "websocket.receive", "text": json.dumps({"content": "hello"})})
+        await asyncio.wait_for(self.saved("hello"), 2)
+        await sync_to_async(capture.__exit__)(None, None, None)
+        delta = json.loads((await asyncio.wait_for(bob_out.get(), 1))["text"])
+        self.assertEqual((delta["event"], delta["author"], delta["content"]), ("message", "alice", "hello"))
+
+        await alice_in.put({"type": "websocket.disconnect"})
+        await alice_task
+        bob_task.cancel()
+
+
+class ChatHistoryTests(TestCase):
+    """Chat history comes in bounded keyset pages and stops at the user's clear point."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("carol", password="pw")
+        cls.group = Group.objects.create(name="History", created_by=cls.user)
+        cls.group.members.add(cls.user)
+        start = timezone.now() - timedelta(hours=1)
+        for i in range(7):
+            message = Message.objects.create(group=cls.group, author=cls.user, content=f"m{i}")
+            Message.objects.filter(pk=message.pk).update(created_at=start + timedelta(minutes=i))
+        cls.url = reverse("chat_messages", args=[cls.group.pk])
+
+    def contents(self, response):
+        return [m["content"] for m in response.json()["messages"]]
+
+    @override_settings(CHAT_PAGE_SIZE=3)
+    def test_pages_back_and_forward(self):
+        self.client.force_login(self.user)
+        latest = self.client.get(self.url).json()
+        self.assertEqual([m["content"] for m in latest["messages"]], ["m4", "m5", "m6"])
+
+        older = self.client.get(self.url, {"before": latest["older_cursor"]})
+        self.assertEqual(self.contents(older), ["m1", "m2", "m3"])
+        oldest = self.client.get(self.url, {"before": older.json()["older_cursor"]})
+        self.assertEqual(self.contents(oldest), ["m0"])
+        self.assertIsNone(oldest.json()["older_cursor"])
+
+        newer = self.client.get(self.url, {"after": oldest.json()["messages"][0]["cursor"]})
+        self.assertEqual(self.contents(newer), ["m1", "m2", "m3"])
+        self.assertIsNotNone(newer.json()["newer_cursor"])
+
+    def test_cleared_messages_stay_hidden(self):
+        self.client.force_login(self.user)
+        cleared_at = Message.objects.get(content="m4").created_at
+        ChatClear.objects.create(user=self.user, group=self.group)
+        ChatClear.objects.filter(user=self.user).update(cleared_at=cleared_at)
+        self.assertEqual(self.contents(self.client.get(self.url)), ["m5", "m6"])
+        response = self.client.get(reverse("chat_view", args=[self.group.pk]))
+        self.assertEqual([m.content for m in response.context["chat_messages"]], ["m5", "m6"])
+
+
+@override_settings(COLLAB_UPDATES_TIMEOUT=0.2, COLLAB_UPDATES_INTERVAL=0.05)
+class GroupUpdatesTests(TestCase):
+    """Long-poll / SSE clients learn about new rows from the change counters alone."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("dave", password="pw")
+        cls.group = Group.objects.create(name="Updates", created_by=cls.user)
+        cls.url = reverse("group_updates", args=[cls.group.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_long_poll(self):
+        versions = self.client.get(self.url).json()["versions"]
+        idle = self.client.get(self.url, versions).json()
+        self.assertEqual(idle["changed"], [])  # held until the timeout, nothing new
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(group=self.group, author=self.user, title="New", content="...")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, versions).json()
+        for table in ("collaboration_message", "collaboration_post", "collaboration_comment"):
+            self.assertFalse(any(table in q["sql"] for q in queries.captured_queries))
+        self.assertEqual(response["changed"], ["posts"])
+        self.assertEqual(response["versions"]["posts"], versions["posts"] + 1)
+
+    @override_settings(COLLAB_SSE_MAX_SECONDS=0.1)
+    async def test_event_stream_resumes_from_last_event_id(self):
+        await sync_to_async(changes.bump)(self.group.pk, "messages")
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            self.url, headers={"Accept": "text/event-stream", "Last-Event-ID": "0.0.0"},
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertIn("id: 1.0.0\nevent: changes", body)
+        self.assertIn('"changed": ["messages"]', body)
+
+
+class GroupCountersTests(TestCase):
+    """Stored counters follow writes; collaboration_home costs the same queries for any number of groups."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.group = Group.objects.create(name="Algebra", created_by=cls.alice)
+        cls.group.members.add(cls.alice, cls.bob)
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(group=self.group, author=self.alice, title="Hi", content="x")
+        Message.objects.create(group=self.group, author=self.bob, content="hello")
+        Message.objects.create(group=self.group, author=self.bob, content="again").delete()
+        comment = Comment.objects.create(post=post, author=self.bob, content="+1")
+        self.bob.collaboration_groups.remove(self.group)
+        group = Group.objects.get(pk=self.group.pk)
+        self.assertEqual((group.member_count, group.post_count, group.message_count), (1, 1, 1))
+        self.assertEqual(group.last_activity_at, comment.created_at)
+
+        Group.objects.update(member_count=0, post_count=0, message_count=0)
+        Group.objects.all().refresh_counters()
+        group.refresh_from_db()
+        self.assertEqual((group.member_count, group.post_count, group.message_count), (1, 1, 1))
+
+    def test_unread_counts_reset_when_read(self):
+        Post.objects.create(group=self.group, author=self.alice, title="Hi", content="x")
+        Message.objects.create(group=self.group, author=self.alice, content="hello")
+        Message.objects.create(group=self.group, author=self.bob, content="mine")
+        group = Group.objects.with_unread(self.bob).get(pk=self.group.pk)
+        self.assertEqual((group.is_member, group.unread_posts, group.unread_messages), (True, 1, 1))
+
+        self.client.force_login(self.bob)
+        self.client.get(reverse("chat_view", args=[self.group.pk]))
+        group = Group.objects.with_unread(self.bob).get(pk=self.group.pk)
+        self.assertEqual((group.unread_posts, group.unread_messages), (1, 0))
+
+    def test_home_query_count_is_flat(self):
+        self.client.force_login(self.bob)
+
+        def home_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("collaboration_home"))
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        baseline = home_queries()
+        for i in range(30):
+            group = Group.objects.create(name=f"Group {i}", created_by=self.alice)
+            group.members.add(self.alice, self.bob)
+            Post.objects.create(group=group, author=self.alice, title="Hi", content="x")
+        self.assertEqual(home_queries(), baseline)
+
+        with override_settings(COLLAB_GROUPS_PAGE_SIZE=10):
+            first = self.client.get(reverse("collaboration_home"))
+            self.assertEqual(len(first.context["groups"]), 10)
+            self.assertEqual(first.context["groups"][0].unread_posts, 1)
+            second = self.client.get(reverse("collaboration_home"), {"cursor": first.context["next_cursor"]})
+            self.assertFalse({g.pk for g in first.context["groups"]} & {g.pk for g in second.context["groups"]})
+
+    def test_group_delete_skips_per_item_work(self):
+        def delete_group(items):
+            group = Group.objects.create(name=f"Doomed {items}", created_by=self.alice)
+            for i in range(items):
+                post = Post.objects.create(group=group, author=self.alice, title="Hi", content="x")
+                Comment.objects.create(post=post, author=self.bob, content="+1")
+                Message.objects.create(group=group, author=self.bob, content="hello")
+            with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as queries:
+                group.delete()
+            return len(queries), len(callbacks)
+
+        self.assertEqual(delete_group(1), delete_group(10))
+
+        def delete_post(comments):
+            post = Post.objects.create(group=self.group, author=self.alice, title="Hi", content="x")
+            for i in range(comments):
+                Comment.objects.create(post=post, author=self.bob, content="+1")
+            with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as queries:
+                post.delete()
+            return len(queries), len(callbacks)
+
+        self.assertEqual(delete_post(1), delete_post(10))
+        message = Message.objects.create(group=self.group, author=self.bob, content="kept")
+        message.delete()  # a plain delete still counts
+        self.assertEqual(Group.objects.get(pk=self.group.pk).message_count, 0)
+
+
+@override_settings(COLLAB_POSTS_PAGE_SIZE=5, COLLAB_COMMENTS_PAGE_SIZE=5)
+class DetailPagesTests(TestCase):
+    """group_detail and post_detail render a bounded page in the same number of queries however busy."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.group = Group.objects.create(name="Algebra", created_by=cls.alice)
+        cls.post = Post.objects.create(group=cls.group, author=cls.alice, title="Hi", content="x")
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+
+    def add_rows(self, count):
+        for i in range(count):
+            author = User.objects.create_user(f"user{Post.objects.count()}-{i}")
+            Post.objects.create(group=self.group, author=author, title=f"Post {i}", content="x")
+            Comment.objects.create(post=self.post, author=author, content=f"Comment {i}")
+
+    def queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_is_flat(self):
+        group_url = reverse("group_detail", args=[self.group.pk])
+        post_url = reverse("post_detail", args=[self.post.pk])
+        self.add_rows(1)
+        self.queries(group_url)  # the first visit also creates the read cursor
+        group_queries, _ = self.queries(group_url)
+        post_queries, _ = self.queries(post_url)
+        self.add_rows(12)
+        self.assertEqual(self.queries(group_url)[0], group_queries)
+        self.assertEqual(self.queries(post_url)[0], post_queries)
+
+    def test_pages_and_comment_counts(self):
+        self.add_rows(7)
+        _, first = self.queries(reverse("group_detail", args=[self.group.pk]))
+        posts = first.context["posts"]
+        self.assertEqual(len(posts), 5)
+        _, second = self.queries(reverse("group_detail", args=[self.group.pk]), cursor=first.context["next_cursor"])
+        older = second.context["posts"]
+        self.assertEqual(len(older), 3)
+        self.assertIsNone(second.context["next_cursor"])
+        self.assertEqual(older[-1].pk, self.post.pk)
+        self.assertEqual(older[-1].comment_count, 7)
+
+        _, response = self.queries(reverse("post_detail", args=[self.post.pk]))
+        self.assertEqual(response.context["post"].comment_count, 7)
+        self.assertEqual(len(response.context["comments"]), 5)
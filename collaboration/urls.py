@@ -19,6 +19,8 @@ urlpatterns = [
 
     path("create/", views.create_group, name="create_group"),
     path("group/<int:pk>/chat/", views.chat_view, name="chat_view"),
+    path("group/<int:pk>/chat/messages/", views.chat_messages, name="chat_messages"),
+    path("group/<int:pk>/updates/", views.group_updates, name="group_updates"),
     path("group/<int:pk>/chat/clear/", views.clear_my_chat_view, name="clear_my_chat"),
 
 
@@ -1,22 +1,38 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import json
+import time
+
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
-from .models import Group, Post, Comment, Message, ChatClear
+from .models import Group, GroupReadCursor, Post, Comment, Message, ChatClear
 from .forms import GroupForm, PostForm, CommentForm, MessageForm
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.utils import timezone
+from .history import history_page, encode_cursor
+from .listing import group_page, post_page, comment_page, with_comment_count
+from .realtime import message_payload
+from . import changes
 
 
 def collaboration_home(request):
-    """Show all collaboration groups."""
+    """Show collaboration groups, most recently active first, with unread counts for the user's groups."""
     groups = Group.objects.all()
-    return render(request, "collaboration/collaboration_home.html", {"groups": groups})
+    if request.user.is_authenticated:
+        groups = groups.with_unread(request.user)
+    cursor = request.GET.get("cursor")
+    groups, next_cursor = group_page(groups, cursor)
+    return render(request, "collaboration/collaboration_home.html", {
+        "groups": groups,
+        "cursor": cursor,
+        "next_cursor": next_cursor,
+    })
 
 
 @login_required
 def group_detail(request, pk):
-    """Show a single group with its posts and allow new post creation."""
-    group = get_object_or_404(Group, pk=pk)
-    posts = group.posts.all()
+    """Show a single group with a page of its posts and allow new post creation."""
+    group = get_object_or_404(Group.objects.select_related("created_by"), pk=pk)
 
     if request.method == "POST":
         post_form = PostForm(request.POST)
@@ -28,10 +44,15 @@ def group_detail(request, pk):
             return redirect("group_detail", pk=group.pk)
     else:
         post_form = PostForm()
+        GroupReadCursor.mark_read(request.user, group, "posts_read_at")
 
+    cursor = request.GET.get("cursor")
+    posts, next_cursor = post_page(group, cursor)
     return render(request, "collaboration/group_detail.html", {
         "group": group,
         "posts": posts,
+        "cursor": cursor,
+        "next_cursor": next_cursor,
         "post_form": post_form,
     })
 
@@ -54,9 +75,8 @@ def create_group(request):
 
 @login_required
 def post_detail(request, pk):
-    """Show a single post with its comments and allow new comment creation."""
-    post = get_object_or_404(Post, pk=pk)
-    comments = post.comments.all()
+    """Show a single post with a page of its comments and allow new comment creation."""
+    post = get_object_or_404(with_comment_count(Post.objects.select_related("author", "group")), pk=pk)
 
     if request.method == "POST":
         comment_form = CommentForm(request.POST)
@@ -69,22 +89,19 @@ def post_detail(request, pk):
     else:
         comment_form = CommentForm()
 
+    cursor = request.GET.get("cursor")
+    comments, next_cursor = comment_page(post, cursor)
     return render(request, "collaboration/post_detail.html", {
         "post": post,
         "comments": comments,
+        "cursor": cursor,
+        "next_cursor": next_cursor,
         "comment_form": comment_form,
     })
 
 @login_required
 def chat_view(request, pk):
-    group = get_object_or_404(Group, pk=pk)
-
-    # check if user has cleared before
-    clear_record = ChatClear.objects.filter(user=request.user, group=group).first()
-    if clear_record:
-        chat_messages = group.messages.filter(created_at__gt=clear_record.cleared_at).order_by("created_at")
-    else:
-        chat_messages = group.messages.order_by("created_at")
+    group = get_object_or_404(Group.objects.chat_for(request.user), pk=pk)
 
     if request.method == "POST":
         form = MessageForm(request.POST)
@@ -96,13 +113,79 @@ def chat_view(request, pk):
             return redirect("chat_view", pk=group.pk)  # redirect back to chat after sending
     else:
         form = MessageForm()
+        GroupReadCursor.mark_read(request.user, group, "messages_read_at")
 
+    # only the latest page (after the user's clear point); older history loads on scroll
+    chat_messages, older_cursor, _ = history_page(request.user, group)
     return render(request, "collaboration/chat.html", {
         "group": group,
         "chat_messages": chat_messages,
+        "older_cursor": older_cursor,
+        "newest_cursor": encode_cursor(chat_messages[-1]) if chat_messages else None,
         "form": form,
     })
 
+
+@login_required
+def chat_messages(request, pk):
+    """JSON page of chat history: ?before=<cursor> for older, ?after=<cursor> for newer."""
+    group = get_object_or_404(Group.objects.chat_for(request.user), pk=pk)
+    messages, older, newer = history_page(
+        request.user, group, before=request.GET.get("before"), after=request.GET.get("after"),
+    )
+    return JsonResponse({
+        "messages": [message_payload(m) for m in messages],
+        "older_cursor": older,
+        "newer_cursor": newer,
+    })
+
+@login_required
+async def group_updates(request, pk):
+    """
+    Change notifications for a group, for pages without a WebSocket.
+
+    Long-poll (default): ``?messages=&posts=&comments=`` are the counters the
+    client last saw. The response comes back as soon as one of them moves, or
+    empty after COLLAB_UPDATES_TIMEOUT, as ``{"versions": {...}, "changed": [...]}``.
+    With ``Accept: text/event-stream`` it is an SSE stream of "changes" events
+    instead; their ids let EventSource resume from Last-Event-ID.
+    """
+    group = await aget_object_or_404(Group, pk=pk)
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        since = changes.parse_versions(request.headers.get("Last-Event-ID")) or await changes.aversions(group.pk)
+        response = StreamingHttpResponse(_update_events(group.pk, since), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+        return response
+
+    since = {}
+    for kind in changes.KINDS:
+        try:
+            since[kind] = int(request.GET[kind])
+        except (KeyError, ValueError):
+            since = None  # no (valid) counters: answer with the current ones right away
+            break
+    if since is None:
+        current, changed = await changes.aversions(group.pk), []
+    else:
+        current, changed = await changes.wait_for_change(group.pk, since)
+    return JsonResponse({"versions": current, "changed": changed})
+
+
+async def _update_events(group_id, since):
+    yield "retry: 3000\n\n"
+    # end the stream now and then so a worker isn't held forever; EventSource reconnects
+    deadline = time.monotonic() + getattr(settings, "COLLAB_SSE_MAX_SECONDS", 300)
+    while time.monotonic() < deadline:
+        current, changed = await changes.wait_for_change(group_id, since)
+        if changed:
+            data = json.dumps({"versions": current, "changed": changed})
+            yield f"id: {changes.format_versions(current)}\nevent: changes\ndata: {data}\n\n"
+            since = current
+        else:
+            yield ": keep-alive\n\n"
+
+
 # --- GROUPS ---
 @login_required
 def edit_group(request, pk):
@@ -3,6 +3,12 @@ ASGI config for lrhub project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+This is the deployment entry point (see Procfile): gunicorn runs it with the
+uvicorn worker class, so the async views (analysis, summaries, search) can
+await many slow PDF downloads on one worker while the CPU work runs in
+lrhub.cpu_pool. lrhub.wsgi still works, with one request per worker thread.
+WebSocket connections (live group chat) go to collaboration.realtime.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -13,4 +19,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lrhub.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from collaboration.realtime import websocket_application  # noqa: E402  (needs the app registry)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
+
+# ✅ Start the CPU pool processes (lrhub.cpu_pool) before the first request
+from lrhub import cpu_pool  # noqa: E402
+
+cpu_pool.warm()
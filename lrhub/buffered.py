@@ -0,0 +1,96 @@
+"""
+Per-process write buffers shared by the apps (analytics.buffer, resources.counters).
+
+A BufferedWriter collects items and hands them to its ``write`` function in
+batches. A batch is written when the buffer holds ``<prefix>_FLUSH_SIZE`` items,
+when a timer fires ``<prefix>_FLUSH_INTERVAL`` seconds after the first
+unwritten item (also checked by ``flush_if_due`` at request end), and at
+interpreter exit.
+
+Items join the buffer only when the surrounding transaction commits, so
+rolled-back work is never written. ``write`` removes from the batch list the
+items it has written. If it raises (database down, lost connection), the
+items still in the list go back to the front of the buffer, the error is
+logged, and the next flush retries them.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    def __init__(self, name, write, prefix, size=100, interval=5):
+        self.name = name
+        self._write = write
+        self._size = (f"{prefix}_FLUSH_SIZE", size)
+        self._interval = (f"{prefix}_FLUSH_INTERVAL", interval)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def _setting(self, name_default):
+        return getattr(settings, *name_default)
+
+    def add(self, item):
+        transaction.on_commit(lambda: self._add(item))
+
+    def _add(self, item):
+        with self._lock:
+            self._pending.append(item)
+            full = len(self._pending) >= self._setting(self._size)
+            if not full:
+                self._schedule_flush()
+        if full:
+            self.flush()
+
+    def flush_if_due(self):
+        """Flush when the buffer is full or the flush interval has passed."""
+        with self._lock:
+            due = self._pending and (
+                len(self._pending) >= self._setting(self._size)
+                or time.monotonic() - self._last_flush >= self._setting(self._interval)
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write every buffered item; failures are kept for the next flush."""
+        with self._lock:
+            batch = self._pending[:]
+            self._pending.clear()
+            self._last_flush = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not batch:
+            return
+        try:
+            self._write(batch)
+        except Exception:
+            logger.exception("Could not write %d buffered %s; will retry", len(batch), self.name)
+            with self._lock:
+                self._pending[:0] = batch
+                self._schedule_flush()
+
+    def _schedule_flush(self):
+        # caller holds self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(self._setting(self._interval), self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            connections.close_all()  # connections opened by this timer thread
@@ -0,0 +1,64 @@
+"""
+Keyed caching helpers shared by the apps.
+
+Every cached value belongs to one or more namespaces ("documents", "ratings",
+"recommendations", "groups", "profiles"). Each namespace has a version number
+stored in the cache and baked into the keys. Model signals call
+``invalidate(namespace)`` after commit, which bumps the version, so every key
+built from the old version stops being read at once. Nothing has to be
+deleted, and a write is never followed by a stale read.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _timeout(timeout):
+    return timeout if timeout is not None else getattr(settings, "CACHE_DEFAULT_TIMEOUT", 300)
+
+
+def _version(namespace):
+    key = f"ns:{namespace}"
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def namespace_versions(namespaces):
+    """Current versions of ``namespaces`` as one string, e.g. "documents3.ratings7";
+    it changes whenever one of them is invalidated."""
+    return ".".join(f"{ns}{_version(ns)}" for ns in namespaces)
+
+
+def cache_key(namespaces, *parts):
+    """Key for ``parts`` under the current version of every namespace."""
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f"lrhub:{namespace_versions(namespaces)}:{digest}"
+
+
+def cached(namespaces, parts, builder, timeout=None):
+    """Return the cached value for ``parts`` or build, store and return it."""
+    key = cache_key(namespaces, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, _timeout(timeout))
+    return value
+
+
+def cached_queryset(namespaces, parts, queryset, timeout=None):
+    """Evaluate a queryset once and cache the resulting list of instances."""
+    return cached(namespaces, parts, lambda: list(queryset), timeout)
+
+
+def invalidate(*namespaces):
+    """Make every key built under these namespaces unreachable."""
+    for namespace in namespaces:
+        key = f"ns:{namespace}"
+        try:
+            cache.incr(key)
+        except ValueError:  # not set yet (or evicted)
+            cache.set(key, 2, timeout=None)
@@ -0,0 +1,215 @@
+"""
+Process pool for CPU-bound work done inside a request.
+
+TF-IDF scoring and summarization hold the GIL, so running them inline (or on a
+``sync_to_async`` thread) stalls everything else the web worker is doing.
+``run`` sends the call to one of CPU_POOL_WORKERS worker processes and waits at
+most CPU_POOL_TIMEOUT seconds for the result (waiting for a free worker
+included), raising CPUTimeout otherwise.
+
+Every worker has its own pipe, and a call holds its worker until it returns.
+A call that overruns (or whose request went away) therefore costs exactly one
+process. That worker is killed and replaced, while calls running in the other
+workers carry on untouched. concurrent.futures.ProcessPoolExecutor cannot do
+this, because it treats the death of any worker as the whole pool being broken.
+
+Each web worker process owns one pool. ``warm`` (called from wsgi.py / asgi.py)
+starts its processes and imports the NLP stack in them before the first
+request. With CPU_POOL_WORKERS = 0 calls run inline.
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import django
+from django.conf import settings
+
+POLL_SLICE = 0.05   # seconds between cancellation checks while waiting
+
+_lock = threading.Lock()
+_pool = None
+_owner_pid = None   # process that created _pool
+
+
+class CPUTimeout(Exception):
+    """Raised when a pooled call did not finish within its timeout."""
+
+
+class CPUWorkerLost(Exception):
+    """Raised when the worker running a call died (e.g. killed for memory)."""
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def pool_size():
+    return getattr(settings, "CPU_POOL_WORKERS", 2)
+
+
+def _init_worker():
+    django.setup()
+    import resources.utils  # noqa: F401  (sklearn / numpy imported once, not on the first task)
+
+
+def _worker_main(conn):
+    _init_worker()
+    while True:
+        try:
+            func, args, kwargs = conn.recv()
+        except (EOFError, OSError):  # pool closed our pipe
+            return
+        try:
+            reply = (True, func(*args, **kwargs))
+        except Exception as exc:
+            reply = (False, exc)
+        try:
+            conn.send(reply)
+        except Exception as exc:  # result not picklable
+            conn.send((False, RuntimeError(f"{func.__name__} returned an unpicklable result: {exc}")))
+
+
+def _ping():
+    return os.getpid()
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.tasks = 0
+
+    def stop(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class Pool:
+    def __init__(self, size, max_tasks_per_child=None):
+        self.max_tasks_per_child = max_tasks_per_child
+        self._context = multiprocessing.get_context("spawn")  # no inherited threads / DB sockets
+        self._idle = queue.Queue()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(_Worker(self._context))
+
+    def _checkout(self, deadline, cancelled):
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                raise _Cancelled
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise queue.Empty
+            try:
+                return self._idle.get(timeout=min(remaining, POLL_SLICE) if cancelled else remaining)
+            except queue.Empty:
+                continue
+
+    def _await_reply(self, worker, deadline, cancelled):
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                raise _Cancelled
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if worker.conn.poll(min(remaining, POLL_SLICE) if cancelled else remaining):
+                return True
+
+    def _replace(self, worker):
+        worker.stop()
+        if not self._closed:
+            self._idle.put(_Worker(self._context))
+
+    def _release(self, worker):
+        worker.tasks += 1
+        if self.max_tasks_per_child and worker.tasks >= self.max_tasks_per_child:
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+
+    def run(self, func, args=(), kwargs=None, timeout=30, cancelled=None):
+        """Run ``func`` in a free worker. Setting the ``cancelled`` event abandons the call."""
+        deadline = time.monotonic() + timeout
+        name = getattr(func, "__name__", repr(func))
+        try:
+            worker = self._checkout(deadline, cancelled)
+        except queue.Empty:
+            raise CPUTimeout(f"no worker became free for {name} within {timeout}s") from None
+        try:
+            worker.conn.send((func, args, kwargs or {}))
+            if not self._await_reply(worker, deadline, cancelled):
+                raise CPUTimeout(f"{name} did not finish within {timeout}s")
+            ok, value = worker.conn.recv()
+        except (EOFError, OSError):
+            self._replace(worker)
+            raise CPUWorkerLost(f"the worker running {name} died") from None
+        except BaseException:  # overdue, cancelled, or arguments not picklable
+            self._replace(worker)
+            raise
+        self._release(worker)
+        if not ok:
+            raise value
+        return value
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+def get_pool():
+    global _pool, _owner_pid
+    with _lock:
+        # a pool inherited through fork (gunicorn --preload) has no processes in the child
+        if _pool is None or _owner_pid != os.getpid():
+            _pool = Pool(pool_size(), getattr(settings, "CPU_POOL_MAX_TASKS_PER_CHILD", None))
+            _owner_pid = os.getpid()
+        return _pool
+
+
+def warm():
+    """Start every pool process now instead of on the first request."""
+    if pool_size() <= 0:
+        return
+    pool = get_pool()
+    for _ in range(pool_size()):  # workers are handed out in turn, so each one runs a ping
+        pool.run(_ping, timeout=120)
+
+
+def _timeout(timeout):
+    return getattr(settings, "CPU_POOL_TIMEOUT", 30) if timeout is None else timeout
+
+
+def run(func, *args, timeout=None, **kwargs):
+    """Call ``func(*args, **kwargs)`` in the pool and return its result.
+    ``func`` and its arguments must be picklable (module-level functions, plain data)."""
+    if pool_size() <= 0:
+        return func(*args, **kwargs)
+    return get_pool().run(func, args, kwargs, timeout=_timeout(timeout))
+
+
+async def run_async(func, *args, timeout=None, **kwargs):
+    """``run`` for async code: waits on a thread, so the event loop keeps serving.
+    If the awaiting task is cancelled (client went away), the worker is freed at once."""
+    if pool_size() <= 0:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    pool = get_pool()
+    cancelled = threading.Event()
+    call = asyncio.ensure_future(
+        asyncio.to_thread(pool.run, func, args, kwargs, timeout=_timeout(timeout), cancelled=cancelled)
+    )
+    try:
+        return await asyncio.shield(call)
+    except asyncio.CancelledError:
+        cancelled.set()  # the thread kills and replaces the worker within POLL_SLICE
+        call.add_done_callback(lambda done: done.cancelled() or done.exception())  # retrieve, not log, the _Cancelled
+        raise
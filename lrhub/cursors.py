@@ -0,0 +1,32 @@
+"""
+Opaque cursors for the keyset-paginated listings (collaboration.listing,
+collaboration.history, resources.pagination).
+
+A cursor is the url-safe base64 of ``<part>|<part>|...``: the sort key of the
+edge row of a page, e.g. a timestamp (ISO format) or a search rank first and
+usually the id last. Clients only ever hand it back, so a garbled or tampered
+cursor decodes to None and the listing starts from its first page.
+"""
+import base64
+from datetime import datetime
+
+parse_stamp = datetime.fromisoformat  # converter for timestamp parts
+
+
+def encode_cursor(*parts):
+    raw = "|".join(part.isoformat() if isinstance(part, datetime) else str(part) for part in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, *converters):
+    """Return the parts, each passed through its converter (e.g. ``parse_stamp``, ``int``),
+    or None for a missing/garbled cursor."""
+    if not cursor:
+        return None
+    try:
+        parts = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if len(parts) != len(converters):
+            return None
+        return tuple(convert(part) for convert, part in zip(converters, parts))
+    except (ValueError, KeyError, UnicodeDecodeError):
+        return None
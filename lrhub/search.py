@@ -0,0 +1,208 @@
+"""
+Full-text search over notes, student resources and users.
+
+``search(query, kinds=..., limit=...)`` is the one entry point the views use.
+It returns ``{kind: queryset}``, each filtered to the rows matching every word
+of the query and ordered best match first (annotated ``search_rank``).
+
+The match runs against a database-native index, created by the migrations
+through ``install_index``:
+
+* PostgreSQL: a stored, generated ``search_vector`` tsvector column with a GIN
+  index, ranked with ``ts_rank``.
+* SQLite: an external-content FTS5 table, ``<table>_fts``. Triggers keep it in
+  sync, so ``.update()`` and raw writes are covered as well as ``save()``.
+  The FTS table is joined on ``rowid`` and ranked with ``bm25``.
+
+Any other backend, or a SQLite build without FTS5, falls back to the old
+``icontains`` OR-chain, so search keeps working without the index.
+"""
+import re
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# kind -> model, indexed columns with their weight (A ranks above B), text search config
+INDEXES = {
+    "note": {
+        "model": "resources.Note",
+        "fields": {"title": "A", "topic": "B"},
+        "config": "english",
+    },
+    "resource": {
+        "model": "resources.StudentResource",
+        "fields": {"title": "A", "description": "B"},
+        "config": "english",
+    },
+    "user": {
+        "model": "auth.User",
+        "fields": {"username": "A", "email": "B"},
+        "config": "simple",
+    },
+}
+
+BM25_WEIGHTS = {"A": 10.0, "B": 1.0}
+
+_available = {}  # table -> bool, whether the index exists on this database
+
+
+def _terms(query):
+    return re.findall(r"\w+", query or "")
+
+
+# --- Index installation (migrations, and post_migrate to repair) ---
+def install_index(schema_editor, kind, table):
+    """Create the index for ``kind`` on ``table``; a no-op when it is already complete."""
+    spec = INDEXES[kind]
+    vendor = schema_editor.connection.vendor
+    fields = spec["fields"]
+
+    if vendor == "postgresql":
+        vector = " || ".join(
+            f"setweight(to_tsvector('{spec['config']}', coalesce({col}, '')), '{weight}')"
+            for col, weight in fields.items()
+        )
+        schema_editor.execute(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({vector}) STORED"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} USING GIN (search_vector)"
+        )
+
+    elif vendor == "sqlite":
+        fts, cols = f"{table}_fts", ", ".join(fields)
+        new = ", ".join(f"new.{c}" for c in fields)
+        old = ", ".join(f"old.{c}" for c in fields)
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f"{fts}_a_"],
+            )
+            if cursor.fetchone()[0] == 3:
+                return
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', "
+                f"content_rowid='id', tokenize='porter unicode61')"
+            )
+        except Exception:  # SQLite built without FTS5: search() falls back to icontains
+            return
+        # SQLite drops triggers when a later migration rebuilds the table, so
+        # post_migrate lands here again and re-creates them and the content
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+        )
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    _available.pop(table, None)
+
+
+def uninstall_index(schema_editor, kind, table):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_search_idx")
+        schema_editor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+    elif vendor == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+    _available.pop(table, None)
+
+
+def repair_indexes(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver: re-wire FTS5 tables whose triggers a table rebuild dropped,
+    then record which indexes exist so the first search does not have to look."""
+    connection = connections[using]
+    tables = [apps.get_model(spec["model"])._meta.db_table for spec in INDEXES.values()]
+    if connection.vendor == "sqlite":  # generated columns survive ALTER TABLE, triggers do not
+        existing = set(connection.introspection.table_names())
+        with connection.schema_editor() as schema_editor:
+            for kind, table in zip(INDEXES, tables):
+                if f"{table}_fts" in existing:  # only where the migration installed it
+                    install_index(schema_editor, kind, table)
+    if using == DEFAULT_DB_ALIAS:  # _has_index reads the default connection
+        for table in tables:
+            _available.pop(table, None)
+            _has_index(table)
+
+
+def _has_index(table):
+    if table not in _available:
+        if connection.vendor == "sqlite":
+            _available[table] = f"{table}_fts" in connection.introspection.table_names()
+        elif connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                columns = connection.introspection.get_table_description(cursor, table)
+            _available[table] = any(col.name == "search_vector" for col in columns)
+        else:
+            _available[table] = False
+    return _available[table]
+
+
+# --- Query ---
+def _matching(kind, terms):
+    """Queryset of ``kind`` rows matching all ``terms``, annotated with ``search_rank``."""
+    spec = INDEXES[kind]
+    model = apps.get_model(spec["model"])
+    table = model._meta.db_table
+
+    if _has_index(table) and connection.vendor == "postgresql":
+        tsquery = " & ".join(f"{t}:*" for t in terms)
+        cfg = spec["config"]
+        return model.objects.filter(
+            pk__in=RawSQL(f"SELECT id FROM {table} WHERE search_vector @@ to_tsquery(%s, %s)", [cfg, tsquery])
+        ).annotate(search_rank=RawSQL(
+            f"ts_rank({table}.search_vector, to_tsquery(%s, %s))", [cfg, tsquery], output_field=FloatField()
+        ))
+
+    if _has_index(table) and connection.vendor == "sqlite":
+        fts = f"{table}_fts"
+        match = " AND ".join(f'"{t}"*' for t in terms)
+        weights = ", ".join(str(BM25_WEIGHTS[w]) for w in spec["fields"].values())
+        # one join against the FTS table: the MATCH filters rows and bm25 ranks them
+        # in the same scan (ORM joins need a model, hence extra())
+        return model.objects.extra(
+            tables=[fts], where=[f"{fts}.rowid = {table}.id", f"{fts} MATCH %s"], params=[match],
+        ).annotate(search_rank=RawSQL(
+            # bm25 is lower-is-better; negate it so every backend sorts by -search_rank
+            f"-bm25({fts}, {weights})", [], output_field=FloatField(),
+        ))
+
+    condition = Q()
+    for term in terms:
+        any_field = Q()
+        for field in spec["fields"]:
+            any_field |= Q(**{f"{field}__icontains": term})
+        condition &= any_field
+    return model.objects.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def search(query, kinds=("note", "resource"), limit=None):
+    """
+    Return ``{kind: queryset}`` of the rows matching every word in ``query``, best first.
+
+    With ``limit`` each queryset is sliced to its top ``limit`` rows. Without it
+    the querysets stay chainable (filter, annotate, re-order, paginate).
+    """
+    terms = _terms(query)
+    results = {}
+    for kind in kinds:
+        if not terms:
+            model = apps.get_model(INDEXES[kind]["model"])
+            results[kind] = model.objects.none()
+            continue
+        qs = _matching(kind, terms).order_by("-search_rank", "-pk")
+        results[kind] = qs[:limit] if limit else qs
+    return results
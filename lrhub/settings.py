@@ -46,6 +46,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "accounts.middleware.TeacherApprovalMiddleware",
+    "analytics.middleware.ActivityLogFlushMiddleware",
 ]
 
 ROOT_URLCONF = "lrhub.urls"
@@ -84,6 +85,35 @@ else:
         }
     }
 
+# --- Cache ---
+# lrhub.cache invalidates by bumping namespace versions in the cache, so every
+# worker must read the same cache. REDIS_URL shares it across workers and hosts,
+# CACHE_DIR (default <BASE_DIR>/.cache) across the workers of one host. Local
+# memory, which each process keeps to itself, is only used with DEBUG=True.
+REDIS_URL = os.environ.get("REDIS_URL")   # also used by collaboration.realtime.RedisBroker
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+elif DEBUG and not os.environ.get("CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "lrhub",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_DIR", str(BASE_DIR / ".cache")),
+        }
+    }
+CACHE_DEFAULT_TIMEOUT = 300   # seconds, for lrhub.cache helpers
+
 AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
 ]
@@ -122,3 +152,76 @@ CSRF_COOKIE_DOMAIN = None
 # --- Email ---
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 PASSWORD_RESET_TIMEOUT = 86400
+
+# --- Search index (resources.search_index) ---
+SEARCH_INDEX_PATH = Path(os.environ.get("SEARCH_INDEX_PATH", BASE_DIR / "search_index.joblib"))
+SEARCH_INDEX_REFIT_RATIO = 0.2   # refit vocabulary once 20% of rows were patched in place
+SEARCH_INDEX_UPDATE_TIMEOUT = 120   # seconds a patch/refit may take in the CPU pool
+
+# --- Background jobs (manage.py run_jobs) ---
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))   # process pool size
+JOB_POLL_INTERVAL = 5                                  # seconds between empty polls
+JOB_MAX_ATTEMPTS = 3
+JOB_LEASE_SECONDS = 900    # a job still "running" after this is taken back from a crashed worker
+
+# --- Download counters (resources.counters) ---
+DOWNLOAD_COUNTER_BUFFERED = os.environ.get("DOWNLOAD_COUNTER_BUFFERED", "False") == "True"
+DOWNLOAD_COUNTER_FLUSH_SIZE = 50        # flush once this many increments are buffered
+DOWNLOAD_COUNTER_FLUSH_INTERVAL = 10    # ...or this many seconds after the first one
+
+# --- Activity log buffering (analytics.buffer) ---
+ACTIVITY_LOG_BUFFERED = os.environ.get("ACTIVITY_LOG_BUFFERED", "False") == "True"   # set True on busy deployments
+ACTIVITY_LOG_FLUSH_SIZE = 100       # bulk_create once this many entries are buffered
+ACTIVITY_LOG_FLUSH_INTERVAL = 5     # ...or this many seconds after the last flush
+ACTIVITY_LOG_RETENTION_DAYS = int(os.environ.get("ACTIVITY_LOG_RETENTION_DAYS", 90))   # older rows -> daily rollups (manage.py prune_activity)
+
+# --- Global analytics snapshot (analytics.rollups) ---
+
+# --- Resource listings (resources.pagination) ---
+RESOURCES_PAGE_SIZE = int(os.environ.get("RESOURCES_PAGE_SIZE", 20))
+
+# --- Batch relevance model (resources.relevance) ---
+RELEVANCE_MODEL_PATH = Path(os.environ.get("RELEVANCE_MODEL_PATH", BASE_DIR / "relevance_model.joblib"))
+RELEVANCE_REFIT_RATIO = 0.2   # run_jobs refits the vocabulary once 20% of the shards changed since the fit
+
+# --- PDF extraction budgets (resources.utils) ---
+PDF_SPOOL_MAX_MEMORY = 8 * 1024 * 1024   # downloads larger than this spool to a temp file
+PDF_PAGE_BUDGET = int(os.environ.get("PDF_PAGE_BUDGET", 150))        # pages an on-request scan may parse
+PDF_TIME_BUDGET = float(os.environ.get("PDF_TIME_BUDGET", 15))       # seconds an on-request scan may take
+RELEVANCE_CONFIDENT_SCORE = 60   # stop scanning once a page scores at least this (0-100)
+
+# --- PDF parser backends (resources.extraction) ---
+# Explicit order, e.g. "pypdfium2,pdfplumber"; empty = fastest first from the last saved benchmark
+PDF_BACKENDS = [b for b in os.environ.get("PDF_BACKENDS", "").split(",") if b]
+PDF_BENCHMARK_DIR = Path(os.environ.get("PDF_BENCHMARK_DIR", BASE_DIR / "benchmarks" / "pdfs"))
+PDF_BENCHMARK_RESULTS = Path(os.environ.get("PDF_BENCHMARK_RESULTS", BASE_DIR / "pdf_benchmark.json"))
+
+# --- CPU pool for request-time NLP (lrhub.cpu_pool) ---
+CPU_POOL_WORKERS = int(os.environ.get("CPU_POOL_WORKERS", 2))       # processes per web worker; 0 = run inline
+CPU_POOL_TIMEOUT = float(os.environ.get("CPU_POOL_TIMEOUT", 30))     # seconds before a call is cancelled
+CPU_POOL_MAX_TASKS_PER_CHILD = 200   # replace a pool process after this many calls (bounds memory growth)
+
+# --- File downloads from Cloudinary (resources.fetch) ---
+FETCH_CONNECT_TIMEOUT = 5                                             # seconds
+FETCH_READ_TIMEOUT = float(os.environ.get("FETCH_READ_TIMEOUT", 30))  # seconds without a byte
+FETCH_RETRIES = 3                    # connection errors and 429/5xx answers
+FETCH_BACKOFF = 0.5                  # seconds, doubled per retry
+FETCH_MAX_CONNECTIONS_PER_HOST = 10  # keep-alive pool size; extra fetches wait for a free socket
+FETCH_MAX_BYTES = int(os.environ.get("FETCH_MAX_BYTES", 100 * 1024 * 1024))
+
+# --- Live chat fan-out (collaboration.realtime) ---
+# LocalBroker only reaches sockets on the same worker; use RedisBroker (REDIS_URL) with several workers
+CHAT_BROKER = os.environ.get("CHAT_BROKER", "collaboration.realtime.LocalBroker")
+
+# --- Chat history pages (collaboration.history) ---
+CHAT_PAGE_SIZE = int(os.environ.get("CHAT_PAGE_SIZE", 50))
+
+# --- Group change notifications for long-poll / SSE (collaboration.changes) ---
+COLLAB_UPDATES_TIMEOUT = 25      # seconds a long-poll is held before an empty answer
+COLLAB_UPDATES_INTERVAL = 1.0    # seconds between counter reads while holding
+COLLAB_SSE_MAX_SECONDS = 300     # an SSE stream ends after this; the browser reconnects
+
+# --- Collaboration listing pages: groups, posts, comments (collaboration.listing) ---
+COLLAB_GROUPS_PAGE_SIZE = int(os.environ.get("COLLAB_GROUPS_PAGE_SIZE", 12))
+COLLAB_POSTS_PAGE_SIZE = int(os.environ.get("COLLAB_POSTS_PAGE_SIZE", 20))
+COLLAB_COMMENTS_PAGE_SIZE = int(os.environ.get("COLLAB_COMMENTS_PAGE_SIZE", 50))
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lrhub.settings')
 
 application = get_wsgi_application()
+
+# ✅ Start the CPU pool processes (lrhub.cpu_pool) before the first request
+from lrhub import cpu_pool  # noqa: E402
+
+cpu_pool.warm()
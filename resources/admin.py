@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Note, StudentResource, Rating, Recommendation
+from .models import Note, StudentResource, Rating, Recommendation, ExtractedText, ProcessingJob, ContentShard, Summary
 
 class RatingInline(admin.TabularInline):
     model = Rating
@@ -29,3 +29,23 @@ class RatingAdmin(admin.ModelAdmin):
 class RecommendationAdmin(admin.ModelAdmin):
     list_display = ('user', 'note', 'resource', 'comment', 'created_at')
     search_fields = ('user__username', 'comment')
+
+@admin.register(ExtractedText)
+class ExtractedTextAdmin(admin.ModelAdmin):
+    list_display = ('public_id', 'file_version', 'content_hash', 'created_at')
+    search_fields = ('public_id', 'content_hash')
+
+@admin.register(Summary)
+class SummaryAdmin(admin.ModelAdmin):
+    list_display = ('entry', 'length', 'updated_at')
+    list_filter = ('length',)
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'note', 'resource', 'attempts', 'updated_at')
+    list_filter = ('kind', 'status')
+
+@admin.register(ContentShard)
+class ContentShardAdmin(admin.ModelAdmin):
+    list_display = ('note', 'resource', 'token_count', 'updated_at')
+    exclude = ('sentences', 'postings')
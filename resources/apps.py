@@ -5,3 +5,6 @@ class ResourcesConfig(AppConfig):
 
     def ready(self):
         import resources.signals   # 👈 ensures signals are registered
+        from django.db.models.signals import post_migrate
+        from lrhub.search import repair_indexes
+        post_migrate.connect(repair_indexes, sender=self)   # 👈 keeps SQLite FTS triggers in place
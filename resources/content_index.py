@@ -0,0 +1,173 @@
+"""
+Corpus-wide inverted index over extracted PDF text.
+
+Each document has one ContentShard. The shard stores sentence offsets into
+``ExtractedText.pages`` and positional postings (``term -> [[sentence,
+position], ...]``). ContentTerm rows (term, shard, tf) form the global term
+dictionary.
+
+A query works like this:
+1. One indexed lookup on ContentTerm finds the candidate documents.
+2. BM25 ranks them.
+3. Only the top-k shards are loaded, and their postings pick the best
+   sentences. A sentence scores higher when it contains more of the query
+   terms, and higher again when those terms appear next to each other in
+   order.
+
+Nothing is downloaded or re-parsed at query time.
+
+Shards are built by the ``content`` job, which is queued after extraction
+(see resources.jobs).
+"""
+import math
+import re
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Avg, Case, Count, FloatField, Sum, Value, When
+from django.db.models.functions import Cast
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+from resources.models import Note, ContentShard, ContentTerm
+
+_TOKEN = re.compile(r"\w+")
+_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")  # same sentence split as relevance_score
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PHRASE_BONUS = 0.5  # per pair of query terms that appear adjacent and in order
+
+
+def tokenize(text):
+    """Lower-cased index terms in ``text`` (stop words and 1-char tokens dropped)."""
+    return [
+        t for t in (m.group().lower() for m in _TOKEN.finditer(text))
+        if len(t) > 1 and t not in ENGLISH_STOP_WORDS and len(t) <= 64
+    ]
+
+
+def _sentence_spans(text):
+    start = 0
+    for m in _BOUNDARY.finditer(text):
+        if m.start() > start:
+            yield start, m.start()
+        start = m.end()
+    if start < len(text):
+        yield start, len(text)
+
+
+# --- Build (pure, runs in the job process pool) ---
+def build_postings(pages):
+    """Return (sentences, postings, token_count) for a document's page texts."""
+    sentences, postings = [], defaultdict(list)
+    position = 0
+    for page_no, text in enumerate(pages):
+        for start, end in _sentence_spans(text or ""):
+            tokens = tokenize(text[start:end])
+            if not tokens:
+                continue
+            sentence = len(sentences)
+            sentences.append([page_no, start, end])
+            for token in tokens:
+                postings[token].append([sentence, position])
+                position += 1
+    return sentences, dict(postings), position
+
+
+# --- Store ---
+def _document_fields(obj):
+    return {"note": obj} if isinstance(obj, Note) else {"resource": obj}
+
+
+@transaction.atomic
+def store_shard(obj, entry, built):
+    """Replace ``obj``'s shard and term rows with freshly built postings."""
+    sentences, postings, token_count = built
+    fields = _document_fields(obj)
+    ContentShard.objects.filter(**fields).delete()
+    shard = ContentShard.objects.create(
+        entry=entry, sentences=sentences, postings=postings, token_count=token_count, **fields
+    )
+    ContentTerm.objects.bulk_create(
+        [ContentTerm(shard=shard, term=term, tf=len(hits)) for term, hits in postings.items()],
+        batch_size=1000,
+    )
+    return shard
+
+
+# --- Query ---
+def _bm25(terms, limit):
+    """Top ``limit`` (shard_id, score) pairs for ``terms``."""
+    stats = ContentShard.objects.aggregate(n=Count("id"), avgdl=Avg("token_count"))
+    total, avgdl = stats["n"], stats["avgdl"] or 1
+    if not total:
+        return [], {}
+
+    df = dict(
+        ContentTerm.objects.filter(term__in=terms)
+        .values_list("term").annotate(n=Count("id")).order_by()
+    )
+    idf = {t: math.log(1 + (total - n + 0.5) / (n + 0.5)) for t, n in df.items()}
+
+    # summed per shard in SQL, so only the top ``limit`` rows leave the database
+    tf = Cast("tf", FloatField())
+    length = Cast("shard__token_count", FloatField())
+    term_idf = Case(*[When(term=t, then=Value(w)) for t, w in idf.items()], output_field=FloatField())
+    norm = Value(BM25_K1 * (1 - BM25_B)) + Value(BM25_K1 * BM25_B / avgdl) * length
+    top = (
+        ContentTerm.objects.filter(term__in=df)
+        .values("shard_id")
+        .annotate(score=Sum(term_idf * tf * Value(BM25_K1 + 1) / (tf + norm)))
+        .order_by("-score", "shard_id")[:limit]
+    )
+    return [(row["shard_id"], row["score"]) for row in top], idf
+
+
+def best_sentences(shard, terms, idf, count=3, max_words=40):
+    """The ``count`` best-matching sentences of a shard, with their offsets."""
+    by_sentence = defaultdict(list)  # sentence -> [(position, term)]
+    for term in terms:
+        for sentence, position in shard.postings.get(term, ()):
+            by_sentence[sentence].append((position, term))
+
+    order = {t: i for i, t in enumerate(terms)}
+    ranked = []
+    for sentence, occurrences in by_sentence.items():
+        score = sum(idf.get(t, 0) for t in {t for _, t in occurrences})
+        occurrences.sort()
+        for (p1, t1), (p2, t2) in zip(occurrences, occurrences[1:]):
+            if p2 == p1 + 1 and order[t2] == order[t1] + 1:
+                score += PHRASE_BONUS
+        ranked.append((score, sentence))
+    ranked.sort(key=lambda pair: (-pair[0], pair[1]))
+
+    pages = shard.entry.pages
+    matches = []
+    for score, sentence in ranked[:count]:
+        page, start, end = shard.sentences[sentence]
+        words = pages[page][start:end].split()
+        text = " ".join(words[:max_words]) + ("..." if len(words) > max_words else "")
+        matches.append({"page": page + 1, "start": start, "end": end, "text": text, "score": round(score, 3)})
+    return matches
+
+
+def search_content(query, limit=10, snippets=3):
+    """
+    Rank every indexed document's body text against ``query``.
+    Returns [(document, score, matches)] best first.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    top, idf = _bm25(terms, limit)
+    shards = ContentShard.objects.select_related(
+        "entry", "note__uploaded_by", "resource__uploaded_by"
+    ).in_bulk([shard_id for shard_id, _ in top])
+
+    results = []
+    for shard_id, score in top:
+        shard = shards.get(shard_id)
+        if shard is None or shard.document is None:
+            continue
+        results.append((shard.document, round(score, 3), best_sentences(shard, terms, idf, snippets)))
+    return results
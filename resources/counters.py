@@ -0,0 +1,50 @@
+"""
+Download counters for Note / StudentResource.
+
+By default every download is a single ``UPDATE ... SET downloads = downloads + 1``
+so concurrent downloads never lose increments. With DOWNLOAD_COUNTER_BUFFERED
+the increments are collected per worker by an lrhub.buffered.BufferedWriter
+and written in batches (on size, after a short delay, and at interpreter exit).
+A batch sends one UPDATE per document, so a burst on one popular file does
+not queue up on that row's lock.
+
+``.update()`` sends no signal, so both paths bump the "documents" cache
+namespace themselves (after commit, and once per written batch) so cached
+listings show the new counts.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from lrhub.buffered import BufferedWriter
+from lrhub.cache import invalidate
+
+
+def _write(batch):
+    totals = Counter()
+    for model, pk, amount in batch:
+        totals[(model, pk)] += amount
+    written = False
+    try:
+        for (model, pk), amount in totals.items():
+            model.objects.filter(pk=pk).update(downloads=F("downloads") + amount)
+            batch[:] = [item for item in batch if item[:2] != (model, pk)]
+            written = True
+    finally:
+        if written:  # also when a later document failed and is retried
+            invalidate("documents")
+
+
+_writer = BufferedWriter("download counts", _write, "DOWNLOAD_COUNTER", size=50, interval=10)
+flush = _writer.flush
+
+
+def increment_downloads(obj, amount=1):
+    """Count ``amount`` downloads of a Note / StudentResource."""
+    if not getattr(settings, "DOWNLOAD_COUNTER_BUFFERED", False):
+        type(obj).objects.filter(pk=obj.pk).update(downloads=F("downloads") + amount)
+        transaction.on_commit(lambda: invalidate("documents"))
+        return
+    _writer.add((type(obj), obj.pk, amount))
@@ -0,0 +1,218 @@
+"""
+PDF text extraction with pluggable parser backends.
+
+Every backend is a generator ``backend(file, start) -> page loaders``,
+registered in BACKENDS: it yields one zero-argument callable per page that
+parses and returns that page's text. ``iter_pages`` checks its page and time
+budget before calling a loader, so it never parses a page it will not use,
+and it knows whether a page was left over. It tries the backends in
+``backend_order()``. If a backend fails, the next one picks up at the page
+where it stopped. Pages already yielded are never parsed twice, and a file
+that one parser chokes on still comes out.
+
+The order is the PDF_BACKENDS setting when it is set. Otherwise it is the
+fastest first, according to the last ``manage.py benchmark_pdf_backends
+--save`` run. Without either it falls back to DEFAULT_ORDER.
+"""
+import json
+import os
+import time
+from io import BytesIO
+
+from django.conf import settings
+
+BACKENDS = {}
+DEFAULT_ORDER = ("pdfplumber", "pypdfium2", "pypdf2")
+
+
+class ExtractionError(Exception):
+    """Raised when every backend failed on a file."""
+
+
+def register(name):
+    def decorator(func):
+        BACKENDS[name] = func
+        return func
+    return decorator
+
+
+# --- Backends (optional imports: a missing library just leaves its backend out) ---
+try:
+    import pdfplumber
+except ImportError:  # pragma: no cover
+    pdfplumber = None
+else:
+    @register("pdfplumber")
+    def _pdfplumber_pages(file, start=0):
+        with pdfplumber.open(file) as pdf:
+            for page in pdf.pages[start:]:
+                try:
+                    yield lambda: page.extract_text() or ""
+                finally:
+                    page.close()  # drop the parsed layout objects before the next page
+
+try:
+    import pypdfium2
+except ImportError:  # pragma: no cover
+    pypdfium2 = None
+else:
+    @register("pypdfium2")
+    def _pdfium_pages(file, start=0):
+        pdf = pypdfium2.PdfDocument(file)
+        try:
+            for index in range(start, len(pdf)):
+                page = pdf[index]
+                textpages = []
+
+                def load():
+                    textpages.append(page.get_textpage())
+                    return textpages[0].get_text_range().replace("\r\n", "\n")
+                try:
+                    yield load
+                finally:
+                    for textpage in textpages:
+                        textpage.close()
+                    page.close()
+        finally:
+            pdf.close()
+
+try:
+    import PyPDF2
+except ImportError:  # pragma: no cover
+    PyPDF2 = None
+else:
+    @register("pypdf2")
+    def _pypdf2_pages(file, start=0):
+        reader = PyPDF2.PdfReader(file)
+        for page in reader.pages[start:]:
+            yield lambda: page.extract_text() or ""
+
+
+# --- Selection ---
+def benchmark_path():
+    return str(getattr(settings, "PDF_BENCHMARK_RESULTS", settings.BASE_DIR / "pdf_benchmark.json"))
+
+
+def backend_order():
+    """Backends to try, best first."""
+    configured = getattr(settings, "PDF_BACKENDS", None)
+    if configured:
+        return [name for name in configured if name in BACKENDS]
+    try:
+        with open(benchmark_path()) as fh:
+            speed = {name: r["pages_per_sec"] for name, r in json.load(fh).items() if r.get("ok")}
+    except (OSError, ValueError):
+        speed = {}
+    known = [name for name in DEFAULT_ORDER if name in BACKENDS]
+    return sorted(known, key=lambda name: -speed.get(name, 0)) if speed else known
+
+
+# --- Extraction ---
+class PageIterator:
+    """The page texts of one file. ``truncated`` turns True when the page or time
+    budget stopped the iteration while the file still had pages left."""
+
+    def __init__(self, source, max_pages, time_budget, backends):
+        self.truncated = False
+        self._pages = self._iterate(source, max_pages, time_budget, backends)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._pages)
+
+    def close(self):
+        self._pages.close()
+
+    def _iterate(self, source, max_pages, time_budget, backends):
+        if isinstance(source, (bytes, bytearray)):
+            source = BytesIO(source)
+        deadline = time.monotonic() + time_budget if time_budget else None
+        done, errors = 0, []
+
+        for name in backends or backend_order():
+            if hasattr(source, "seek"):
+                source.seek(0)
+            pages = BACKENDS[name](source, start=done)
+            try:
+                for load in pages:
+                    # checked before parsing: a page over budget is never loaded
+                    if (max_pages is not None and done >= max_pages) or (
+                        deadline is not None and time.monotonic() > deadline
+                    ):
+                        self.truncated = True
+                        return
+                    yield load()
+                    done += 1
+                return
+            except GeneratorExit:
+                raise
+            except Exception as exc:  # parser failure: fall through to the next backend
+                errors.append(f"{name}: {exc}")
+            finally:
+                pages.close()
+        raise ExtractionError("; ".join(errors) or "no PDF backend available")
+
+
+def iter_pages(source, max_pages=None, time_budget=None, backends=None):
+    """
+    Iterate over the text of each page ("" for pages without text) as it is parsed.
+
+    ``source`` is bytes, a path or a seekable binary file. Stops after
+    ``max_pages`` pages or once ``time_budget`` seconds have passed, setting
+    ``truncated`` on the returned PageIterator if pages were left. Raises
+    ExtractionError if every backend fails.
+    """
+    return PageIterator(source, max_pages, time_budget, backends)
+
+
+def extract_pages(source, **kwargs):
+    return list(iter_pages(source, **kwargs))
+
+
+# --- Benchmark ---
+def benchmark(paths, backends=None, repeat=1):
+    """
+    Parse every file with each backend.
+    Returns {backend: {"pages", "seconds", "pages_per_sec", "peak_kib", "ok", "errors"}}.
+    ``peak_kib`` is the peak Python heap (tracemalloc) while parsing; native allocations
+    inside a C parser are not included.
+    """
+    import tracemalloc
+
+    results = {}
+    for name in backends or list(BACKENDS):
+        pages = seconds = peak = 0
+        errors = []
+        for _ in range(repeat):
+            for path in paths:
+                tracemalloc.start()
+                started = time.perf_counter()
+                try:
+                    with open(path, "rb") as fh:
+                        for load in BACKENDS[name](fh):
+                            load()
+                            pages += 1
+                except Exception as exc:
+                    errors.append(f"{os.path.basename(path)}: {exc}")
+                seconds += time.perf_counter() - started
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        results[name] = {
+            "pages": pages,
+            "seconds": round(seconds, 4),
+            "pages_per_sec": round(pages / seconds, 2) if seconds else 0.0,
+            "peak_kib": round(peak / 1024, 1),
+            "ok": not errors,
+            "errors": errors,
+        }
+    return results
+
+
+def save_benchmark(results):
+    path = benchmark_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump(results, fh, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,180 @@
+"""
+Outbound HTTP for file downloads (the Cloudinary-hosted PDFs).
+
+Fetches go through one keep-alive connection pool per process (a
+requests.Session, for sync code and CPU-pool workers) or per event loop (an
+httpx.AsyncClient, for async views). Repeated analyses therefore reuse the
+TLS connection to the origin instead of handshaking again. Every fetch has
+connect/read timeouts, retries connection errors and 429/5xx answers with
+exponential backoff, refuses bodies over FETCH_MAX_BYTES and streams into a
+temp file while hashing it.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager, asynccontextmanager
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CHUNK_SIZE = 64 * 1024
+
+_lock = threading.Lock()
+_sessions = {}                                # (pid, pool config) -> requests.Session
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> (pool config, httpx.AsyncClient)
+
+
+class FetchError(IOError):
+    """Raised when a download is larger than FETCH_MAX_BYTES."""
+
+
+def timeouts():
+    """(connect, read) seconds."""
+    return getattr(settings, "FETCH_CONNECT_TIMEOUT", 5), getattr(settings, "FETCH_READ_TIMEOUT", 30)
+
+
+def _pool_config():
+    return (
+        getattr(settings, "FETCH_RETRIES", 3),
+        getattr(settings, "FETCH_BACKOFF", 0.5),
+        getattr(settings, "FETCH_MAX_CONNECTIONS_PER_HOST", 10),
+    )
+
+
+def get_session():
+    """The process's pooled Session (pool processes and forked workers build their own)."""
+    config = _pool_config()
+    key = (os.getpid(), config)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            retries, backoff, per_host = config
+            retry = Retry(
+                total=retries,
+                backoff_factor=backoff,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset({"GET", "HEAD"}),
+                raise_on_status=False,  # hand back the last error response instead of raising
+            )
+            # pool_block: a host never gets more than per_host sockets; extra fetches wait for one
+            adapter = HTTPAdapter(pool_maxsize=per_host, pool_block=True, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions.clear()  # settings changed or we are in a new process
+            _sessions[key] = session
+        return session
+
+
+def _async_client():
+    loop = asyncio.get_running_loop()
+    config = _pool_config()
+    cached = _async_clients.get(loop)
+    if cached is None or cached[0] != config:
+        per_host = config[2]
+        # httpx limits are per client; every download goes to the same file host
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=per_host, max_keepalive_connections=per_host),
+            transport=httpx.AsyncHTTPTransport(retries=config[0]),  # connect errors only
+            follow_redirects=True,
+        )
+        cached = _async_clients[loop] = (config, client)
+    return cached[1]
+
+
+# --- Body handling ---
+def max_bytes():
+    return getattr(settings, "FETCH_MAX_BYTES", 100 * 1024 * 1024)
+
+
+def _check_length(url, headers):
+    length = headers.get("Content-Length")
+    if length and length.isdigit() and int(length) > max_bytes():
+        raise FetchError(f"{url} is {length} bytes, over the {max_bytes()} byte limit")
+
+
+def _spool(named):
+    if named:
+        return tempfile.NamedTemporaryFile(suffix=".pdf")
+    return tempfile.SpooledTemporaryFile(max_size=getattr(settings, "PDF_SPOOL_MAX_MEMORY", 8 * 1024 * 1024))
+
+
+class _Sink:
+    """Writes chunks to ``file`` while hashing them and enforcing the size cap."""
+
+    def __init__(self, url, file):
+        self.url, self.file = url, file
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.limit = max_bytes()
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.limit:
+            raise FetchError(f"{self.url} is over the {self.limit} byte limit")
+        self.digest.update(chunk)
+        self.file.write(chunk)
+
+    def done(self):
+        self.file.flush()
+        self.file.seek(0)
+        return self.file, self.digest.hexdigest()
+
+
+# --- Downloads ---
+@contextmanager
+def download(url, named=False):
+    """
+    Stream ``url`` into a temp file (in memory up to PDF_SPOOL_MAX_MEMORY, or on disk
+    with a ``.name`` that another process can open when ``named``).
+    Yields (file, sha256 hexdigest), or None if the origin answered with an error.
+    Raises FetchError over FETCH_MAX_BYTES and requests exceptions once retries run out.
+    """
+    with get_session().get(url, stream=True, timeout=timeouts()) as response:
+        if response.status_code != 200:
+            yield None
+            return
+        _check_length(url, response.headers)
+        with _spool(named) as file:
+            sink = _Sink(url, file)
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                sink.write(chunk)
+            yield sink.done()
+
+
+async def _send_async(url):
+    client = _async_client()
+    retries, backoff, _ = _pool_config()
+    connect, read = timeouts()
+    request = client.build_request("GET", url, timeout=httpx.Timeout(read, connect=connect))
+    for attempt in range(retries + 1):
+        response = await client.send(request, stream=True)
+        if response.status_code not in RETRY_STATUSES or attempt == retries:
+            return response
+        await response.aclose()
+        await asyncio.sleep(backoff * 2 ** attempt)
+
+
+@asynccontextmanager
+async def download_async(url):
+    """``download`` for async code, always into a named temp file (its path can go to the CPU pool)."""
+    response = await _send_async(url)
+    try:
+        if response.status_code != 200:
+            yield None
+            return
+        _check_length(url, response.headers)
+        with _spool(named=True) as file:
+            sink = _Sink(url, file)
+            async for chunk in response.aiter_bytes(chunk_size=CHUNK_SIZE):
+                sink.write(chunk)
+            yield sink.done()
+    finally:
+        await response.aclose()
@@ -0,0 +1,139 @@
+"""
+DB-backed job queue for uploaded documents.
+
+Uploads enqueue an ``extract`` job; a finished extraction queues
+``summarize`` and ``content`` (the document's content index shard).
+``manage.py run_jobs`` claims pending rows and runs the download/parse/
+summarize/postings work in a process pool, so web workers never block on
+pdfplumber. A job left ``running`` by a worker that crashed is claimed again
+once its lease (JOB_LEASE_SECONDS since it was claimed) has expired.
+"""
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from resources.models import Note, ExtractedText, ProcessingJob, Summary
+from resources import content_index
+from resources.utils import (
+    document_file, download_and_extract, store_extracted_text, build_summaries, store_summaries,
+    SUMMARY_LENGTHS,
+)
+
+
+def _document_fields(obj):
+    return {"note": obj} if isinstance(obj, Note) else {"resource": obj}
+
+
+def enqueue(obj, *kinds):
+    """Queue jobs for a document, skipping kinds that are already pending."""
+    fields = _document_fields(obj)
+    pending = set(
+        ProcessingJob.objects.filter(status="pending", **fields).values_list("kind", flat=True)
+    )
+    ProcessingJob.objects.bulk_create([
+        ProcessingJob(kind=kind, **fields) for kind in kinds if kind not in pending
+    ])
+
+
+def _claimable():
+    """Pending jobs, and running jobs whose worker has held them past the lease."""
+    expired = timezone.now() - timedelta(seconds=getattr(settings, "JOB_LEASE_SECONDS", 900))
+    return Q(status="pending") | Q(status="running", updated_at__lt=expired)
+
+
+def claim(limit):
+    """Mark up to ``limit`` claimable jobs as running and return them.
+    The conditional UPDATE makes claiming safe with several workers."""
+    claimed = []
+    max_attempts = getattr(settings, "JOB_MAX_ATTEMPTS", 3)
+    candidates = ProcessingJob.objects.filter(_claimable()).select_related("note", "resource")[:limit]
+    for job in candidates:
+        same_claim = ProcessingJob.objects.filter(_claimable(), pk=job.pk, updated_at=job.updated_at)
+        if job.status == "running" and job.attempts >= max_attempts:
+            # its worker died on every attempt (e.g. killed for memory); stop retrying
+            same_claim.update(status="failed", error="Worker lease expired", updated_at=timezone.now())
+            continue
+        updated = same_claim.update(
+            status="running", attempts=job.attempts + 1, updated_at=timezone.now()
+        )
+        if updated:
+            job.status, job.attempts = "running", job.attempts + 1
+            claimed.append(job)
+    return claimed
+
+
+# --- Process-pool tasks (no DB access) ---
+def extract_task(url):
+    extracted = download_and_extract(url)
+    if extracted is None:
+        raise IOError(f"Could not fetch {url}")
+    return extracted
+
+
+def summarize_task(text):
+    return build_summaries(text)
+
+
+def content_task(pages):
+    return content_index.build_postings(pages)
+
+
+# --- Job handlers: prepare() runs in the worker command, finish() stores the result ---
+def prepare(job):
+    """Return (callable, args) to run in the pool, or None if the job needs no CPU work."""
+    obj = job.document
+    if job.kind == "extract":
+        if ExtractedText.objects.filter(**_file_key(obj)).exists():
+            return None
+        return extract_task, (document_file(obj).url,)
+    if job.kind == "summarize":
+        entry = ExtractedText.objects.filter(**_file_key(obj)).first()
+        if entry is None or not entry.text:
+            return None
+        if Summary.objects.filter(entry=entry).count() == len(SUMMARY_LENGTHS):
+            return None
+        return summarize_task, (entry.text,)
+    if job.kind == "content":
+        entry = ExtractedText.objects.filter(**_file_key(obj)).first()
+        if entry is None or not entry.text:
+            return None
+        return content_task, (entry.pages,)
+    return None
+
+
+def finish(job, result=None):
+    obj = job.document
+    if job.kind == "extract":
+        if result is not None:
+            store_extracted_text(document_file(obj), *result)
+        enqueue(obj, "summarize", "content")
+    elif job.kind == "summarize":
+        if result is not None:
+            store_summaries(ExtractedText.objects.get(**_file_key(obj)), result)
+    elif job.kind == "content":
+        if result is not None:
+            entry = ExtractedText.objects.get(**_file_key(obj))
+            content_index.store_shard(obj, entry, result)
+    job.status, job.error = "done", ""
+    job.save(update_fields=["status", "error", "updated_at"])
+
+
+def fail(job, exc):
+    max_attempts = getattr(settings, "JOB_MAX_ATTEMPTS", 3)
+    job.status = "pending" if job.attempts < max_attempts else "failed"
+    job.error = "".join(traceback.format_exception(exc))[-2000:]
+    job.save(update_fields=["status", "error", "updated_at"])
+
+
+def _file_key(obj):
+    file = document_file(obj)
+    return {"public_id": file.public_id, "file_version": str(file.version or "")}
+
+
+def document_status(obj):
+    """Latest job status per kind for a document, e.g. {"extract": "done", ...}."""
+    jobs = ProcessingJob.objects.filter(**_document_fields(obj)).order_by("created_at")
+    return {job.kind: job.status for job in jobs}
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from resources.models import Note, StudentResource
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored rating_count / rating_sum / rating_avg columns from the Rating table."
+
+    def handle(self, *args, **options):
+        notes = Note.objects.all().refresh_rating_aggregates()
+        resources = StudentResource.objects.all().refresh_rating_aggregates()
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed rating aggregates for {notes} notes and {resources} resources"
+        ))
@@ -0,0 +1,49 @@
+import glob
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from resources import extraction
+
+
+class Command(BaseCommand):
+    help = "Benchmark every PDF parser backend on local sample PDFs (pages/sec and peak memory)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*",
+                            help="PDF files or directories (default: PDF_BENCHMARK_DIR).")
+        parser.add_argument("--backend", action="append", dest="backends", choices=sorted(extraction.BACKENDS),
+                            help="Only benchmark this backend (repeatable).")
+        parser.add_argument("--repeat", type=int, default=1,
+                            help="Parse the corpus this many times per backend.")
+        parser.add_argument("--save", action="store_true",
+                            help="Store the results so extraction picks the fastest working backend.")
+
+    def handle(self, *args, **options):
+        paths = []
+        for path in options["paths"] or [str(getattr(settings, "PDF_BENCHMARK_DIR", ""))]:
+            if os.path.isdir(path):
+                paths.extend(sorted(glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True)))
+            elif os.path.isfile(path):
+                paths.append(path)
+        if not paths:
+            raise CommandError("No sample PDFs found; pass files/directories or set PDF_BENCHMARK_DIR.")
+
+        results = extraction.benchmark(paths, options["backends"], options["repeat"])
+
+        self.stdout.write(f"{len(paths)} files x {options['repeat']} run(s)")
+        self.stdout.write(f"{'backend':<12}{'pages':>8}{'seconds':>10}{'pages/sec':>12}{'peak KiB':>11}  status")
+        for name, r in sorted(results.items(), key=lambda item: -item[1]["pages_per_sec"]):
+            status = "ok" if r["ok"] else f"{len(r['errors'])} failed"
+            self.stdout.write(
+                f"{name:<12}{r['pages']:>8}{r['seconds']:>10.3f}{r['pages_per_sec']:>12.1f}{r['peak_kib']:>11.1f}  {status}"
+            )
+            for error in r["errors"][:3]:
+                self.stdout.write(f"    {error}")
+
+        if options["save"]:
+            extraction.save_benchmark(results)
+            self.stdout.write(self.style.SUCCESS(
+                f"Saved to {extraction.benchmark_path()}; backend order is now {extraction.backend_order()}"
+            ))
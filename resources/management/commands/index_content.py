@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from resources import jobs
+from resources.models import Note, StudentResource
+
+
+class Command(BaseCommand):
+    help = "Queue content-index jobs for documents that have no content shard yet (run_jobs does the work)."
+
+    def handle(self, *args, **options):
+        queued = 0
+        for model in (Note, StudentResource):
+            for obj in model.objects.filter(content_shard__isnull=True).only("id", "file").iterator():
+                # extract is skipped when the text is stored already, then queues content
+                jobs.enqueue(obj, "extract")
+                queued += 1
+        self.stdout.write(self.style.SUCCESS(f"Queued {queued} documents for content indexing"))
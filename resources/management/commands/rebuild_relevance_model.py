@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from resources.relevance import rebuild_model, model_path
+
+
+class Command(BaseCommand):
+    help = "Refit the shared relevance vocabulary over all indexed sentences and cache every document matrix."
+
+    def handle(self, *args, **options):
+        model = rebuild_model()
+        self.stdout.write(self.style.SUCCESS(
+            f"Cached sentence matrices for {len(model.matrices)} documents in {model_path()}"
+        ))
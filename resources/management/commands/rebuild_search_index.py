@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from resources.search_index import rebuild_index, index_path
+
+
+class Command(BaseCommand):
+    help = "Refit the TF-IDF search index over all notes and student resources."
+
+    def handle(self, *args, **options):
+        index = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(index.keys)} documents into {index_path()}"
+        ))
@@ -0,0 +1,80 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from resources import jobs, relevance
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Run queued text-extraction, summarization and content-index jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=getattr(settings, "JOB_WORKERS", 2),
+                            help="Size of the process pool.")
+        parser.add_argument("--batch", type=int, default=10,
+                            help="Jobs claimed per poll.")
+        parser.add_argument("--once", action="store_true",
+                            help="Process the current queue and exit instead of polling.")
+
+    def handle(self, *args, **options):
+        poll_interval = getattr(settings, "JOB_POLL_INTERVAL", 5)
+
+        # Children only run DB-free tasks; don't let them inherit open connections.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=django.setup) as pool:
+            while True:
+                processed = self.run_batch(pool, options["batch"])
+                if options["once"] and not processed:
+                    break
+                if not processed:
+                    time.sleep(poll_interval)
+
+    def run_batch(self, pool, limit):
+        claimed = jobs.claim(limit)
+        running = []
+        for job in claimed:
+            try:
+                task = jobs.prepare(job)
+                if task is None:
+                    jobs.finish(job)
+                    self.report(job)
+                else:
+                    func, args = task
+                    running.append((job, pool.submit(func, *args)))
+            except Exception as exc:
+                self.handle_failure(job, exc)
+
+        for job, future in running:
+            try:
+                jobs.finish(job, future.result())
+                self.report(job)
+            except Exception as exc:
+                self.handle_failure(job, exc)
+
+        if any(job.kind == "content" for job in claimed):
+            self.refit_relevance()
+        return len(claimed)
+
+    def refit_relevance(self):
+        try:
+            if relevance.refit_if_stale():
+                self.stdout.write("relevance model: refitted")
+        except Exception:
+            logger.exception("Could not refit the relevance model")
+
+    def report(self, job):
+        self.stdout.write(f"{job.kind} {job.document}: done")
+
+    def handle_failure(self, job, exc):
+        try:
+            jobs.fail(job, exc)
+        except Exception:  # e.g. document deleted while the job was running
+            logger.exception("Could not record the failure of %s job %s", job.kind, job.pk)
+        self.stderr.write(f"{job.kind} job {job.pk} failed: {exc}")
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0007_alter_note_file_alter_studentresource_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('public_id', models.CharField(max_length=255)),
+                ('file_version', models.CharField(blank=True, max_length=50)),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('pages', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('public_id', 'file_version'), name='unique_extracted_text_file')],
+            },
+        ),
+    ]
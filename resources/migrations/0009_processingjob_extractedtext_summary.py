@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 07:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0008_extractedtext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedtext',
+            name='summary',
+            field=models.TextField(blank=True),
+        ),
+        migrations.CreateModel(
+            name='ProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('extract', 'Extract text'), ('summarize', 'Summarize'), ('index', 'Update search index')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('note', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='resources.note')),
+                ('resource', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='resources.studentresource')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='job_status_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 6.0 on 2026-10-18 07:50
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Rating = apps.get_model('resources', 'Rating')
+    for model_name, fk in (('Note', 'note'), ('StudentResource', 'resource')):
+        model = apps.get_model('resources', model_name)
+        ratings = Rating.objects.filter(**{fk: OuterRef('pk')}).order_by().values(fk)
+        model.objects.update(
+            rating_count=Coalesce(Subquery(ratings.annotate(c=Count('pk')).values('c'), output_field=models.IntegerField()), Value(0)),
+            rating_sum=Coalesce(Subquery(ratings.annotate(s=Sum('value')).values('s'), output_field=models.IntegerField()), Value(0)),
+            rating_avg=Coalesce(Subquery(ratings.annotate(a=Avg('value')).values('a'), output_field=models.FloatField()), Value(0.0)),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0009_processingjob_extractedtext_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentresource',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentresource',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentresource',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['-rating_avg', '-uploaded_at'], name='note_rating_avg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentresource',
+            index=models.Index(fields=['-rating_avg', '-uploaded_at'], name='resource_rating_avg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentresource',
+            index=models.Index(fields=['-verified', '-rating_avg', '-uploaded_at'], name='resource_verified_rating_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
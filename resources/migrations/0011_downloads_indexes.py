@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 07:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0010_note_studentresource_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['-downloads'], name='note_downloads_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentresource',
+            index=models.Index(fields=['-downloads'], name='resource_downloads_idx'),
+        ),
+    ]
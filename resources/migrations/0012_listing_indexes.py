@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 08:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0011_downloads_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='note_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['category', '-uploaded_at', '-id'], name='note_category_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentresource',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='resource_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentresource',
+            index=models.Index(fields=['category', '-uploaded_at', '-id'], name='resource_category_uploaded_idx'),
+        ),
+    ]
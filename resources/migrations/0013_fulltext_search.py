@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 08:30
+
+from django.db import migrations
+
+from lrhub import search
+
+
+def install(apps, schema_editor):
+    search.install_index(schema_editor, 'note', apps.get_model('resources', 'Note')._meta.db_table)
+    search.install_index(schema_editor, 'resource', apps.get_model('resources', 'StudentResource')._meta.db_table)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall_index(schema_editor, 'note', apps.get_model('resources', 'Note')._meta.db_table)
+    search.uninstall_index(schema_editor, 'resource', apps.get_model('resources', 'StudentResource')._meta.db_table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0012_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 08:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0013_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processingjob',
+            name='kind',
+            field=models.CharField(choices=[('extract', 'Extract text'), ('summarize', 'Summarize'), ('content', 'Index document content'), ('index', 'Update search index')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ContentShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sentences', models.JSONField(default=list)),
+                ('postings', models.JSONField(default=dict)),
+                ('token_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='resources.extractedtext')),
+                ('note', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='content_shard', to='resources.note')),
+                ('resource', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='content_shard', to='resources.studentresource')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ContentTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('tf', models.PositiveIntegerField()),
+                ('shard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='resources.contentshard')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'shard'], name='content_term_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-18 09:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_stored_summaries(apps, schema_editor):
+    # the single stored summary was built with the "medium" settings
+    ExtractedText = apps.get_model('resources', 'ExtractedText')
+    Summary = apps.get_model('resources', 'Summary')
+    Summary.objects.bulk_create([
+        Summary(entry_id=pk, length='medium', text=text)
+        for pk, text in ExtractedText.objects.exclude(summary='').values_list('pk', 'summary').iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0014_content_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Summary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('length', models.CharField(choices=[('short', 'Short'), ('medium', 'Medium'), ('long', 'Long')], max_length=10)),
+                ('text', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='resources.extractedtext')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('entry', 'length'), name='unique_summary_length')],
+            },
+        ),
+        migrations.RunPython(copy_stored_summaries, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='extractedtext',
+            name='summary',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+def delete_index_jobs(apps, schema_editor):
+    # the search index is patched by resources.signals now; queued rows would never run
+    apps.get_model('resources', 'ProcessingJob').objects.filter(kind='index').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0015_summary_lengths'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_index_jobs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='processingjob',
+            name='kind',
+            field=models.CharField(choices=[('extract', 'Extract text'), ('summarize', 'Summarize'), ('content', 'Index document content')], max_length=20),
+        ),
+    ]
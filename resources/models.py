@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models import Avg
+from django.db.models import Avg, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
 from cloudinary.models import CloudinaryField
 
 CATEGORY_CHOICES = [
@@ -14,6 +15,46 @@ CATEGORY_CHOICES = [
     ("Music", "Music"), ("Sports", "Sports"), ("Business", "Business"), ("Other", "Other"), 
 ]
 
+class RatedQuerySet(models.QuerySet):
+    """Shared queryset for models that have a ``ratings`` reverse relation."""
+
+    def with_user_rating(self, user):
+        """
+        Annotate each row with ``my_rating`` (the user's star value or None) in the same query.
+        Average and vote count are the stored ``rating_avg`` / ``rating_count`` columns.
+        """
+        rating_fk = self.model.ratings.field
+        mine = rating_fk.model.objects.filter(
+            user=user, **{rating_fk.name: OuterRef('pk')}
+        ).values('value')[:1]
+        return self.annotate(my_rating=Subquery(mine))
+
+    def apply_rating_delta(self, count_delta, sum_delta):
+        """Shift the stored aggregates in a single UPDATE, so concurrent ratings never lose writes."""
+        new_count = F('rating_count') + count_delta
+        new_sum = F('rating_sum') + sum_delta
+        return self.update(
+            rating_count=new_count,
+            rating_sum=new_sum,
+            rating_avg=Coalesce(Cast(new_sum, FloatField()) / NullIf(new_count, Value(0)), Value(0.0)),
+        )
+
+    def refresh_rating_aggregates(self):
+        """Recompute the stored aggregates from the Rating table (backfill / repair)."""
+        rating_fk = self.model.ratings.field
+        ratings = rating_fk.model.objects.filter(
+            **{rating_fk.name: OuterRef('pk')}
+        ).order_by().values(rating_fk.name)
+        count = Subquery(ratings.annotate(c=Count('pk')).values('c'), output_field=IntegerField())
+        total = Subquery(ratings.annotate(s=Sum('value')).values('s'), output_field=IntegerField())
+        avg = Subquery(ratings.annotate(a=Avg('value')).values('a'), output_field=FloatField())
+        return self.update(
+            rating_count=Coalesce(count, Value(0)),
+            rating_sum=Coalesce(total, Value(0)),
+            rating_avg=Coalesce(avg, Value(0.0)),
+        )
+
+
 class Note(models.Model):
     title = models.CharField(max_length=200)
     topic = models.CharField(max_length=100)
@@ -24,13 +65,26 @@ class Note(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, blank=True, null=True)
     downloads = models.PositiveIntegerField(default=0)
+    # ✅ Rating aggregates, kept in sync by resources.signals
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+
+    objects = RatedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating_avg', '-uploaded_at'], name='note_rating_avg_idx'),
+            models.Index(fields=['-downloads'], name='note_downloads_idx'),
+            models.Index(fields=['-uploaded_at', '-id'], name='note_uploaded_idx'),
+            models.Index(fields=['category', '-uploaded_at', '-id'], name='note_category_uploaded_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} (v{self.version})"
 
     def average_rating(self):
-        avg = self.ratings.aggregate(Avg('value'))['value__avg']
-        return avg or None
+        return self.rating_avg if self.rating_count else None
 
 
 class StudentResource(models.Model):
@@ -43,13 +97,27 @@ class StudentResource(models.Model):
     verified = models.BooleanField(default=False)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, blank=True, null=True)
     downloads = models.PositiveIntegerField(default=0)
+    # ✅ Rating aggregates, kept in sync by resources.signals
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+
+    objects = RatedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating_avg', '-uploaded_at'], name='resource_rating_avg_idx'),
+            models.Index(fields=['-verified', '-rating_avg', '-uploaded_at'], name='resource_verified_rating_idx'),
+            models.Index(fields=['-downloads'], name='resource_downloads_idx'),
+            models.Index(fields=['-uploaded_at', '-id'], name='resource_uploaded_idx'),
+            models.Index(fields=['category', '-uploaded_at', '-id'], name='resource_category_uploaded_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.uploaded_by.username}"
 
-    def average_rating(self): 
-        avg = self.ratings.aggregate(Avg('value'))['value__avg']
-        return avg or None
+    def average_rating(self):
+        return self.rating_avg if self.rating_count else None
 
 
 class Rating(models.Model):
@@ -86,3 +154,117 @@ class Recommendation(models.Model):
     def __str__(self):
         target = self.note if self.note else self.resource
         return f"{self.user.username} recommended {target}"
+
+
+class ExtractedText(models.Model):
+    """Per-page text of an uploaded PDF, extracted once and reused by every analysis endpoint."""
+    public_id = models.CharField(max_length=255)
+    file_version = models.CharField(max_length=50, blank=True)
+    content_hash = models.CharField(max_length=64, db_index=True)  # sha256 of the file bytes
+    pages = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['public_id', 'file_version'], name='unique_extracted_text_file'),
+        ]
+
+    def __str__(self):
+        return f"{self.public_id} (v{self.file_version}, {len(self.pages)} pages)"
+
+    @property
+    def text(self):
+        return "\n".join(page for page in self.pages if page).strip()
+
+
+class Summary(models.Model):
+    """Extractive summary of one extracted file version, precomputed for each length."""
+    LENGTH_CHOICES = [
+        ("short", "Short"),
+        ("medium", "Medium"),
+        ("long", "Long"),
+    ]
+
+    entry = models.ForeignKey(ExtractedText, related_name="summaries", on_delete=models.CASCADE)
+    length = models.CharField(max_length=10, choices=LENGTH_CHOICES)
+    text = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entry', 'length'], name='unique_summary_length'),
+        ]
+
+    def __str__(self):
+        return f"{self.length} summary of {self.entry.public_id}"
+
+
+class ProcessingJob(models.Model):
+    """Background work queued for an uploaded document and run by ``manage.py run_jobs``."""
+    KIND_CHOICES = [
+        ("extract", "Extract text"),
+        ("summarize", "Summarize"),
+        ("content", "Index document content"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    note = models.ForeignKey(Note, related_name="jobs", on_delete=models.CASCADE, null=True, blank=True)
+    resource = models.ForeignKey(StudentResource, related_name="jobs", on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.document} [{self.status}]"
+
+    @property
+    def document(self):
+        return self.note if self.note_id else self.resource
+
+
+class ContentShard(models.Model):
+    """
+    One document's slice of the full-text content index (see resources.content_index).
+    ``sentences`` holds [page, start, end] character offsets into ExtractedText.pages.
+    ``postings`` maps each term to its [sentence, position] occurrences.
+    """
+    note = models.OneToOneField(Note, related_name="content_shard", on_delete=models.CASCADE, null=True, blank=True)
+    resource = models.OneToOneField(StudentResource, related_name="content_shard", on_delete=models.CASCADE, null=True, blank=True)
+    entry = models.ForeignKey(ExtractedText, related_name="shards", on_delete=models.CASCADE)
+    sentences = models.JSONField(default=list)
+    postings = models.JSONField(default=dict)
+    token_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.document} ({len(self.postings)} terms)"
+
+    @property
+    def document(self):
+        return self.note if self.note_id else self.resource
+
+
+class ContentTerm(models.Model):
+    """Term -> shard entry of the content index; ``tf`` is the term's count in that document."""
+    shard = models.ForeignKey(ContentShard, related_name="terms", on_delete=models.CASCADE)
+    term = models.CharField(max_length=64)
+    tf = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'shard'], name='content_term_idx'),
+        ]
@@ -0,0 +1,92 @@
+"""
+Keyset (cursor) pagination over Notes and StudentResources together.
+
+Both tables are read in one order, descending: ``(uploaded_at, kind, id)``
+for browsing, ``(search_rank, kind, id)`` for search results so the best
+matches come first (``search_rank`` is annotated by lrhub.search). The cursor
+holds that triple for the last row of the page. The next page filters each
+table with ``WHERE (key, id) < cursor`` and ``LIMIT size + 1``, so a page
+never scans and throws away the earlier rows, as offset pagination would.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+
+from lrhub import cursors
+
+# tie-break between the two tables when the sort key is equal
+KIND_RANK = {"resource": 0, "note": 1}
+
+# sort field -> how its cursor part is parsed back
+ORDERINGS = {"uploaded_at": cursors.parse_stamp, "search_rank": float}
+
+LIST_FIELDS = {
+    "note": ("id", "title", "topic", "file", "category", "uploaded_at", "uploaded_by__username"),
+    "resource": ("id", "title", "description", "file", "category", "uploaded_at", "uploaded_by__username"),
+}
+
+
+def page_size():
+    return getattr(settings, "RESOURCES_PAGE_SIZE", 20)
+
+
+def list_queryset(kind, queryset, order="uploaded_at"):
+    """Only the columns the listing renders, in ``order`` (newest first matches the uploaded_at indexes)."""
+    return (
+        queryset.select_related("uploaded_by")
+        .only(*LIST_FIELDS[kind])
+        .order_by(f"-{order}", "-id")
+    )
+
+
+def _sort_key(kind, obj, order):
+    return (getattr(obj, order), KIND_RANK[kind], obj.pk)
+
+
+def encode_cursor(kind, obj, order="uploaded_at"):
+    return cursors.encode_cursor(getattr(obj, order), kind, obj.pk)
+
+
+def decode_cursor(cursor, order="uploaded_at"):
+    """Return ``(key, kind_rank, id)`` or None for a missing/garbled cursor."""
+    return cursors.decode_cursor(cursor, ORDERINGS[order], KIND_RANK.__getitem__, int)
+
+
+def _after(kind, position, order):
+    """Rows of ``kind`` that sort after ``position`` in descending order."""
+    key, rank, pk = position
+    lower = Q(**{f"{order}__lt": key})
+    if KIND_RANK[kind] < rank:
+        return lower | Q(**{order: key})
+    if KIND_RANK[kind] == rank:
+        return lower | Q(**{order: key, "id__lt": pk})
+    return lower
+
+
+def keyset_page(querysets, cursor=None, size=None, order="uploaded_at"):
+    """
+    One page from several ``(kind, queryset)`` sources merged by ``order``
+    ("uploaded_at", or "search_rank" for lrhub.search results), highest first.
+
+    Returns ``(items, next_cursor)``; each item gets a ``kind`` attribute.
+    ``next_cursor`` is None on the last page.
+    """
+    size = size or page_size()
+    position = decode_cursor(cursor, order)
+
+    streams = []
+    for kind, qs in querysets:
+        qs = list_queryset(kind, qs, order)
+        if position:
+            qs = qs.filter(_after(kind, position, order))
+        rows = list(qs[:size + 1])
+        for obj in rows:
+            obj.kind = kind
+        streams.append([(_sort_key(kind, obj, order), obj) for obj in rows])
+
+    merged = heapq.merge(*streams, key=lambda pair: pair[0], reverse=True)
+    page = [obj for _, obj in merged]
+    items = page[:size]
+    next_cursor = encode_cursor(items[-1].kind, items[-1], order) if len(page) > size else None
+    return items, next_cursor
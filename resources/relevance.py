@@ -0,0 +1,250 @@
+"""
+Batch relevance scoring of many queries against many documents.
+
+``relevance_score`` (resources.utils) fits a new TfidfVectorizer for every
+(document, query) pair. Here one vectorizer is fitted over the sentences of
+every content shard (resources.content_index) and saved to disk. Each
+document's sentences are transformed with it once, into an L2-normalised
+sparse matrix that is cached in the same file and refreshed when the shard
+changes.
+
+``score_batch`` stacks the wanted documents' matrices and multiplies them by
+all N query vectors in one sparse product, giving cosine similarity for every
+sentence x query. The per-document maximum is taken on row slices of that
+sparse product, which is never turned into a dense sentences x queries array.
+It runs in the CPU pool (``score_batch_async``), as does the first fit when
+no model file exists yet. The file is written like the search index: under
+``search_index.file_lock`` and replaced atomically, re-read first, so workers
+never drop each other's cached matrices.
+
+The vocabulary is refitted by the job worker (``refit_if_stale``, after
+``content`` jobs) once more than RELEVANCE_REFIT_RATIO of the shards changed
+since the last fit, so terms that only appear in new documents start scoring.
+"""
+import os
+import threading
+
+import joblib
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.utils import timezone
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from lrhub import cpu_pool
+from resources.models import Note, ContentShard
+from resources.search_index import document_key, file_lock
+
+_lock = threading.Lock()
+_cached = None
+_cached_mtime = None
+
+
+def model_path():
+    return str(getattr(settings, "RELEVANCE_MODEL_PATH", settings.BASE_DIR / "relevance_model.joblib"))
+
+
+def shard_sentences(shard):
+    """Sentence texts of a shard, in the order of ``shard.sentences``."""
+    pages = shard.entry.pages
+    return [pages[page][start:end] for page, start, end in shard.sentences]
+
+
+def _shards():
+    return ContentShard.objects.select_related("entry", "note", "resource")
+
+
+class RelevanceModel:
+    def __init__(self, vectorizer=None, matrices=None, fitted_at=None):
+        self.vectorizer = vectorizer
+        # (kind, id) -> (shard updated_at, L2-normalised sentence x term CSR matrix)
+        self.matrices = matrices or {}
+        self.fitted_at = fitted_at  # shards updated after this may hold terms outside the vocabulary
+
+    @classmethod
+    def fit(cls):
+        """Fit the shared vocabulary on every indexed sentence and cache every document matrix."""
+        fitted_at = timezone.now()
+        shards = list(_shards())
+        sentences = [shard_sentences(shard) for shard in shards]
+        corpus = [s for doc in sentences for s in doc]
+        if not corpus:
+            return cls(fitted_at=fitted_at)
+        vectorizer = TfidfVectorizer(stop_words="english")  # norm="l2" by default
+        try:
+            stacked = vectorizer.fit_transform(corpus).tocsr()
+        except ValueError:  # only stop words
+            return cls(fitted_at=fitted_at)
+        model, row = cls(vectorizer, fitted_at=fitted_at), 0
+        for shard, doc in zip(shards, sentences):
+            model.matrices[document_key(shard.document)] = (shard.updated_at, stacked[row:row + len(doc)])
+            row += len(doc)
+        return model
+
+    @classmethod
+    def load(cls, path):
+        data = joblib.load(path)
+        return cls(data["vectorizer"], data["matrices"], data.get("fitted_at"))
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump({"vectorizer": self.vectorizer, "matrices": self.matrices, "fitted_at": self.fitted_at}, tmp_path)
+        os.replace(tmp_path, path)
+
+    @property
+    def needs_refit(self):
+        """True once more than RELEVANCE_REFIT_RATIO of the shards changed since the fit."""
+        shards = ContentShard.objects.all()
+        if self.fitted_at is None:
+            return shards.exists()
+        changed = shards.filter(updated_at__gt=self.fitted_at).count()
+        ratio = getattr(settings, "RELEVANCE_REFIT_RATIO", 0.2)
+        return changed > 0 and (self.vectorizer is None or changed >= max(shards.count() * ratio, 1))
+
+    def refresh(self, shards):
+        """Transform shards that are new or changed since their matrix was cached.
+        Returns True when anything was updated."""
+        changed = False
+        for shard in shards:
+            key = document_key(shard.document)
+            cached = self.matrices.get(key)
+            if cached is None or cached[0] != shard.updated_at:
+                self.matrices[key] = (shard.updated_at, self.vectorizer.transform(shard_sentences(shard)).tocsr())
+                changed = True
+        return changed
+
+
+def _current(path):
+    """The model as it is on disk now, fitted if the file is missing (an empty
+    fit is saved too, so it is not repeated). The caller holds _lock."""
+    global _cached, _cached_mtime
+    if not os.path.exists(path):
+        with file_lock(path):  # one process fits it, the others then load it
+            if not os.path.exists(path):
+                RelevanceModel.fit().save(path)
+    mtime = os.path.getmtime(path)
+    if _cached is None or mtime != _cached_mtime:
+        _cached, _cached_mtime = RelevanceModel.load(path), mtime
+    return _cached
+
+
+def _write(model, path):
+    global _cached, _cached_mtime
+    model.save(path)
+    _cached, _cached_mtime = model, os.path.getmtime(path)
+
+
+def get_model():
+    """The on-disk model, fitted on first use and reloaded when another worker saved a newer one.
+    Fitting reads every shard: call this from the CPU pool or the job worker only."""
+    with _lock:
+        return _current(model_path())
+
+
+def rebuild_model():
+    path = model_path()
+    with _lock, file_lock(path):
+        model = RelevanceModel.fit()
+        _write(model, path)
+    return model
+
+
+def _refreshed(shards):
+    """The model with matrices for ``shards`` up to date. New matrices are saved
+    into the current file under the file lock, so other workers' rows are kept."""
+    path = model_path()
+    with _lock:
+        model = _current(path)
+        if all(_is_fresh(model, shard) for shard in shards):
+            return model
+        with file_lock(path):
+            model = _current(path)
+            if model.refresh(shards):
+                _write(model, path)
+        return model
+
+
+def _is_fresh(model, shard):
+    cached = model.matrices.get(document_key(shard.document))
+    return cached is not None and cached[0] == shard.updated_at
+
+
+def refit_if_stale():
+    """Refit the vocabulary when enough new text was indexed (run by the job worker).
+    Returns True when the model was refitted."""
+    if get_model().needs_refit:
+        rebuild_model()
+        return True
+    return False
+
+
+def score_batch(queries, documents, max_words=40):
+    """
+    Score every query against every document's sentences.
+
+    Returns one list per query (same order as ``queries``), each
+    ``[{"document", "score", "match"}, ...]`` best first. ``score`` is the 0-100 cosine of the best sentence (the
+    relevance_score scale). Documents without indexed text are left out.
+    """
+    model = get_model()
+    queries = [(q or "").strip() for q in queries]
+    if model.vectorizer is None or not queries or not documents:  # nothing indexed at the last fit
+        return [[] for _ in queries]
+
+    fields = {
+        "note__in": [d for d in documents if isinstance(d, Note)],
+        "resource__in": [d for d in documents if not isinstance(d, Note)],
+    }
+    shards = [
+        shard for name, objs in fields.items() if objs
+        for shard in _shards().filter(**{name: objs})
+    ]
+    model = _refreshed(shards)
+
+    blocks, starts, owners = [], [], []
+    row = 0
+    for shard in shards:
+        matrix = model.matrices[document_key(shard.document)][1]
+        if matrix.shape[0] == 0:
+            continue
+        blocks.append(matrix)
+        starts.append(row)
+        owners.append(shard)
+        row += matrix.shape[0]
+    if not blocks:
+        return [[] for _ in queries]
+
+    sentences = sparse.vstack(blocks, format="csr")                 # S x V
+    query_matrix = model.vectorizer.transform(queries).T.tocsc()    # V x N, L2-normalised columns
+    sims = (sentences @ query_matrix).tocsr()                       # S x N cosines, kept sparse
+    best, best_row = [], []
+    for start, end in zip(starts, starts[1:] + [row]):
+        block = sims[start:end]                                     # one document's sentences
+        best.append(block.max(axis=0).toarray().ravel())            # cosines are >= 0, so implicit zeros are fine
+        best_row.append(np.asarray(block.argmax(axis=0)).ravel())
+    best, best_row = np.vstack(best), np.vstack(best_row)           # M x N best sentence per document
+
+    results = []
+    for q in range(len(queries)):
+        ranked = np.argsort(-best[:, q], kind="stable")
+        per_query = []
+        for d in ranked:
+            shard = owners[d]
+            page, start, end = shard.sentences[int(best_row[d, q])]
+            per_query.append({
+                "document": shard.document,
+                "score": round(float(best[d, q]) * 100, 2),
+                "match": _trim(shard.entry.pages[page][start:end], max_words),
+            })
+        results.append(per_query)
+    return results
+
+
+async def score_batch_async(queries, documents, max_words=40):
+    """score_batch for async views, run in the CPU pool (raises CPUTimeout when it overruns)."""
+    return await cpu_pool.run_async(score_batch, queries, documents, max_words)
+
+
+def _trim(sentence, max_words):
+    words = sentence.split()
+    return " ".join(words[:max_words]) + ("..." if len(words) > max_words else "")
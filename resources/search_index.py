@@ -0,0 +1,256 @@
+"""
+Persistent TF-IDF index used by ``search_recommendations``.
+
+The fitted vectorizer (vocabulary + IDF weights), the L2-normalised sparse
+document-term matrix and the row -> document mapping are stored together on
+disk. Saves/deletes of Note and StudentResource patch single rows through
+signals, so a query only has to transform the query string and do one sparse
+dot product against the cached matrix. A document with terms the vocabulary
+does not know yet triggers a refit instead, so it can be found by them.
+
+Patches and refits run in the web host's CPU pool (``queue_update`` /
+``queue_removal``, after commit), never on a web worker thread. Writers hold
+an flock on ``<index>.lock``, so concurrent saves from several workers never
+overwrite each other's rows. A SearchIndex is never modified in place: a
+patch builds a new one and swaps it in, so a query running meanwhile keeps a
+consistent matrix and key list.
+"""
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import joblib
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import transaction
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from lrhub import cpu_pool
+from resources.models import Note, StudentResource
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_cached = None        # SearchIndex loaded in this process
+_cached_mtime = None  # mtime of the file it was loaded from
+
+
+def index_path():
+    return str(getattr(settings, "SEARCH_INDEX_PATH", settings.BASE_DIR / "search_index.joblib"))
+
+
+def document_key(obj):
+    """(kind, id) pair identifying a document row in the index."""
+    return ("note" if isinstance(obj, Note) else "resource", obj.pk)
+
+
+def document_text(obj):
+    """Text that gets indexed for a Note / StudentResource."""
+    if isinstance(obj, Note):
+        return f"{obj.title} {obj.topic}"
+    return f"{obj.title} {obj.description}"
+
+
+class SearchIndex:
+    def __init__(self, vectorizer=None, matrix=None, keys=None, stale=0):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.keys = list(keys or [])
+        # rows written since the last fit; their new terms are not in the vocabulary yet
+        self.stale = stale
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+
+    # --- Build / persist ---
+    @classmethod
+    def build(cls):
+        corpus, keys = [], []
+        for n in Note.objects.only("id", "title", "topic").order_by("id"):
+            corpus.append(document_text(n))
+            keys.append(document_key(n))
+        for r in StudentResource.objects.only("id", "title", "description").order_by("id"):
+            corpus.append(document_text(r))
+            keys.append(document_key(r))
+
+        if not corpus:
+            return cls()
+        vectorizer = TfidfVectorizer()
+        try:
+            matrix = vectorizer.fit_transform(corpus).tocsr()
+        except ValueError:  # empty vocabulary
+            return cls(keys=[])
+        return cls(vectorizer, matrix, keys)
+
+    @classmethod
+    def load(cls, path):
+        data = joblib.load(path)
+        return cls(data["vectorizer"], data["matrix"], data["keys"], data.get("stale", 0))
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump({
+            "vectorizer": self.vectorizer,
+            "matrix": self.matrix,
+            "keys": self.keys,
+            "stale": self.stale,
+        }, tmp_path)
+        os.replace(tmp_path, path)  # atomic, readers never see a half-written file
+
+    # --- Incremental updates (each returns a new SearchIndex) ---
+    @property
+    def needs_refit(self):
+        if self.vectorizer is None:
+            return True
+        ratio = getattr(settings, "SEARCH_INDEX_REFIT_RATIO", 0.2)
+        return self.stale > max(len(self.keys) * ratio, 1)
+
+    def knows_terms(self, text):
+        """True when every term of ``text`` is in the fitted vocabulary."""
+        vocabulary = self.vectorizer.vocabulary_
+        return all(term in vocabulary for term in self.vectorizer.build_analyzer()(text))
+
+    def upsert(self, key, text):
+        row = self.vectorizer.transform([text]).tocsr()
+        keys = list(self.keys)
+        if key in self.positions:
+            i = self.positions[key]
+            matrix = sparse.vstack([self.matrix[:i], row, self.matrix[i + 1:]], format="csr")
+        else:
+            matrix = sparse.vstack([self.matrix, row], format="csr")
+            keys.append(key)
+        return SearchIndex(self.vectorizer, matrix, keys, self.stale + 1)
+
+    def remove(self, key):
+        i = self.positions.get(key)
+        if i is None:
+            return self
+        matrix = sparse.vstack([self.matrix[:i], self.matrix[i + 1:]], format="csr")
+        return SearchIndex(self.vectorizer, matrix, self.keys[:i] + self.keys[i + 1:], self.stale)
+
+    # --- Query ---
+    def query(self, text, kind=None, limit=5):
+        """Return the ``limit`` best (kind, id) keys for ``text``."""
+        if self.vectorizer is None or not self.keys:
+            return []
+        q_vec = self.vectorizer.transform([text])
+        scores = (self.matrix @ q_vec.T).toarray().ravel()
+        if kind:
+            scores[[k != kind for k, _ in self.keys]] = -1
+            candidates = sum(1 for k, _ in self.keys if k == kind)
+        else:
+            candidates = len(self.keys)
+        limit = min(limit, candidates)
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self.keys[i] for i in top]
+
+
+def file_lock(path):
+    """Exclusive lock on ``<index>.lock`` shared by every process on the host
+    (a no-op where fcntl is missing, i.e. a Windows dev server)."""
+    lock_file = open(f"{path}.lock", "a")
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file  # closing it releases the lock
+
+
+def _current(path):
+    """The index as it is on disk now, built if the file is missing.
+    The caller holds _lock, and the file lock too if the file may be missing."""
+    global _cached, _cached_mtime
+    if not os.path.exists(path):
+        SearchIndex.build().save(path)
+    mtime = os.path.getmtime(path)
+    if _cached is None or mtime != _cached_mtime:
+        _cached = SearchIndex.load(path)
+        _cached_mtime = mtime
+    return _cached
+
+
+def get_index():
+    """Return the on-disk index, building it on first use and reloading it
+    when another worker has written a newer copy."""
+    path = index_path()
+    with _lock:
+        if not os.path.exists(path):
+            with file_lock(path):  # one process builds it, the others then load it
+                return _current(path)
+        return _current(path)
+
+
+def query_index(text, kind=None, limit=5):
+    return get_index().query(text, kind=kind, limit=limit)
+
+
+def is_built():
+    return os.path.exists(index_path())
+
+
+def build_if_missing():
+    """Fit and save the index if no process has yet (sent to the CPU pool, so the
+    fit never runs on a web worker; the worker doesn't keep a copy in memory)."""
+    path = index_path()
+    with file_lock(path):
+        if not os.path.exists(path):
+            SearchIndex.build().save(path)
+
+
+def _write(index, path):
+    global _cached, _cached_mtime
+    index.save(path)
+    _cached, _cached_mtime = index, os.path.getmtime(path)
+
+
+def rebuild_index():
+    path = index_path()
+    with _lock, file_lock(path):
+        index = SearchIndex.build()
+        _write(index, path)
+    return index
+
+
+# Updates read, patch and save the file under the file lock, so two workers
+# saving at once cannot each write back a copy missing the other's row.
+def update_document(key, text):
+    """Add or refresh one document's row; refit when its terms are new to the vocabulary."""
+    path = index_path()
+    with _lock, file_lock(path):
+        index = _current(path)
+        if index.needs_refit or not index.knows_terms(text):
+            index = SearchIndex.build()
+        else:
+            index = index.upsert(key, text)
+        _write(index, path)
+
+
+def remove_document(key):
+    """Drop one document's row."""
+    path = index_path()
+    with _lock, file_lock(path):
+        _write(_current(path).remove(key), path)
+
+
+def _run_in_pool(func, *args):
+    timeout = getattr(settings, "SEARCH_INDEX_UPDATE_TIMEOUT", 120)
+    try:
+        cpu_pool.run(func, *args, timeout=timeout)
+    except Exception:  # the row is patched again by the next save or rebuild_search_index
+        logger.exception("Could not update the search index (%s%r)", func.__name__, args)
+
+
+def queue_update(obj):
+    """Patch ``obj``'s row in the CPU pool once the current transaction commits."""
+    key, text = document_key(obj), document_text(obj)
+    transaction.on_commit(lambda: _run_in_pool(update_document, key, text))
+
+
+def queue_removal(obj):
+    key = document_key(obj)
+    transaction.on_commit(lambda: _run_in_pool(remove_document, key))
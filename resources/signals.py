@@ -1,6 +1,9 @@
-from django.db.models.signals import post_delete
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from .models import Note, StudentResource
+from lrhub.cache import invalidate
+from .models import Note, StudentResource, ExtractedText, Rating, Recommendation
+from . import search_index, jobs
 
 @receiver(post_delete, sender=Note)
 def delete_file_on_note_delete(sender, instance, **kwargs):
@@ -11,3 +14,76 @@ def delete_file_on_note_delete(sender, instance, **kwargs):
 def delete_file_on_resource_delete(sender, instance, **kwargs):
     if instance.file:
         instance.file.delete(save=False)
+
+# --- Extracted text ---
+@receiver(post_delete, sender=Note)
+@receiver(post_delete, sender=StudentResource)
+def delete_extracted_text_on_delete(sender, instance, **kwargs):
+    if instance.file:
+        public_id = getattr(instance.file, "public_id", None)
+        if public_id:
+            ExtractedText.objects.filter(public_id=public_id).delete()
+
+# --- Background processing (extraction, summaries, content index) ---
+@receiver(post_save, sender=Note)
+@receiver(post_save, sender=StudentResource)
+def enqueue_jobs_on_save(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: jobs.enqueue(instance, "extract"))
+
+# --- Search index (patched by the web host's CPU pool, so every web worker reloads it) ---
+@receiver(post_save, sender=Note)
+@receiver(post_save, sender=StudentResource)
+def index_document_on_save(sender, instance, **kwargs):
+    search_index.queue_update(instance)
+
+@receiver(post_delete, sender=Note)
+@receiver(post_delete, sender=StudentResource)
+def unindex_document_on_delete(sender, instance, **kwargs):
+    search_index.queue_removal(instance)
+
+# --- Rating aggregates (Note/StudentResource.rating_count/_sum/_avg) ---
+def _rated_target(rating):
+    if rating.note_id:
+        return Note.objects.filter(pk=rating.note_id)
+    return StudentResource.objects.filter(pk=rating.resource_id)
+
+@receiver(post_init, sender=Rating)
+def remember_rating_value(sender, instance, **kwargs):
+    # value as stored in the DB, so an update only applies the difference
+    instance._stored_value = instance.__dict__.get("value") if instance.pk else None
+
+@receiver(post_save, sender=Rating)
+def update_rating_aggregates_on_save(sender, instance, created, **kwargs):
+    target = _rated_target(instance)
+    if created:
+        target.apply_rating_delta(1, instance.value)
+    elif instance._stored_value is None:
+        target.refresh_rating_aggregates()
+    elif instance._stored_value != instance.value:
+        target.apply_rating_delta(0, instance.value - instance._stored_value)
+    instance._stored_value = instance.value
+
+@receiver(post_delete, sender=Rating)
+def update_rating_aggregates_on_delete(sender, instance, **kwargs):
+    _rated_target(instance).apply_rating_delta(-1, -instance.value)
+
+# --- Cache invalidation (lrhub.cache) ---
+CACHE_NAMESPACES = {
+    Note: "documents",
+    StudentResource: "documents",
+    Rating: "ratings",
+    Recommendation: "recommendations",
+}
+
+@receiver(post_save, sender=Note)
+@receiver(post_save, sender=StudentResource)
+@receiver(post_save, sender=Rating)
+@receiver(post_save, sender=Recommendation)
+@receiver(post_delete, sender=Note)
+@receiver(post_delete, sender=StudentResource)
+@receiver(post_delete, sender=Rating)
+@receiver(post_delete, sender=Recommendation)
+def invalidate_cache_on_change(sender, instance, **kwargs):
+    namespace = CACHE_NAMESPACES[sender]
+    transaction.on_commit(lambda: invalidate(namespace))
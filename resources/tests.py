@@ -1,3 +1,840 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import cloudinary
+import requests
+from asgiref.sync import sync_to_async
+from cloudinary import CloudinaryResource
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from lrhub import cpu_pool, search
+from lrhub.cache import cache_key
+from resources import content_index, counters, extraction, fetch, jobs, pagination, relevance, search_index, utils
+from resources.models import ContentShard, ExtractedText, Note, ProcessingJob, Rating, StudentResource, Summary
+
+BODY = b"%PDF-1.4 " + b"x" * 5000
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Stand-in for the file host: /ok, /missing, /flaky (503 twice, then 200), /slow, /big."""
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real origin
+    flaky_hits = 0
+
+    def do_GET(self):
+        if self.path == "/flaky":
+            StandInHandler.flaky_hits += 1
+            if StandInHandler.flaky_hits <= 2:
+                return self.reply(503, b"busy")
+        if self.path == "/missing":
+            return self.reply(404, b"not found")
+        if self.path == "/slow":
+            time.sleep(1)
+        if self.path == "/big":
+            return self.reply(200, b"x" * 20000)
+        return self.reply(200, BODY)
+
+    def reply(self, status, body):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):  # client gave up (timeout / size cap)
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(FETCH_BACKOFF=0, FETCH_READ_TIMEOUT=0.5, FETCH_MAX_BYTES=10000, FETCH_RETRIES=2)
+class FetchTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StandInHandler.flaky_hits = 0
+
+    def test_download_streams_and_hashes(self):
+        with fetch.download(f"{self.base}/ok") as (file, digest):
+            self.assertEqual(file.read(), BODY)
+        self.assertEqual(digest, hashlib.sha256(BODY).hexdigest())
+
+    def test_error_status_yields_none(self):
+        with fetch.download(f"{self.base}/missing") as result:
+            self.assertIsNone(result)
+
+    def test_retries_server_errors(self):
+        with fetch.download(f"{self.base}/flaky") as (file, _):
+            self.assertEqual(file.read(), BODY)
+        self.assertEqual(StandInHandler.flaky_hits, 3)
+
+    def test_size_cap_and_timeout(self):
+        with self.assertRaises(fetch.FetchError):
+            with fetch.download(f"{self.base}/big"):
+                pass
+        with override_settings(FETCH_RETRIES=0):
+            with self.assertRaises(requests.exceptions.RequestException):  # read timeout
+                with fetch.download(f"{self.base}/slow"):
+                    pass
+
+    async def test_async_download(self):
+        async with fetch.download_async(f"{self.base}/flaky") as (file, digest):
+            with open(file.name, "rb") as fh:  # named file, so a pool process can open it
+                self.assertEqual(fh.read(), BODY)
+        self.assertEqual(digest, hashlib.sha256(BODY).hexdigest())
+        async with fetch.download_async(f"{self.base}/missing") as result:
+            self.assertIsNone(result)
+
+
+def nap(seconds):
+    """Pool task for CPUPoolTests (module level, so a spawned worker can import it)."""
+    time.sleep(seconds)
+    return os.getpid()
+
+
+class CPUPoolTests(SimpleTestCase):
+    """An overdue or abandoned call costs its own worker only; the other calls finish."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.pool = cpu_pool.Pool(2)
+        cls.pids = {cls.pool.run(nap, (0,), timeout=120) for _ in range(2)}  # both workers started
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        super().tearDownClass()
+
+    def worker_pids(self):
+        return {self.pool.run(nap, (0,), timeout=60) for _ in range(2)}
+
+    def test_timeout_kills_only_the_overdue_worker(self):
+        with ThreadPoolExecutor(2) as threads:
+            slow = threads.submit(self.pool.run, nap, (30,), timeout=0.5)
+            quick = threads.submit(self.pool.run, nap, (1,), timeout=60)
+            with self.assertRaises(cpu_pool.CPUTimeout):
+                slow.result()
+            survivor = quick.result()  # still running when its neighbour was killed
+        self.assertIn(survivor, self.pids)
+        pids = self.worker_pids()
+        self.assertEqual(len(pids), 2)
+        self.assertIn(survivor, pids)
+        type(self).pids = pids
+
+    def test_cancelled_async_call_frees_its_worker(self):
+        async def scenario():
+            with override_settings(CPU_POOL_WORKERS=2):
+                task = asyncio.ensure_future(cpu_pool.run_async(nap, 30, timeout=60))
+                await asyncio.sleep(0.5)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        original = cpu_pool._pool, cpu_pool._owner_pid
+        cpu_pool._pool, cpu_pool._owner_pid = self.pool, os.getpid()
+        try:
+            started = time.monotonic()
+            asyncio.run(scenario())
+            pids = self.worker_pids()  # both free again well before the 30s nap would end
+        finally:
+            cpu_pool._pool, cpu_pool._owner_pid = original
+        self.assertLess(time.monotonic() - started, 20)
+        self.assertEqual(len(pids), 2)
+        self.assertEqual(len(pids & self.pids), 1)
+        type(self).pids = pids
+
+
+@override_settings(JOB_LEASE_SECONDS=60, JOB_MAX_ATTEMPTS=3)
+class JobClaimTests(TestCase):
+    """Jobs left running by a crashed worker are claimed again once their lease expires."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        teacher = User.objects.create_user("teacher")
+        cls.note = Note.objects.create(title="Algebra", topic="algebra", uploaded_by=teacher,
+                                       file="raw/upload/v1/algebra.pdf")
+
+    def running_job(self, attempts, age):
+        job = ProcessingJob.objects.create(note=self.note, kind="summarize", status="running", attempts=attempts)
+        ProcessingJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(seconds=age))
+        return job
+
+    def test_expired_lease_is_reclaimed(self):
+        fresh = self.running_job(attempts=1, age=10)
+        expired = self.running_job(attempts=1, age=120)
+        self.assertEqual([job.pk for job in jobs.claim(10)], [expired.pk])
+        expired.refresh_from_db()
+        self.assertEqual((expired.status, expired.attempts), ("running", 2))
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.attempts, 1)
+
+    def test_job_that_keeps_crashing_fails(self):
+        job = self.running_job(attempts=3, age=120)
+        self.assertEqual(jobs.claim(10), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+
+
+class ContentSearchTests(TestCase):
+    """BM25 over the content index is summed in SQL; the endpoint is for logged-in users."""
+
+    PAGES = {
+        "Photosynthesis": ["Plants use light. Photosynthesis turns light into sugar.", "Light reactions happen first."],
+        "Cells": ["Cells divide. Plant cells have walls and chloroplasts for photosynthesis."],
+        "Algebra": ["Solve the equation for x. Algebra uses symbols."],
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        cls.user = User.objects.create_user("student")
+        for i, (title, pages) in enumerate(cls.PAGES.items()):
+            note = Note.objects.create(title=title, topic="science", uploaded_by=cls.user,
+                                       file=f"raw/upload/v1/doc{i}.pdf")
+            entry = ExtractedText.objects.create(public_id=f"doc{i}", content_hash=str(i), pages=pages)
+            content_index.store_shard(note, entry, content_index.build_postings(pages))
+
+    def reference_scores(self, terms):
+        shards = {title: content_index.build_postings(pages) for title, pages in self.PAGES.items()}
+        avgdl = sum(built[2] for built in shards.values()) / len(shards)
+        scores = {}
+        for title, (_, postings, length) in shards.items():
+            score = 0.0
+            for term in terms:
+                n = sum(term in other[1] for other in shards.values())
+                tf = len(postings.get(term, ()))
+                if n and tf:
+                    idf = math.log(1 + (len(shards) - n + 0.5) / (n + 0.5))
+                    norm = content_index.BM25_K1 * (1 - content_index.BM25_B + content_index.BM25_B * length / avgdl)
+                    score += idf * tf * (content_index.BM25_K1 + 1) / (tf + norm)
+            if score:
+                scores[title] = round(score, 3)
+        return scores
+
+    def test_sql_bm25_matches_reference(self):
+        results = content_index.search_content("light photosynthesis", limit=5)
+        self.assertEqual({doc.title: score for doc, score, _ in results}, self.reference_scores(["light", "photosynthesis"]))
+        self.assertEqual(results[0][0].title, "Photosynthesis")
+        self.assertEqual(len(content_index.search_content("light photosynthesis", limit=1)), 1)
+
+    def test_endpoint_requires_login_and_positive_k(self):
+        url = "/resources/content_search/"
+        self.assertEqual(self.client.get(url, {"q": "light"}).status_code, 403)
+        self.client.force_login(self.user)
+        for k in ("0", "-3", "many"):
+            self.assertEqual(self.client.get(url, {"q": "light", "k": k}).status_code, 400)
+        response = self.client.get(url, {"q": "light", "k": "1"})
+        self.assertEqual([r["title"] for r in response.json()["results"]], ["Photosynthesis"])
+
+
+class RelevanceBatchTests(TestCase):
+    """score_batch picks each document's best sentence; the job worker refits a stale vocabulary."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        cls.teacher = User.objects.create_user("teacher")
+        cls.plants = cls.indexed_note("Plants", ["Cells divide often. Photosynthesis turns light into sugar in leaves."])
+        cls.algebra = cls.indexed_note("Algebra", ["Solve the equation for x. Algebra uses symbols and numbers."])
+
+    @classmethod
+    def indexed_note(cls, title, pages):
+        note = Note.objects.create(title=title, topic="science", uploaded_by=cls.teacher,
+                                   file=f"raw/upload/v1/{title}.pdf")
+        entry = ExtractedText.objects.create(public_id=title, content_hash=title, pages=pages)
+        content_index.store_shard(note, entry, content_index.build_postings(pages))
+        return note
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "relevance.joblib")
+        self.enterContext(override_settings(RELEVANCE_MODEL_PATH=path))
+        self.enterContext(mock.patch.object(relevance, "_cached", None))
+
+    def test_best_sentence_per_document(self):
+        light, equation = relevance.score_batch(
+            ["light and sugar", "solve an equation"], [self.plants, self.algebra]
+        )
+        self.assertEqual([item["document"] for item in light], [self.plants, self.algebra])
+        self.assertEqual(light[0]["match"], "Photosynthesis turns light into sugar in leaves.")
+        self.assertEqual(light[1]["score"], 0)
+        self.assertEqual(equation[0]["document"], self.algebra)
+        self.assertEqual(equation[0]["match"], "Solve the equation for x.")
+        self.assertEqual(relevance.score_batch(["light"], [self.algebra])[0][0]["document"], self.algebra)
+
+    def test_empty_fit_is_saved_not_repeated(self):
+        with mock.patch.object(relevance.ContentShard.objects, "all", return_value=ContentShard.objects.none()), \
+                mock.patch.object(relevance, "_shards", return_value=ContentShard.objects.none()):
+            with mock.patch.object(relevance.RelevanceModel, "fit", wraps=relevance.RelevanceModel.fit) as fit:
+                self.assertEqual(relevance.score_batch(["light"], [self.plants]), [[]])
+                self.assertEqual(relevance.score_batch(["light"], [self.plants]), [[]])
+        self.assertEqual(fit.call_count, 1)
+
+    def test_refreshed_matrices_of_other_workers_are_kept(self):
+        relevance.score_batch(["light"], [self.plants])
+        path = settings.RELEVANCE_MODEL_PATH
+        other = relevance.RelevanceModel.load(path)  # another worker adds a document's matrix meanwhile
+        other.matrices[("note", 0)] = other.matrices[relevance.document_key(self.plants)]
+        other.save(path)
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        ContentShard.objects.filter(note=self.algebra).update(updated_at=timezone.now())
+        relevance.score_batch(["light"], [self.algebra])
+        self.assertIn(("note", 0), relevance.RelevanceModel.load(path).matrices)
+
+    def test_worker_refits_once_new_text_is_indexed(self):
+        relevance.score_batch(["light"], [self.plants])
+        self.assertFalse(relevance.refit_if_stale())
+        cells = self.indexed_note("Cells", ["Mitochondria release energy. Membranes hold the cell together."])
+        self.assertEqual(relevance.score_batch(["mitochondria"], [cells])[0][0]["score"], 0)  # not in the vocabulary yet
+        self.assertTrue(relevance.refit_if_stale())
+        self.assertGreater(relevance.score_batch(["mitochondria"], [cells])[0][0]["score"], 50)
+        self.assertFalse(relevance.refit_if_stale())
+
+
+class DownloadCounterTests(TestCase):
+    """Counting a download refreshes cached listings, buffered or not."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        cls.note = Note.objects.create(title="Algebra", topic="algebra", uploaded_by=User.objects.create_user("teacher"),
+                                       file="raw/upload/v1/algebra.pdf")
+
+    def count(self):
+        key = cache_key(("documents",), "listing")
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.increment_downloads(self.note, 2)
+        return key
+
+    def test_update_invalidates_documents(self):
+        key = self.count()
+        self.assertNotEqual(cache_key(("documents",), "listing"), key)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.downloads, 2)
+
+    @override_settings(DOWNLOAD_COUNTER_BUFFERED=True)
+    def test_flush_invalidates_documents(self):
+        key = self.count()
+        self.assertEqual(cache_key(("documents",), "listing"), key)
+        counters.flush()
+        self.assertNotEqual(cache_key(("documents",), "listing"), key)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.downloads, 2)
+
+
+class ProcessingStatusTests(TestCase):
+    """The job status endpoint is login-only and answers 404 for unknown documents."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        cls.user = User.objects.create_user("student")
+        cls.note = Note.objects.create(title="Algebra", topic="algebra", uploaded_by=cls.user,
+                                       file="raw/upload/v1/algebra.pdf")
+
+    def url(self, type, pk):
+        return reverse("processing_status", args=[type, pk])
+
+    def test_requires_login(self):
+        self.assertEqual(self.client.get(self.url("note", self.note.pk)).status_code, 403)
+
+    def test_status_and_missing_document(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url("note", self.note.pk))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["id"], self.note.pk)
+        self.assertEqual(self.client.get(self.url("note", self.note.pk + 1)).status_code, 404)
+        self.assertEqual(self.client.get(self.url("resource", 1)).status_code, 404)
+        self.assertEqual(self.client.get(self.url("video", 1)).status_code, 400)
+
+
+class ExtractedTextStoreTests(TestCase):
+    """A file version is downloaded and parsed once; identical bytes reuse the parsed pages."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        teacher = User.objects.create_user("teacher")
+        cls.notes = [
+            Note.objects.create(title=title, topic="biology", uploaded_by=teacher, file=f"raw/upload/v1/{title}.pdf")
+            for title in ("plants", "copy")
+        ]
+
+    def setUp(self):
+        self.downloads = []
+        self.enterContext(mock.patch.object(utils, "download_pdf", side_effect=self.download))
+        self.parse = self.enterContext(mock.patch.object(utils, "extract_pdf_pages", return_value=["Leaves."]))
+
+    @contextmanager
+    def download(self, url):
+        self.downloads.append(url)
+        yield None if "missing" in url else (BytesIO(b"%PDF"), "same-bytes")
+
+    def file(self, note):
+        return utils.document_file(note)
+
+    def test_miss_then_hit(self):
+        entry = utils.get_extracted_text(self.file(self.notes[0]))
+        self.assertEqual((entry.pages, entry.content_hash), (["Leaves."], "same-bytes"))
+        self.assertEqual(utils.get_extracted_text(self.file(self.notes[0])), entry)
+        self.assertEqual((len(self.downloads), self.parse.call_count), (1, 1))
+
+    def test_identical_bytes_reuse_pages(self):
+        utils.get_extracted_text(self.file(self.notes[0]))
+        copy = utils.get_extracted_text(self.file(self.notes[1]))
+        self.assertEqual(copy.pages, ["Leaves."])
+        self.assertEqual((len(self.downloads), self.parse.call_count), (2, 1))  # fetched, not parsed again
+
+    def test_new_version_and_failed_download(self):
+        first = utils.get_extracted_text(self.file(self.notes[0]))
+        second = utils.get_extracted_text(CloudinaryResource("plants", version=2, resource_type="raw"))
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(len(self.downloads), 2)
+        self.assertIsNone(utils.get_extracted_text(CloudinaryResource("missing", version=1, resource_type="raw")))
+        self.assertFalse(ExtractedText.objects.filter(public_id="missing").exists())
+
+    def test_store_keeps_the_first_row(self):
+        file = self.file(self.notes[0])
+        first = utils.store_extracted_text(file, "same-bytes", ["Leaves."])
+        self.assertEqual(utils.store_extracted_text(file, "other", ["Other."]), first)
+        self.assertEqual(utils.find_extracted_text(file), first)
+
+
+class SummaryEndpointTests(TestCase):
+    """Stored summaries are served with validators; a missing one is built in the CPU pool."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        teacher = User.objects.create_user("teacher")
+        cls.note = Note.objects.create(title="Plants", topic="biology", uploaded_by=teacher,
+                                       file="raw/upload/v1/plants.pdf")
+        file = utils.document_file(cls.note)
+        text = "Photosynthesis turns light into sugar. Roots take up water. Leaves breathe."
+        cls.entry = utils.store_extracted_text(file, "plants", [text])
+        cls.url = reverse("summarize_pdf", args=["note", cls.note.pk])
+
+    def setUp(self):
+        self.pool = self.enterContext(mock.patch("resources.views.run_in_pool", side_effect=self.run_inline))
+
+    async def run_inline(self, func, *args):
+        return func(*args)
+
+    async def test_unchanged_summary_is_not_modified(self):
+        await sync_to_async(utils.store_summaries)(self.entry, utils.build_summaries(self.entry.text))
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        response = await self.async_client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(self.url, headers={"If-Modified-Since": last_modified})
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get(self.url, {"length": "short"}, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)  # each length has its own ETag
+        self.assertNotEqual(response["ETag"], etag)
+        self.pool.assert_not_called()
+
+    async def test_missing_summary_is_built_in_the_pool(self):
+        response = await self.async_client.get(self.url, {"length": "long"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["length"], "long")
+        self.assertEqual(self.pool.call_args.args, (utils.build_summaries, self.entry.text))
+        self.assertEqual(await Summary.objects.filter(entry=self.entry).acount(), len(utils.SUMMARY_LENGTHS))
+        self.assertTrue((await self.async_client.get(self.url)).has_header("ETag"))
+
+    async def test_pool_timeout_queues_the_job(self):
+        self.pool.side_effect = cpu_pool.CPUTimeout
+        response = await self.async_client.get(self.url)
+        self.assertEqual((response.status_code, response["Retry-After"]), (503, "30"))
+        self.assertTrue(await ProcessingJob.objects.filter(note=self.note, kind="summarize").aexists())
+
+
+class RatingAggregateTests(TestCase):
+    """The stored rating_count / rating_sum / rating_avg columns follow every Rating write."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        teacher = User.objects.create_user("teacher")
+        cls.note = Note.objects.create(title="Algebra", topic="algebra", uploaded_by=teacher,
+                                       file="raw/upload/v1/algebra.pdf")
+        cls.resource = StudentResource.objects.create(title="Atlas", uploaded_by=teacher,
+                                                      file="raw/upload/v1/atlas.pdf")
+        cls.students = [User.objects.create_user(f"student{i}") for i in range(3)]
+
+    def assertAggregates(self, obj, count, total, avg):
+        obj.refresh_from_db()
+        self.assertEqual((obj.rating_count, obj.rating_sum), (count, total))
+        self.assertAlmostEqual(obj.rating_avg, avg)
+
+    def test_create_change_and_delete(self):
+        first = Rating.objects.create(note=self.note, user=self.students[0], value=4)
+        Rating.objects.create(note=self.note, user=self.students[1], value=1)
+        self.assertAggregates(self.note, 2, 5, 2.5)
+
+        first.value = 5
+        first.save()
+        first.save()  # unchanged value: no second delta
+        self.assertAggregates(self.note, 2, 6, 3.0)
+
+        first.delete()
+        self.assertAggregates(self.note, 1, 1, 1.0)
+        Rating.objects.get().delete()
+        self.assertAggregates(self.note, 0, 0, 0.0)
+        self.assertAggregates(self.resource, 0, 0, 0.0)
+
+    def test_update_or_create(self):
+        for value in (3, 5):
+            Rating.objects.update_or_create(resource=self.resource, user=self.students[0], defaults={"value": value})
+        self.assertAggregates(self.resource, 1, 5, 5.0)
+        self.assertAggregates(self.note, 0, 0, 0.0)
+
+    def test_unknown_stored_value_refreshes_from_table(self):
+        Rating.objects.create(note=self.note, user=self.students[0], value=2)
+        Rating.objects.create(note=self.note, user=self.students[1], value=4)
+        rating = Rating.objects.only("pk", "note", "resource").get(user=self.students[0])
+        self.assertIsNone(rating._stored_value)  # value deferred: the old value is unknown
+        rating.value = 5
+        rating.save()
+        self.assertAggregates(self.note, 2, 9, 4.5)
+
+    def test_backfill_command(self):
+        Rating.objects.create(note=self.note, user=self.students[0], value=3)
+        Rating.objects.create(resource=self.resource, user=self.students[1], value=2)
+        Note.objects.update(rating_count=7, rating_sum=1, rating_avg=0.1)
+        StudentResource.objects.update(rating_count=0, rating_sum=0, rating_avg=0)
+        out = StringIO()
+        call_command("backfill_rating_aggregates", stdout=out)
+        self.assertIn("Refreshed rating aggregates for 1 notes and 1 resources", out.getvalue())
+        self.assertAggregates(self.note, 1, 3, 3.0)
+        self.assertAggregates(self.resource, 1, 2, 2.0)
+
+
+class CursorTests(SimpleTestCase):
+    """Listing cursors round-trip through lrhub.cursors; anything else starts from the first page."""
+
+    def test_round_trip_and_garbage(self):
+        note = Note(pk=7, uploaded_at=timezone.now())
+        cursor = pagination.encode_cursor("note", note)
+        self.assertEqual(pagination.decode_cursor(cursor), (note.uploaded_at, pagination.KIND_RANK["note"], 7))
+        for garbled in ("", "not base64!", pagination.encode_cursor("video", note), cursor[:-4]):
+            self.assertIsNone(pagination.decode_cursor(garbled), garbled)
+
+
+PAGES = ["one", "two", "three", "four"]
+
+
+def steady_pages(file, start=0):
+    for text in PAGES[start:]:
+        yield lambda text=text: text
+
+
+def breaks_on_page_two(file, start=0):
+    for index in range(start, len(PAGES)):
+        if index == 1:
+            raise ValueError("bad xref")
+        yield lambda index=index: PAGES[index]
+
+
+def always_breaks(file, start=0):
+    raise ValueError(f"cannot open (asked from page {start})")
+    yield  # pragma: no cover
+
+
+class ExtractionFallbackTests(SimpleTestCase):
+    """A failing parser hands over to the next one at the page it stopped on."""
+
+    def setUp(self):
+        backends = {"flaky": breaks_on_page_two, "steady": steady_pages, "broken": always_breaks}
+        self.enterContext(mock.patch.dict(extraction.BACKENDS, backends, clear=True))
+
+    def test_next_backend_resumes_without_duplicates(self):
+        starts = []
+
+        def steady_recording(file, start=0):
+            starts.append(start)
+            yield from steady_pages(file, start)
+
+        extraction.BACKENDS["steady"] = steady_recording
+        pages = extraction.extract_pages(b"%PDF", backends=["flaky", "broken", "steady"])
+        self.assertEqual(pages, PAGES)
+        self.assertEqual(starts, [1])
+        self.assertEqual(extraction.extract_pages(b"%PDF", backends=["flaky", "steady"], max_pages=3), PAGES[:3])
+
+    def test_every_backend_failing_raises(self):
+        with self.assertRaisesMessage(extraction.ExtractionError, "flaky: bad xref; broken: cannot open (asked from page 1)"):
+            extraction.extract_pages(b"%PDF", backends=["flaky", "broken"])
+
+    def test_order_follows_setting_then_saved_benchmark(self):
+        fake = dict.fromkeys(extraction.DEFAULT_ORDER, steady_pages)
+        self.enterContext(mock.patch.dict(extraction.BACKENDS, fake, clear=True))
+        with tempfile.TemporaryDirectory() as directory:
+            results = os.path.join(directory, "benchmark.json")
+            with override_settings(PDF_BACKENDS=[], PDF_BENCHMARK_RESULTS=results):
+                self.assertEqual(extraction.backend_order(), list(extraction.DEFAULT_ORDER))  # no benchmark yet
+                with open(results, "w") as fh:
+                    json.dump({
+                        "pdfplumber": {"pages_per_sec": 40.0, "ok": True},
+                        "pypdfium2": {"pages_per_sec": 900.0, "ok": True},
+                        "pypdf2": {"pages_per_sec": 5000.0, "ok": False},  # failed files: not trusted
+                    }, fh)
+                self.assertEqual(extraction.backend_order(), ["pypdfium2", "pdfplumber", "pypdf2"])
+            with override_settings(PDF_BACKENDS=["pypdf2", "missing", "pdfplumber"]):
+                self.assertEqual(extraction.backend_order(), ["pypdf2", "pdfplumber"])
+
+
+class PageBudgetTests(SimpleTestCase):
+    """Page and time budgets are checked before a page is parsed."""
+
+    def setUp(self):
+        self.parsed = []
+
+        def recording_pages(file, start=0):
+            for index in range(start, len(PAGES)):
+                yield lambda index=index: self.parsed.append(index) or PAGES[index]
+
+        self.enterContext(mock.patch.dict(extraction.BACKENDS, {"steady": recording_pages}, clear=True))
+        self.enterContext(override_settings(PDF_BACKENDS=["steady"]))
+
+        def exact_match(text, query):
+            return {"score": 100.0 if text == query else 0.0, "match": text}
+
+        self.enterContext(mock.patch.object(utils, "relevance_score", exact_match))
+
+    def test_page_limit(self):
+        pages = extraction.iter_pages(b"%PDF", max_pages=2)
+        self.assertEqual(list(pages), PAGES[:2])
+        self.assertTrue(pages.truncated)
+        self.assertEqual(self.parsed, [0, 1])  # the third page was never parsed
+
+        pages = extraction.iter_pages(b"%PDF", max_pages=len(PAGES))
+        self.assertEqual(list(pages), PAGES)
+        self.assertFalse(pages.truncated)
+
+    def test_exactly_max_pages_is_complete(self):
+        result = utils.score_pdf_pages(b"%PDF", "nothing matches", threshold=101, max_pages=len(PAGES))
+        self.assertEqual(result["pages_scanned"], len(PAGES))
+        self.assertTrue(result["complete"])
+
+        result = utils.score_pdf_pages(b"%PDF", "nothing matches", threshold=101, max_pages=3)
+        self.assertEqual(result["pages_scanned"], 3)
+        self.assertFalse(result["complete"])
+
+    def test_time_limit(self):
+        clock = iter([0.0, 1.0, 5.0, 11.0, 12.0])
+        with mock.patch.object(extraction.time, "monotonic", lambda: next(clock)):
+            pages = extraction.iter_pages(b"%PDF", time_budget=10)
+            self.assertEqual(list(pages), PAGES[:2])
+        self.assertTrue(pages.truncated)
+        self.assertEqual(self.parsed, [0, 1])
+
+    def test_early_exit_stops_parsing(self):
+        result = utils.score_pdf_pages(b"%PDF", "two", threshold=100)
+        self.assertEqual((result["page"], result["pages_scanned"], result["complete"]), (2, 2, False))
+        self.assertEqual(self.parsed, [0, 1])
+
+
+@override_settings(CPU_POOL_WORKERS=0, SEARCH_INDEX_REFIT_RATIO=0.5)
+class SearchIndexTests(TestCase):
+    """Rows are patched in place of a refit until new terms or too many patches; writers take turns."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        cls.teacher = User.objects.create_user("teacher")
+        for title, topic in [("Photosynthesis", "light and leaves"), ("Algebra", "equations"), ("Cells", "biology")]:
+            Note.objects.create(title=title, topic=topic, uploaded_by=cls.teacher, file=f"raw/upload/v1/{title}.pdf")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "search_index.joblib")
+        self.enterContext(override_settings(SEARCH_INDEX_PATH=self.path))
+        self.enterContext(mock.patch.object(search_index, "_cached", None))
+        search_index.rebuild_index()
+
+    def titles(self, text):
+        return [Note.objects.get(pk=pk).title for _, pk in search_index.query_index(text, "note", 3) if pk]
+
+    def test_patch_and_remove_swap_in_a_new_index(self):
+        before = search_index.get_index()
+        search_index.update_document(("note", 0), "equations and light")  # known terms only
+        after = search_index.get_index()
+        self.assertIsNot(after, before)
+        self.assertEqual((len(before.keys), len(after.keys), after.stale), (3, 4, 1))
+        self.assertIn(("note", 0), after.keys)
+        search_index.remove_document(("note", 0))
+        self.assertNotIn(("note", 0), search_index.get_index().keys)
+        self.assertEqual(len(after.keys), 4)  # a query holding the old index is unaffected
+
+    def test_new_terms_refit_the_vocabulary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Note.objects.create(title="Chlorophyll", topic="pigments", uploaded_by=self.teacher,
+                                file="raw/upload/v1/chlorophyll.pdf")
+        self.assertEqual(self.titles("chlorophyll")[0], "Chlorophyll")
+        self.assertEqual(search_index.get_index().stale, 0)
+
+    def test_refit_after_too_many_patches(self):
+        algebra = Note.objects.get(title="Algebra")
+        for stale in (1, 2, 0):  # 3 rows x 0.5: the third patch finds 2 stale rows and refits
+            search_index.update_document(("note", algebra.pk), "equations light")
+            self.assertEqual(search_index.get_index().stale, stale)
+
+    def test_saves_go_through_the_cpu_pool(self):
+        with mock.patch.object(cpu_pool, "run") as run, self.captureOnCommitCallbacks(execute=True):
+            Note.objects.get(title="Cells").save()
+        self.assertEqual(run.call_args.args[:2], (search_index.update_document, ("note", Note.objects.get(title="Cells").pk)))
+
+    def test_reloads_when_another_process_saved(self):
+        loaded = search_index.get_index()
+        search_index.SearchIndex.build().save(self.path)
+        os.utime(self.path, (time.time() + 5, time.time() + 5))
+        self.assertIsNot(search_index.get_index(), loaded)
+
+    def test_writers_wait_for_the_file_lock(self):
+        key = search_index.get_index().keys[0]
+        holder = search_index.file_lock(self.path)  # another process mid-update
+        writer = threading.Thread(target=search_index.remove_document, args=(key,))
+        writer.start()
+        writer.join(0.3)
+        self.assertTrue(writer.is_alive())
+        holder.close()
+        writer.join(5)
+        self.assertNotIn(key, search_index.get_index().keys)
+
+
+class SearchRecommendationsTests(TestCase):
+    """The async suggestion view builds a missing index in the CPU pool and queries it in-process."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        teacher = User.objects.create_user("teacher")
+        for title, topic in [("Photosynthesis", "light and leaves"), ("Algebra", "equations")]:
+            Note.objects.create(title=title, topic=topic, uploaded_by=teacher, file=f"raw/upload/v1/{title}.pdf")
+        cls.url = reverse("search_recommendations")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(SEARCH_INDEX_PATH=os.path.join(directory.name, "search_index.joblib")))
+        self.enterContext(mock.patch.object(search_index, "_cached", None))
+        # stands in for the CPU pool, whose processes would not see the test database
+        self.pool = self.enterContext(mock.patch("resources.views.run_in_pool", side_effect=self.run_in_thread))
+
+    async def run_in_thread(self, func, *args):
+        return await sync_to_async(func)(*args)
+
+    async def test_first_query_builds_the_index_in_the_pool(self):
+        response = await self.async_client.get(self.url, {"q": "light", "filter": "notes"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["recommendations"][0]["title"], "Photosynthesis")
+        self.assertEqual(self.pool.call_args.args, (search_index.build_if_missing,))
+
+        await self.async_client.get(self.url, {"q": "equations"})
+        self.assertEqual(self.pool.call_count, 1)  # built once, then only queried
+
+    async def test_empty_query_and_busy_pool(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.json(), {"recommendations": []})
+        self.pool.side_effect = cpu_pool.CPUTimeout
+        self.assertEqual((await self.async_client.get(self.url, {"q": "light"})).status_code, 503)
+
+
+@override_settings(CPU_POOL_WORKERS=0, RESOURCES_PAGE_SIZE=2)
+class FullTextSearchTests(TestCase):
+    """lrhub.search matches every word by prefix, ranks title hits first, and keeps that order across pages."""
+
+    NOTES = [
+        ("Algebra basics", "equations"),
+        ("Linear equations", "algebra"),        # "algebra" only in the weaker column
+        ("Algebraic fractions", "algebra"),
+        ("Cells", "biology"),
+        ('Quotes "and" stars*', "punctuation"),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cloudinary.config(cloud_name="test")
+        teacher = User.objects.create_user("teacher")
+        for i, (title, topic) in enumerate(cls.NOTES):
+            Note.objects.create(title=title, topic=topic, uploaded_by=teacher, file=f"raw/upload/v1/n{i}.pdf")
+
+    def titles(self, query):
+        return [note.title for note in search.search(query, kinds=("note",))["note"]]
+
+    def test_index_is_used(self):
+        marker = {"sqlite": "_fts", "postgresql": "search_vector"}.get(connection.vendor)
+        if marker is None:
+            self.skipTest(f"no full-text index on {connection.vendor}")
+        with CaptureQueriesContext(connection) as ctx:
+            self.titles("algebra")
+        self.assertIn(marker, ctx.captured_queries[-1]["sql"])
+
+    def test_prefix_match_and_ranking(self):
+        found = self.titles("algebr")
+        self.assertEqual(set(found), {"Algebra basics", "Linear equations", "Algebraic fractions"})
+        self.assertEqual(found[-1], "Linear equations")  # title matches rank above topic-only ones
+        self.assertEqual(set(self.titles("algebra equations")), {"Algebra basics", "Linear equations"})
+        self.assertEqual(self.titles("biology algebra"), [])
+
+    def test_special_characters_are_plain_words(self):
+        for query in ('"and"', "stars*", 'quotes AND NOT (', "-cells", "^cells:"):
+            self.titles(query)  # never a syntax error from the index
+        self.assertEqual(self.titles('"quotes" stars*'), ['Quotes "and" stars*'])
+        self.assertEqual(self.titles("*** ()"), [])
+
+    def test_fallback_without_index(self):
+        with mock.patch.object(search, "_has_index", return_value=False):
+            self.assertEqual(set(self.titles("algebr")), {"Algebra basics", "Linear equations", "Algebraic fractions"})
+            self.assertEqual(self.titles("CELLS"), ["Cells"])
+            found = search.search("algebr", kinds=("note",))["note"]
+            first, cursor = pagination.keyset_page([("note", found)], order="search_rank")
+            second, _ = pagination.keyset_page([("note", found)], cursor, order="search_rank")
+            self.assertEqual(len({note.pk for note in first + second}), 3)  # equal ranks page by id
+
+    def test_pages_keep_the_ranking(self):
+        expected = self.titles("algebra")
+        seen, cursor = [], None
+        while True:
+            params = {"q": "algebra", "filter": "notes", **({"cursor": cursor} if cursor else {})}
+            response = self.client.get("/resources/", params)
+            seen += [item.title for item in response.context["results"]]
+            cursor = response.context["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
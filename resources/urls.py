@@ -1,8 +1,11 @@
 from django.urls import path
-from .views import resources_home, search_recommendations, summarize_pdf
+from .views import resources_home, category_items, search_recommendations, content_search, summarize_pdf, processing_status
 
 urlpatterns = [
     path('', resources_home, name='resources_home'),
+    path("category/", category_items, name="category_items"),
     path("search_recommendations/", search_recommendations, name="search_recommendations"),
+    path("content_search/", content_search, name="content_search"),
     path("pdf/<str:type>/<int:pk>/summarize/", summarize_pdf, name="summarize_pdf"),
+    path("pdf/<str:type>/<int:pk>/status/", processing_status, name="processing_status"),
 ]
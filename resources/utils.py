@@ -1,30 +1,172 @@
-import requests
-from io import BytesIO
-import pdfplumber
+from asgiref.sync import sync_to_async
 import re
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from asgiref.sync import sync_to_async
+from django.conf import settings
+from resources.models import ExtractedText, Summary
+from resources import extraction, fetch
+from lrhub import cpu_pool
 
 # --- PDF Extraction (Cloudinary-ready) ---
-def extract_pdf_text_from_url(url: str) -> str:
-    """Fetch and extract text from a Cloudinary-hosted PDF using pdfplumber."""
+# Downloads go through resources.fetch (pooled keep-alive connections, timeouts, retries, size cap)
+download_pdf = fetch.download
+download_pdf_async = fetch.download_async
+
+
+def iter_pdf_pages(source, max_pages=None, time_budget=None):
+    """
+    Iterate over the text of each page as it is parsed ("" for pages without text).
+    ``source`` is bytes, a path or a binary file object. Stops after ``max_pages``
+    pages or once ``time_budget`` seconds have passed. The parser backend and the
+    fallback between backends are chosen by resources.extraction.
+    """
+    return extraction.iter_pages(source, max_pages=max_pages, time_budget=time_budget)
+
+
+def extract_pdf_pages(content) -> list:
+    """Extract the text of every page of a PDF."""
+    return list(iter_pdf_pages(content))
+
+
+def extract_pdf_text_from_url(url: str, max_pages=None, time_budget=None) -> str:
+    """Fetch and extract text from a Cloudinary-hosted PDF."""
     try:
-        response = requests.get(url)
-        if response.status_code != 200:
-            return ""
-        pdf_file = BytesIO(response.content)
-        text = ""
-        with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        return text.strip()
+        with download_pdf(url) as download:
+            if download is None:
+                return ""
+            pages = iter_pdf_pages(download[0], max_pages, time_budget)
+            return "\n".join(page for page in pages if page).strip()
     except Exception:
         return ""
 
+
+_NO_SCAN = {"score": 0.0, "match": "No content available", "page": None, "pages_scanned": 0, "complete": False}
+
+
+def scan_pdf_for_relevance(url: str, query: str, threshold=None, max_pages=None, time_budget=None) -> dict:
+    """
+    Score a PDF against ``query`` page by page while it is parsed, stopping at the first
+    page whose best sentence reaches ``threshold`` (RELEVANCE_CONFIDENT_SCORE) or when
+    the page / time budget (PDF_PAGE_BUDGET / PDF_TIME_BUDGET) runs out.
+    Returns the relevance_score dict plus ``page`` (1-based), ``pages_scanned`` and
+    ``complete`` (False when the scan stopped early).
+    """
+    with download_pdf(url) as download:
+        if download is None:
+            return dict(_NO_SCAN)
+        return score_pdf_pages(download[0], query, threshold, max_pages, time_budget)
+
+
+async def scan_pdf_for_relevance_async(url: str, query: str) -> dict:
+    """scan_pdf_for_relevance for async views: fetched on the event loop, parsed and scored in the CPU pool."""
+    async with download_pdf_async(url) as download:
+        if download is None:
+            return dict(_NO_SCAN)
+        return await cpu_pool.run_async(score_pdf_pages, download[0].name, query)
+
+
+def score_pdf_pages(source, query: str, threshold=None, max_pages=None, time_budget=None) -> dict:
+    """The page-by-page scoring behind scan_pdf_for_relevance; ``source`` is a path or binary file."""
+    threshold = threshold if threshold is not None else getattr(settings, "RELEVANCE_CONFIDENT_SCORE", 60)
+    max_pages = max_pages if max_pages is not None else getattr(settings, "PDF_PAGE_BUDGET", None)
+    time_budget = time_budget if time_budget is not None else getattr(settings, "PDF_TIME_BUDGET", None)
+
+    best = {"score": 0.0, "match": "No content available", "page": None}
+    scanned = 0
+    pages = iter_pdf_pages(source, max_pages, time_budget)
+    for scanned, text in enumerate(pages, start=1):
+        if not text.strip():
+            continue
+        result = relevance_score(text, query)
+        if best["page"] is None or result["score"] > best["score"]:
+            best = {**result, "page": scanned}
+        if best["score"] >= threshold:
+            pages.close()
+            return {**best, "pages_scanned": scanned, "complete": False}
+    return {**best, "pages_scanned": scanned, "complete": not pages.truncated}
+
+
+# --- Extracted-text store ---
+def find_extracted_text(file):
+    """The stored ExtractedText row for a CloudinaryField value, or None (never downloads)."""
+    return ExtractedText.objects.filter(public_id=file.public_id, file_version=str(file.version or "")).first()
+
+
+def get_extracted_text(file):
+    """
+    Return the ExtractedText row for a CloudinaryField value, extracting it on first access.
+    Rows are keyed by (public_id, version); files with identical bytes share the parsed pages.
+    Returns None if the file could not be fetched.
+    """
+    cached = find_extracted_text(file)
+    if cached:
+        return cached
+
+    extracted = download_and_extract(file.url, known_pages=_pages_by_hash)
+    if extracted is None:
+        return None
+    return store_extracted_text(file, *extracted)
+
+
+async def get_extracted_text_async(file):
+    """get_extracted_text for async views: the download is awaited and the parse runs in the CPU pool."""
+    cached = await sync_to_async(find_extracted_text)(file)
+    if cached:
+        return cached
+
+    async with download_pdf_async(file.url) as download:
+        if download is None:
+            return None
+        path, content_hash = download[0].name, download[1]
+        pages = await sync_to_async(_pages_by_hash)(content_hash)
+        if pages is None:
+            pages = await cpu_pool.run_async(extract_pdf_pages, path)
+    return await sync_to_async(store_extracted_text)(file, content_hash, pages)
+
+
+def _pages_by_hash(content_hash):
+    same_bytes = ExtractedText.objects.filter(content_hash=content_hash).only("pages").first()
+    return same_bytes.pages if same_bytes else None
+
+
+def download_and_extract(url: str, known_pages=None):
+    """
+    Fetch a PDF and parse it, returning (content_hash, pages) or None if the fetch failed.
+    ``known_pages(content_hash)`` may return already-parsed pages for identical bytes.
+    Free of DB access so it can run inside a worker process.
+    """
+    with download_pdf(url) as download:
+        if download is None:
+            return None
+        file, content_hash = download
+        pages = known_pages(content_hash) if known_pages else None
+        if pages is None:
+            pages = extract_pdf_pages(file)
+    return content_hash, pages
+
+
+def store_extracted_text(file, content_hash: str, pages: list):
+    entry, _ = ExtractedText.objects.get_or_create(
+        public_id=file.public_id,
+        file_version=str(file.version or ""),
+        defaults={"content_hash": content_hash, "pages": pages},
+    )
+    return entry
+
+
+def get_pdf_text(obj) -> str:
+    """Full extracted text of a Note / StudentResource file ("" if unavailable)."""
+    if not obj.file:
+        return ""
+    entry = get_extracted_text(document_file(obj))
+    return entry.text if entry else ""
+
+
+def document_file(obj):
+    """The CloudinaryResource behind a Note / StudentResource file field."""
+    return obj._meta.get_field("file").to_python(obj.file)
+
 # --- Relevance Scoring ---
 def relevance_score(pdf_text: str, query: str, max_words: int = 40) -> dict:
     """
@@ -53,10 +195,9 @@ def relevance_score(pdf_text: str, query: str, max_words: int = 40) -> dict:
         "match": best_sentence
     }
 
-# ✅ Async wrapper for non-blocking use in async views
-@sync_to_async
-def relevance_score_async(pdf_text: str, query: str, max_words: int = 40) -> dict:
-    return relevance_score(pdf_text, query, max_words)
+# ✅ Async variant for async views: scored in the CPU pool, not on a thread under the GIL
+async def relevance_score_async(pdf_text: str, query: str, max_words: int = 40) -> dict:
+    return await cpu_pool.run_async(relevance_score, pdf_text, query, max_words)
 
 # --- Summarization ---
 def summarize_text(text: str, num_sentences: int = 5, max_words: int = 100) -> str:
@@ -81,3 +222,31 @@ def summarize_text(text: str, num_sentences: int = 5, max_words: int = 100) -> s
         summary_text = " ".join(words[:max_words]) + "..."
 
     return summary_text
+
+
+# sentences picked / word cap for each stored summary length ("medium" is the original summary)
+SUMMARY_LENGTHS = {
+    "short": (2, 40),
+    "medium": (5, 100),
+    "long": (10, 250),
+}
+
+
+def build_summary(text: str, length: str = "medium") -> str:
+    """Summary served by ``summarize_pdf``: top sentences, or the first words of unpunctuated text."""
+    num_sentences, max_words = SUMMARY_LENGTHS[length]
+    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    if len(sentences) <= 1:
+        words = text.split()
+        return " ".join(words[:max_words]) + "..."
+    return summarize_text(text, num_sentences=num_sentences, max_words=max_words)
+
+
+def build_summaries(text: str) -> dict:
+    """Every stored length at once: {"short": ..., "medium": ..., "long": ...}."""
+    return {length: build_summary(text, length) for length in SUMMARY_LENGTHS}
+
+
+def store_summaries(entry, summaries):
+    for length, text in summaries.items():
+        Summary.objects.update_or_create(entry=entry, length=length, defaults={"text": text})
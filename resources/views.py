@@ -1,158 +1,262 @@
-from django.shortcuts import render
-from django.db.models import Q, Avg
-from resources.models import Note, StudentResource
-from rest_framework.decorators import api_view
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.views.decorators.http import condition, require_GET
+from django.db.models import Q, Avg, Count
+from resources.models import Note, StudentResource, Summary
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from sklearn.feature_extraction.text import TfidfVectorizer
-import numpy as np
-import re
-from collections import defaultdict
-import requests
-from io import BytesIO
-from PyPDF2 import PdfReader
-from resources.utils import summarize_text
+from collections import Counter
+from resources.utils import (
+    get_extracted_text_async, document_file, build_summaries, store_summaries, SUMMARY_LENGTHS,
+)
+from resources import search_index, jobs, content_index
+from resources.pagination import keyset_page
+from lrhub.cache import cached
+from lrhub.search import search
+from lrhub.cpu_pool import run_async as run_in_pool, CPUTimeout
 
 # --- Resources Home ---
+UNCATEGORIZED = "Uncategorized"
+
+
 def resources_home(request):
     query = request.GET.get('q')
     filter_type = request.GET.get('filter')
+    cursor = request.GET.get('cursor')
+    querysets = _document_querysets(query, filter_type)
 
-    notes = Note.objects.all()
-    resources = StudentResource.objects.all()
+    # ✅ Category sizes come from GROUP BY; the items are fetched per category on demand
+    categories = cached(
+        ("documents",), ("resource_categories", query, filter_type),
+        lambda: _category_counts(querysets),
+    )
 
+    results, next_cursor = [], None
     if query:
-        if filter_type == 'notes':
-            notes = notes.filter(Q(title__icontains=query) | Q(topic__icontains=query))
-            resources = StudentResource.objects.none()
-        elif filter_type == 'resources':
-            resources = resources.filter(Q(title__icontains=query) | Q(description__icontains=query))
-            notes = Note.objects.none()
-        else:
-            notes = notes.filter(Q(title__icontains=query) | Q(topic__icontains=query))
-            resources = resources.filter(Q(title__icontains=query) | Q(description__icontains=query))
-
-    # ✅ Build categories dictionary
-    categories = defaultdict(list)
-    for n in notes:
-        category = n.category or "Uncategorized"
-        categories[category].append(n)
-    for r in resources:
-        category = r.category or "Uncategorized"
-        categories[category].append(r)
+        # best match first; the cursor pages on (rank, kind, id)
+        results, next_cursor = cached(
+            ("documents",), ("resources_home", query, filter_type, cursor),
+            lambda: keyset_page(querysets, cursor, order="search_rank"),
+        )
 
     return render(request, 'resources/home.html', {
         'query': query,
         'filter': filter_type,
-        'results': list(notes) + list(resources),  # search results
-        'categories': dict(categories),            # categories always available
+        'results': results,          # one page of search results
+        'cursor': cursor,
+        'next_cursor': next_cursor,  # None on the last page
+        'categories': categories,    # {category: item count}
     })
 
 
-# --- Corpus Builder ---
-def build_corpus():
-    notes = Note.objects.all()
-    resources = StudentResource.objects.all()
-    corpus, mapping = [], []
-
-    for n in notes:
-        corpus.append(f"{n.title} {n.topic}")
-        mapping.append({
-            "type": "note",
-            "id": n.id,
-            "title": n.title,
-            "topic": n.topic,
-            "uploaded_by": n.uploaded_by.username,
-            "file_url": n.file.url if n.file else None,
-            "average_rating": n.average_rating(),
-        })
-
-    for r in resources:
-        corpus.append(f"{r.title} {r.description}")
-        mapping.append({
-            "type": "resource",
-            "id": r.id,
-            "title": r.title,
-            "description": r.description,
-            "uploaded_by": r.uploaded_by.username,
-            "file_url": r.file.url if r.file else None,
-            "average_rating": r.average_rating(),
-        })
-
-    return corpus, mapping
+def _document_querysets(query, filter_type):
+    if not query:
+        return [("note", Note.objects.all()), ("resource", StudentResource.objects.all())]
+
+    # ✅ Full-text index match (lrhub.search) instead of LIKE '%q%' scans
+    kinds = {"notes": ("note",), "resources": ("resource",)}.get(filter_type, ("note", "resource"))
+    found = search(query, kinds=kinds)
+    return [(kind, found[kind]) for kind in kinds]
 
 
-# --- Search Recommendations ---
+def _category_counts(querysets):
+    counts = Counter()
+    for _, qs in querysets:
+        for row in qs.order_by().values('category').annotate(n=Count('id')):
+            counts[row['category'] or UNCATEGORIZED] += row['n']
+    return dict(sorted(counts.items()))
+
+
+def _in_category(queryset, category):
+    if category == UNCATEGORIZED:
+        return queryset.filter(Q(category__isnull=True) | Q(category=""))
+    return queryset.filter(category=category)
+
+
+def _list_item(obj):
+    """JSON shape of a Note / StudentResource in listings and suggestions."""
+    item = {
+        "type": "note" if isinstance(obj, Note) else "resource",
+        "id": obj.id,
+        "title": obj.title,
+    }
+    if isinstance(obj, Note):
+        item["topic"] = obj.topic
+    else:
+        item["description"] = obj.description
+    item["uploaded_by"] = obj.uploaded_by.username
+    item["file_url"] = obj.file.url if obj.file else None
+    return item
+
+
+# --- Category Items (loaded when a category is expanded) ---
 @api_view(["GET"])
-def search_recommendations(request):
+def category_items(request):
+    category = request.GET.get("name", "")
+    query = request.GET.get("q")
+    filter_type = request.GET.get("filter")
+    cursor = request.GET.get("cursor")
+
+    def build():
+        querysets = [
+            (kind, _in_category(qs, category))
+            for kind, qs in _document_querysets(query, filter_type)
+        ]
+        items, next_cursor = keyset_page(querysets, cursor, order="search_rank" if query else "uploaded_at")
+        return {"items": [_list_item(obj) for obj in items], "next_cursor": next_cursor}
+
+    page = cached(("documents",), ("category_items", category, query, filter_type, cursor), build)
+    return Response({"category": category, **page})
+
+
+# --- Search Recommendations ---
+@require_GET
+async def search_recommendations(request):
     query = request.GET.get("q", "")
     filter_type = request.GET.get("filter", "")  # "notes" or "resources"
 
     if not query:
-        return Response({"recommendations": []})
-
-    notes = Note.objects.all() if filter_type in ["", "notes"] else []
-    resources = StudentResource.objects.all() if filter_type in ["", "resources"] else []
-
-    corpus, mapping = [], []
-    for n in notes:
-        corpus.append(f"{n.title} {n.topic}")
-        mapping.append({
-            "type": "note",
-            "id": n.id,
-            "title": n.title,
-            "topic": n.topic,
-            "uploaded_by": n.uploaded_by.username,
-            "file_url": n.file.url if n.file else None,
-        })
-    for r in resources:
-        corpus.append(f"{r.title} {r.description}")
-        mapping.append({
-            "type": "resource",
-            "id": r.id,
-            "title": r.title,
-            "description": r.description,
-            "uploaded_by": r.uploaded_by.username,
-            "file_url": r.file.url if r.file else None,
-        })
-
-    vectorizer = TfidfVectorizer()
-    X = vectorizer.fit_transform(corpus)
-    q_vec = vectorizer.transform([query])
-    scores = (X * q_vec.T).toarray().ravel()
-    top_indices = np.argsort(scores)[::-1][:5]
-    results = [mapping[i] for i in top_indices]
-
-    return Response({"query": query, "recommendations": results})
+        return JsonResponse({"recommendations": []})
 
+    kind = {"notes": "note", "resources": "resource"}.get(filter_type)
+    if not search_index.is_built():
+        try:
+            # the TF-IDF fit is the expensive part; the query itself is one sparse dot product
+            await run_in_pool(search_index.build_if_missing)
+        except CPUTimeout:
+            return JsonResponse({"error": "Search is busy, try again shortly"}, status=503)
+    keys = await sync_to_async(search_index.query_index, thread_sensitive=False)(query, kind, 5)
 
-# --- Summarize PDF ---
+    notes = await Note.objects.select_related("uploaded_by").ain_bulk(
+        [pk for k, pk in keys if k == "note"]
+    )
+    resources = await StudentResource.objects.select_related("uploaded_by").ain_bulk(
+        [pk for k, pk in keys if k == "resource"]
+    )
+
+    found = {"note": notes, "resource": resources}
+    results = [_list_item(found[k][pk]) for k, pk in keys if pk in found[k]]
+
+    return JsonResponse({"query": query, "recommendations": results})
+
+
+# --- Content Search (PDF body text) ---
 @api_view(["GET"])
-def summarize_pdf(request, type, pk):
+@permission_classes([IsAuthenticated])  # quotes PDF bodies, like the login-only analyze views
+def content_search(request):
+    """Top-k documents whose extracted text matches ``q``, with their best sentences."""
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return Response({"error": "Query parameter is required"}, status=400)
+    try:
+        limit = int(request.GET.get("k", 10))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return Response({"error": "k must be a positive integer"}, status=400)
+    limit = min(limit, 50)
+
+    results = [
+        {**_list_item(doc), "score": score, "matches": matches}
+        for doc, score, matches in content_index.search_content(query, limit=limit)
+    ]
+    return Response({"query": query, "results": results})
+
+
+# --- Summarize PDF ---
+def _summary_document(type, pk):
+    if type == "note":
+        return Note.objects.get(pk=pk)
+    if type == "resource":
+        return StudentResource.objects.get(pk=pk)
+    return None
+
+
+def _summary_lookup(request, type, pk):
+    """(document, stored Summary or None) for the requested length, looked up once per request
+    and shared by the ETag/Last-Modified checks and the view."""
+    if not hasattr(request, "_summary_lookup"):
+        obj = _summary_document(type, pk)
+        length = request.GET.get("length", "medium")
+        summary = None
+        if obj is not None and obj.file and length in SUMMARY_LENGTHS:
+            file = document_file(obj)
+            summary = Summary.objects.filter(
+                entry__public_id=file.public_id, entry__file_version=str(file.version or ""), length=length,
+            ).select_related("entry").first()
+        request._summary_lookup = (obj, summary)
+    return request._summary_lookup
+
+
+def _summary_etag(request, type, pk):
+    summary = _summary_lookup(request, type, pk)[1]
+    if summary is None:
+        return None
+    return f"{summary.entry.content_hash[:16]}-{summary.length}-{summary.updated_at.timestamp():.0f}"
+
+
+def _summary_last_modified(request, type, pk):
+    summary = _summary_lookup(request, type, pk)[1]
+    return summary.updated_at if summary else None
+
+
+def _prefetch_summary(view):
+    """Do the (sync ORM) summary lookup off the event loop, so @condition's ETag and
+    Last-Modified callbacks below only read the memo on the request."""
+    @wraps(view)
+    async def inner(request, type, pk):
+        await sync_to_async(_summary_lookup)(request, type, pk)
+        return await view(request, type, pk)
+    return inner
+
+
+@require_GET
+@_prefetch_summary
+@condition(etag_func=_summary_etag, last_modified_func=_summary_last_modified)
+async def summarize_pdf(request, type, pk):
     """
     Summarize either a Note or a StudentResource PDF.
-    type = 'note' or 'resource'
+    type = 'note' or 'resource'; ?length=short|medium|long (default medium)
     """
-    if type == "note":
-        obj = Note.objects.get(pk=pk)
-    elif type == "resource":
-        obj = StudentResource.objects.get(pk=pk)
-    else:
-        return Response({"summary": "Invalid type."})
+    length = request.GET.get("length", "medium")
+    if length not in SUMMARY_LENGTHS:
+        return JsonResponse({"error": f"length must be one of {', '.join(SUMMARY_LENGTHS)}"}, status=400)
 
-    # ✅ Use Cloudinary URL directly
-    response = requests.get(obj.file.url)
-    pdf_file = BytesIO(response.content)
-    reader = PdfReader(pdf_file)
-    text = " ".join(page.extract_text() for page in reader.pages if page.extract_text())
+    obj, summary = request._summary_lookup
+    if obj is None:
+        return JsonResponse({"summary": "Invalid type."})
 
-    if not text:
-        return Response({"summary": "No text extracted from this PDF."})
+    # ✅ Served from the Summary table; computed here only if the background job has not run yet
+    if summary is None:
+        entry = await get_extracted_text_async(document_file(obj)) if obj.file else None
+        if entry is None or not entry.text:
+            return JsonResponse({"summary": "No text extracted from this PDF."})
+        try:
+            summaries = await run_in_pool(build_summaries, entry.text)
+        except CPUTimeout:
+            await sync_to_async(jobs.enqueue)(obj, "summarize")  # let the job worker finish it
+            response = JsonResponse({"error": "Summary is being generated, try again shortly"}, status=503)
+            response["Retry-After"] = "30"
+            return response
+        await sync_to_async(store_summaries)(entry, summaries)
+        summary = await Summary.objects.aget(entry=entry, length=length)
 
-    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-    if len(sentences) <= 1:
-        words = text.split()
-        summary = " ".join(words[:100]) + "..."
+    return JsonResponse({"summary": summary.text, "length": length})
+
+
+# --- Background processing status ---
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def processing_status(request, type, pk):
+    """Latest extraction / summary / index job status for a Note or StudentResource."""
+    if type == "note":
+        obj = get_object_or_404(Note, pk=pk)
+    elif type == "resource":
+        obj = get_object_or_404(StudentResource, pk=pk)
     else:
-        summary = summarize_text(text, num_sentences=5, max_words=100)
+        return Response({"error": "Invalid type."}, status=400)
 
-    return Response({"summary": summary})
+    return Response({"type": type, "id": pk, "jobs": jobs.document_status(obj)})